@@ -0,0 +1,279 @@
+"""
+离线批量合成
+
+读取 JSONL（每行 {"id": ..., "text": ..., "voice": ...}，id 与 voice 可省略），
+经与实时会话相同的合成 + 解码路径（stream_edge_tts_to_audio_queue，包括合成缓存与全局 TTS 调度器）
+并发合成，输出为：
+- 每条一个 WAV（s16le 单声道）或 Ogg/Opus 文件
+- 或追加到单个归档文件（--archive），同时写入索引（每行一条 JSON：id、偏移、长度、时长）
+
+可续跑：输出文件已存在或索引中已有该 id 的条目直接跳过。每条失败后按指数退避重试，
+重试用尽的条目写入 <输出目录>/failed.jsonl，不影响其它条目。结束时报告吞吐量（合成音频秒数 / 墙钟秒数）。
+
+用法:
+    python batch_synthesize.py prompts.jsonl --out out/ --concurrency 8
+    python batch_synthesize.py prompts.jsonl --out out/ --format opus
+    python batch_synthesize.py prompts.jsonl --archive narration.bin --format wav
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+import wave
+
+import server
+from tts.decoder import BYTES_PER_SAMPLE
+
+BATCH_FORMATS = ("wav", "opus")
+_UNSAFE_NAME = re.compile(r"[^\w.-]+")
+
+
+class PCMCollector:
+    """收集一条文本解码后的全部 PCM（接口与 AudioQueueManager.put_audio_data 相同）"""
+
+    def __init__(self, sample_rate: int, frame_ms: int = 20):
+        self.sample_rate = sample_rate
+        self.chunk_size = int(sample_rate * frame_ms / 1000)
+        self.pcm = bytearray()
+
+    async def put_audio_data(self, audio_data, tag=None):
+        # 解码器回调的是其内部缓冲区的视图，这里复制一份
+        self.pcm.extend(audio_data)
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / BYTES_PER_SAMPLE / self.sample_rate
+
+
+def encode_wav(pcm: bytes, sample_rate: int) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(BYTES_PER_SAMPLE)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return out.getvalue()
+
+
+def encode_ogg_opus(pcm: bytes, sample_rate: int, bitrate: int = 32000) -> bytes:
+    import av
+    import numpy as np
+
+    out = io.BytesIO()
+    with av.open(out, "w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=sample_rate, layout="mono")
+        stream.bit_rate = bitrate
+        frame = av.AudioFrame.from_ndarray(np.frombuffer(pcm, dtype=np.int16).reshape(1, -1),
+                                           format="s16", layout="mono")
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return out.getvalue()
+
+
+def load_items(path: str):
+    """读取输入 JSONL；缺少 id 时使用行号"""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                logging.warning(f"第 {lineno} 行不是合法的 JSON，已跳过: {e}")
+                continue
+            if not str(item.get("text", "")).strip():
+                logging.warning(f"第 {lineno} 行没有文本，已跳过")
+                continue
+            item.setdefault("id", str(lineno))
+            item["id"] = str(item["id"])
+            items.append(item)
+    return items
+
+
+class FileOutput:
+    """每条一个文件；先写临时文件再原子替换，中断后不会留下半截文件"""
+
+    def __init__(self, out_dir: str, audio_format: str):
+        self.out_dir = out_dir
+        self.extension = "wav" if audio_format == "wav" else "opus"
+        os.makedirs(out_dir, exist_ok=True)
+
+    def path(self, item_id: str) -> str:
+        return os.path.join(self.out_dir, f"{_UNSAFE_NAME.sub('_', item_id)}.{self.extension}")
+
+    def done(self, item_id: str) -> bool:
+        return os.path.exists(self.path(item_id))
+
+    def write(self, item: dict, data: bytes, duration: float) -> None:
+        path = self.path(item["id"])
+        fd, tmp_path = tempfile.mkstemp(dir=self.out_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def close(self) -> None:
+        pass
+
+
+class ArchiveOutput:
+    """
+    单文件归档：音频依次追加到 archive，索引（archive + ".index.jsonl"）每条一行
+
+    先写音频再写索引；中断时末尾多出的音频没有索引条目，续跑时被忽略
+    """
+
+    def __init__(self, archive_path: str, audio_format: str):
+        self.audio_format = audio_format
+        self.index_path = archive_path + ".index.jsonl"
+        self.completed = set()
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.completed.add(json.loads(line)["id"])
+                    except (ValueError, KeyError):
+                        # 中断时写了一半的索引行
+                        continue
+        os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+        self._archive = open(archive_path, "ab")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+
+    def done(self, item_id: str) -> bool:
+        return item_id in self.completed
+
+    def write(self, item: dict, data: bytes, duration: float) -> None:
+        # 写入在事件循环线程中同步完成，并发任务之间不会交错
+        offset = self._archive.seek(0, os.SEEK_END)
+        self._archive.write(data)
+        self._archive.flush()
+        self._index.write(json.dumps({
+            "id": item["id"],
+            "offset": offset,
+            "length": len(data),
+            "format": self.audio_format,
+            "duration": round(duration, 3),
+            "voice": item.get("voice"),
+        }, ensure_ascii=False) + "\n")
+        self._index.flush()
+        self.completed.add(item["id"])
+
+    def close(self) -> None:
+        self._archive.close()
+        self._index.close()
+
+
+async def synthesize_item(item: dict, sample_rate: int, max_retries: int) -> PCMCollector:
+    """合成一条文本；每次重试使用新的收集器，失败的尝试不会留下重复的音频"""
+    for attempt in range(max_retries):
+        collector = PCMCollector(sample_rate)
+        try:
+            await server.stream_edge_tts_to_audio_queue(
+                item["text"], collector, tag=item["id"], max_retries=1,
+                session=item["id"], voice=item.get("voice"),
+            )
+            if not collector.pcm:
+                raise Exception("未接收到音频数据")
+            return collector
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if attempt >= max_retries - 1:
+                raise
+            wait_time = 2 ** attempt
+            logging.warning(f"条目 {item['id']} 第 {attempt + 1} 次合成失败: {e}，{wait_time} 秒后重试")
+            await asyncio.sleep(wait_time)
+
+
+async def run(args) -> int:
+    items = load_items(args.input)
+    if args.archive:
+        output = ArchiveOutput(args.archive, args.format)
+        failed_path = args.archive + ".failed.jsonl"
+    else:
+        output = FileOutput(args.out, args.format)
+        failed_path = os.path.join(args.out, "failed.jsonl")
+    todo = [item for item in items if not output.done(item["id"])]
+    print(f"共 {len(items)} 条，已完成 {len(items) - len(todo)} 条，本次合成 {len(todo)} 条 "
+          f"(并发 {args.concurrency}, 格式 {args.format}, {args.sample_rate} Hz)")
+
+    # 批量任务独占进程：调度器的并发上限与命令行一致
+    server.tts_scheduler.max_concurrency = args.concurrency
+    semaphore = asyncio.Semaphore(args.concurrency)
+    totals = {"done": 0, "failed": 0, "audio_seconds": 0.0}
+    failed = []
+    wall_start = time.perf_counter()
+
+    async def process(item):
+        async with semaphore:
+            try:
+                collector = await synthesize_item(item, args.sample_rate, args.retries)
+            except Exception as e:
+                totals["failed"] += 1
+                failed.append(dict(item, error=str(e)))
+                logging.error(f"条目 {item['id']} 合成失败: {e}")
+                return
+            pcm = bytes(collector.pcm)
+            if args.format == "wav":
+                data = encode_wav(pcm, args.sample_rate)
+            else:
+                data = await asyncio.to_thread(encode_ogg_opus, pcm, args.sample_rate, args.bitrate)
+            output.write(item, data, collector.duration)
+            totals["done"] += 1
+            totals["audio_seconds"] += collector.duration
+            finished = totals["done"] + totals["failed"]
+            if finished % args.progress_every == 0 or finished == len(todo):
+                wall = time.perf_counter() - wall_start
+                print(f"[{finished}/{len(todo)}] 音频 {totals['audio_seconds']:.1f}s, "
+                      f"吞吐 {totals['audio_seconds'] / wall:.1f} 音频秒/秒")
+
+    try:
+        await asyncio.gather(*(process(item) for item in todo))
+    finally:
+        output.close()
+        await server.tts_connection_pool.close()
+        if failed:
+            with open(failed_path, "w", encoding="utf-8") as f:
+                for item in failed:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    wall = time.perf_counter() - wall_start
+    print(f"完成 {totals['done']} 条，失败 {totals['failed']} 条，耗时 {wall:.1f}s，"
+          f"合成音频 {totals['audio_seconds']:.1f}s，吞吐 {totals['audio_seconds'] / max(wall, 1e-9):.2f} 音频秒/秒")
+    if failed:
+        print(f"失败条目已写入 {failed_path}，修复后重新运行即可续跑")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量合成")
+    parser.add_argument("input", help="输入 JSONL：每行 {\"id\", \"text\", \"voice\"}")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="输出目录（每条一个文件）")
+    target.add_argument("--archive", help="归档文件路径（索引写入 <归档>.index.jsonl）")
+    parser.add_argument("--format", choices=BATCH_FORMATS, default="wav")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sample-rate", type=int, default=24000, help="输出采样率（Edge TTS 原生为 24kHz）")
+    parser.add_argument("--bitrate", type=int, default=32000, help="Opus 码率（bps）")
+    parser.add_argument("--retries", type=int, default=3, help="每条的最大尝试次数")
+    parser.add_argument("--progress-every", type=int, default=50)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
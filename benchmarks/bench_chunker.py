@@ -0,0 +1,93 @@
+"""
+文本分段策略基准测试
+
+在录制的 LLM 流（JSONL，每行 {"prompt": ..., "chunks": [[相对时间秒, 文本], ...]}）上回放各分段策略，
+报告首段延迟（首段可送往 TTS 的时刻）、分段数量与平均分段长度。
+
+用法:
+    python benchmarks/bench_chunker.py                                   # 使用自带的示例语料
+    python benchmarks/bench_chunker.py --corpus my_streams.jsonl
+    python benchmarks/bench_chunker.py --record prompts.txt --corpus my_streams.jsonl   # 用已配置的 LLM 录制语料
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tts.chunker import create_chunker  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "llm_streams.jsonl")
+
+STRATEGIES = {
+    "fixed": {"strategy": "fixed"},
+    "adaptive": {"strategy": "adaptive"},
+}
+
+
+async def record(prompts_path: str, corpus_path: str) -> None:
+    from llm.config import load_config
+    from llm.factory import create_llm_provider
+
+    provider = create_llm_provider(load_config())
+    with open(prompts_path, "r", encoding="utf-8") as f:
+        prompts = [line.strip() for line in f if line.strip()]
+    with open(corpus_path, "w", encoding="utf-8") as out:
+        for prompt in prompts:
+            started = time.monotonic()
+            chunks = []
+            async for chunk in provider.generate_response_stream(prompt):
+                chunks.append([round(time.monotonic() - started, 4), chunk])
+            out.write(json.dumps({"prompt": prompt, "chunks": chunks}, ensure_ascii=False) + "\n")
+            print(f"已录制: {prompt[:30]} ({len(chunks)} 个片段)")
+
+
+def replay(config, chunks):
+    """返回 (首段时刻, 分段列表)"""
+    chunker = create_chunker(config)
+    first_at = None
+    emitted = []
+    for offset, text in chunks:
+        ready = chunker.feed(text)
+        if ready and first_at is None:
+            first_at = offset
+        emitted.extend(ready)
+    rest = chunker.flush()
+    if rest:
+        emitted.append(rest)
+        if first_at is None:
+            first_at = chunks[-1][0] if chunks else 0.0
+    return first_at, emitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本分段策略基准测试")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--record", help="提示词文件（每行一条），录制语料后写入 --corpus")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record, args.corpus))
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        streams = [json.loads(line) for line in f if line.strip()]
+
+    print(f"语料: {len(streams)} 条流")
+    print(f"{'strategy':<10} {'首段 p50 (ms)':>14} {'首段 max (ms)':>14} {'分段数/条':>10} {'平均长度':>9}")
+    for name, config in STRATEGIES.items():
+        first_latencies, counts, lengths = [], [], []
+        for stream in streams:
+            first_at, emitted = replay(config, stream["chunks"])
+            first_latencies.append(first_at * 1000)
+            counts.append(len(emitted))
+            lengths.extend(len(c) for c in emitted)
+        print(f"{name:<10} {statistics.median(first_latencies):>14.1f} {max(first_latencies):>14.1f} "
+              f"{statistics.mean(counts):>10.1f} {statistics.mean(lengths):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
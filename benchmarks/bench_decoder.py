@@ -0,0 +1,126 @@
+"""
+解码后端基准测试：对比 PyAV 进程内解码与 ffmpeg 子进程解码
+
+指标：
+- 首样本延迟（time-to-first-sample）：送入第一段数据到收到第一帧 PCM 的时间
+- 每秒音频的 CPU 时间：进程自身 + 子进程的 user/sys 时间之和 / 解码出的音频时长
+
+用法:
+    python benchmarks/bench_decoder.py                   # 使用生成的测试音（需 PyAV 带 mp3 编码器）
+    python benchmarks/bench_decoder.py --input a.mp3     # 使用已有 MP3 文件
+    python benchmarks/bench_decoder.py --text "你好"      # 现场调用 EdgeTTS 生成 MP3
+"""
+import argparse
+import asyncio
+import io
+import os
+import resource
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tts.decoder import BYTES_PER_SAMPLE, DECODER_BACKENDS, create_decoder  # noqa: E402
+
+SAMPLE_RATE = 48000
+CHUNK_SIZE = SAMPLE_RATE * 20 // 1000
+FEED_SIZE = 4096  # 与 EdgeTTS 音频分片大小相近
+
+
+def generate_tone_mp3(seconds: float = 5.0, rate: int = 24000) -> bytes:
+    """用 PyAV 编码一段正弦测试音为 MP3"""
+    import av
+
+    buf = io.BytesIO()
+    container = av.open(buf, "w", format="mp3")
+    stream = container.add_stream("mp3", rate=rate)
+    stream.layout = "mono"
+    t = np.arange(int(seconds * rate)) / rate
+    pcm = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    frame_size = 1152
+    for i in range(0, len(pcm), frame_size):
+        frame = av.AudioFrame.from_ndarray(pcm[None, i:i + frame_size], format="flt", layout="mono")
+        frame.sample_rate = rate
+        frame.pts = i
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+    return buf.getvalue()
+
+
+async def synthesize_mp3(text: str, voice: str) -> bytes:
+    from edge_tts import Communicate
+
+    out = bytearray()
+    async for chunk in Communicate(text, voice=voice).stream():
+        if chunk["type"] == "audio":
+            out.extend(chunk["data"])
+    return bytes(out)
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+async def run_once(backend: str, mp3: bytes):
+    samples = 0
+    first_sample_at = None
+
+    async def on_pcm(pcm):
+        nonlocal samples, first_sample_at
+        if first_sample_at is None:
+            first_sample_at = time.perf_counter()
+        samples += len(pcm) // BYTES_PER_SAMPLE
+
+    cpu_start = cpu_seconds()
+    started = time.perf_counter()
+    decoder = await create_decoder(backend, SAMPLE_RATE, CHUNK_SIZE, on_pcm, fallback=None)
+    for i in range(0, len(mp3), FEED_SIZE):
+        await decoder.feed(mp3[i:i + FEED_SIZE])
+    await decoder.finish()
+    cpu_used = cpu_seconds() - cpu_start
+
+    ttfs = (first_sample_at - started) if first_sample_at else float("nan")
+    return ttfs, cpu_used, samples / SAMPLE_RATE
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="TTS 解码后端基准测试")
+    parser.add_argument("--input", help="MP3 文件路径")
+    parser.add_argument("--text", help="通过 EdgeTTS 合成的文本")
+    parser.add_argument("--voice", default="zh-CN-XiaoyiNeural")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--backends", default=",".join(DECODER_BACKENDS))
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "rb") as f:
+            mp3 = f.read()
+    elif args.text:
+        mp3 = await synthesize_mp3(args.text, args.voice)
+    else:
+        mp3 = generate_tone_mp3()
+
+    print(f"输入 MP3: {len(mp3)} 字节, 每次运行 {args.runs} 轮")
+    print(f"{'backend':<8} {'ttfs p50 (ms)':>14} {'ttfs p95 (ms)':>14} {'cpu/音频秒 (ms)':>16} {'音频 (s)':>9}")
+    for backend in args.backends.split(","):
+        ttfs_list, cpu_list, audio_seconds = [], [], 0.0
+        for _ in range(args.runs):
+            ttfs, cpu_used, audio_seconds = await run_once(backend, mp3)
+            ttfs_list.append(ttfs * 1000)
+            cpu_list.append(cpu_used / audio_seconds * 1000 if audio_seconds else float("nan"))
+        ttfs_list.sort()
+        p95 = ttfs_list[min(len(ttfs_list) - 1, int(len(ttfs_list) * 0.95))]
+        print(f"{backend:<8} {statistics.median(ttfs_list):>14.2f} {p95:>14.2f} "
+              f"{statistics.mean(cpu_list):>16.2f} {audio_seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+EdgeTTS 连接池基准测试：对比每段新建连接与复用长连接的首字节延迟
+
+默认启动本地替身服务并模拟握手耗时；传入 --url 可直接测量真实服务。
+
+用法:
+    python benchmarks/bench_edge_pool.py --connect-delay 0.15
+    python benchmarks/bench_edge_pool.py --url "$(python -c 'from tts.edge import WSS_URL; print(WSS_URL)')"
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.edge_standin import EdgeStandIn  # noqa: E402
+from tts.edge import EdgeTTSConnectionPool  # noqa: E402
+
+SENTENCES = ["你好，很高兴见到你。", "今天天气不错。", "请问还有什么可以帮您？", "好的，马上为您处理。"]
+
+
+async def first_byte_latencies(pool: EdgeTTSConnectionPool, voice: str, rounds: int):
+    latencies = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        first = None
+        async for chunk in pool.stream(SENTENCES[i % len(SENTENCES)], voice):
+            if chunk["type"] == "audio" and first is None:
+                first = time.perf_counter() - started
+        latencies.append(first * 1000)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="EdgeTTS 连接池基准测试")
+    parser.add_argument("--url", help="websocket 地址（默认启动本地替身服务）")
+    parser.add_argument("--voice", default="zh-CN-XiaoyiNeural")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--connect-delay", type=float, default=0.15, help="替身服务模拟的握手耗时（秒）")
+    args = parser.parse_args()
+
+    standin = None
+    url = args.url
+    if url is None:
+        standin = EdgeStandIn(connect_delay=args.connect_delay)
+        url = await standin.start()
+
+    try:
+        print(f"{'mode':<8} {'p50 (ms)':>10} {'p95 (ms)':>10} {'opened':>8} {'reused':>8}")
+        for mode, reuse in (("fresh", False), ("pooled", True)):
+            pool = EdgeTTSConnectionPool(url=url, reuse=reuse)
+            if reuse:
+                await pool.warm(args.voice)
+            latencies = sorted(await first_byte_latencies(pool, args.voice, args.rounds))
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"{mode:<8} {statistics.median(latencies):>10.2f} {p95:>10.2f} "
+                  f"{pool.stats['opened']:>8} {pool.stats['reused']:>8}")
+            await pool.close()
+    finally:
+        if standin is not None:
+            await standin.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+空闲会话 CPU 基准：同时运行多条没有任何回复的 SmartAudioTrack，测量每 100 个会话的 CPU 占用
+
+对比两种空闲策略（tts.idle_mode）：
+- silence: 每 20ms 发送一帧（预分配的）静音帧
+- dtx: hangover 帧之后挂起轨道，只按 dtx_keepalive 间隔发送保活帧
+
+默认同时用 aiortc 的 Opus 编码器编码每一帧，以反映真实发送端的开销（--no-encode 关闭）。
+
+用法:
+    python benchmarks/bench_idle_sessions.py
+    python benchmarks/bench_idle_sessions.py --sessions 500 --seconds 20 --modes dtx
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from server import SmartAudioTrack  # noqa: E402
+
+
+async def drive(track: SmartAudioTrack, encoder, counter: list) -> None:
+    """模拟 RTCRtpSender：循环 recv 并（可选）编码"""
+    while True:
+        frame = await track.recv()
+        if encoder is not None:
+            encoder.encode(frame)
+        counter[0] += 1
+
+
+async def run(mode: str, sessions: int, seconds: float, encode: bool):
+    encoder_cls = None
+    if encode:
+        from aiortc.codecs.opus import OpusEncoder
+        encoder_cls = OpusEncoder
+
+    counter = [0]
+    tasks = []
+    for _ in range(sessions):
+        track = SmartAudioTrack()
+        track.idle_mode = mode
+        tasks.append(asyncio.create_task(drive(track, encoder_cls() if encoder_cls else None, counter)))
+
+    # 跳过 hangover 阶段后再计时
+    await asyncio.sleep(0.5)
+    frames_before = counter[0]
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.sleep(seconds)
+    cpu_used = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    frames = counter[0] - frames_before
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return cpu_used / wall, frames / wall / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="空闲会话 CPU 基准")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--modes", default="silence,dtx")
+    parser.add_argument("--no-encode", action="store_true", help="不进行 Opus 编码")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} 个空闲会话, 每种模式 {args.seconds:g}s, 编码: {not args.no_encode}")
+    print(f"{'mode':<8} {'CPU 核 / 100 会话':>18} {'帧/秒/会话':>12}")
+    for mode in args.modes.split(","):
+        cpu_ratio, fps = asyncio.run(run(mode, args.sessions, args.seconds, not args.no_encode))
+        print(f"{mode:<8} {cpu_ratio * 100 / args.sessions:>18.3f} {fps:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
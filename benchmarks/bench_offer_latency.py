@@ -0,0 +1,103 @@
+"""
+/offer 延迟基准：从收到 offer 到返回 answer 的 p50/p99，对比有无预建 PeerConnection 池
+
+在进程内直接调用 server.offer（不经过 HTTP），客户端用 aiortc 生成与浏览器相同结构的 offer
+（一个只收音频的 transceiver + 一个 DataChannel）。每次 offer 之间间隔 --interval 秒，
+让连接池有时间在后台补充；--interval 0 可以观察池被耗尽后的退化情况。
+
+注意：aiortc 默认使用公网 STUN 服务器收集候选地址，延迟受网络影响，两种模式请在同一环境下对比。
+
+用法:
+    python benchmarks/bench_offer_latency.py
+    python benchmarks/bench_offer_latency.py --offers 100 --pool-size 8 --interval 0.1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aiortc import RTCPeerConnection  # noqa: E402
+
+import server  # noqa: E402
+
+
+class _Client:
+    host = "127.0.0.1"
+
+
+class FakeRequest:
+    """server.offer 只用到 json() 与 client.host"""
+
+    def __init__(self, params):
+        self._params = params
+        self.client = _Client()
+
+    async def json(self):
+        return self._params
+
+
+async def make_offer():
+    client = RTCPeerConnection()
+    client.addTransceiver("audio", direction="recvonly")
+    client.createDataChannel("chat")
+    await client.setLocalDescription(await client.createOffer())
+    return client, {"sdp": client.localDescription.sdp, "type": client.localDescription.type}
+
+
+def quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(pool_size: int, offers: int, interval: float):
+    if pool_size > 0:
+        server.pc_pool = server.PeerConnectionPool(pool_size, server.PC_POOL_MAX_AGE)
+        server.pc_pool.start()
+        # 等待池填满后再开始计时
+        while len(server.pc_pool._ready) < pool_size:
+            await asyncio.sleep(0.05)
+    else:
+        server.pc_pool = None
+
+    latencies = []
+    for _ in range(offers):
+        client, params = await make_offer()
+        start = time.perf_counter()
+        await server.offer(FakeRequest(params))
+        latencies.append(time.perf_counter() - start)
+        await client.close()
+        await asyncio.sleep(interval)
+
+    stats = server.pc_pool.summary() if server.pc_pool is not None else {}
+    for pc in list(server.pcs):
+        await server.cancel_pc_tasks(pc)
+        await pc.close()
+    server.pcs.clear()
+    if server.pc_pool is not None:
+        await server.pc_pool.close()
+    return latencies, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/offer 延迟基准")
+    parser.add_argument("--offers", type=int, default=30)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.5, help="两次 offer 之间的间隔（秒）")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"{args.offers} 次 offer, 间隔 {args.interval:g}s")
+    print(f"{'mode':<10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10} {'命中/未命中':>12}")
+    for name, size in (("no-pool", 0), (f"pool={args.pool_size}", args.pool_size)):
+        latencies, stats = asyncio.run(run(size, args.offers, args.interval))
+        hits = f"{stats['hits']}/{stats['misses']}" if stats else "-"
+        print(f"{name:<10} {quantile(latencies, 0.5) * 1000:>10.1f} {quantile(latencies, 0.99) * 1000:>10.1f} "
+              f"{max(latencies) * 1000:>10.1f} {hits:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+PCM 输出路径微基准：解码输出 -> 帧切片 -> 音频队列 -> AudioFrame
+
+对比两条路径处理 1,000 帧（20ms）的开销：
+- legacy: 原有实现（float32；bytearray 切片后 del 前移、np.frombuffer、尾帧 np.concatenate 补零、
+  recv 中乘 32767 / astype / tobytes）
+- current: 当前实现（int16；DecoderBackend 的 memoryview 切片 + AudioQueueManager 环形缓冲区，
+  直接 update 到 AudioFrame）
+
+指标：
+- CPU：每 1,000 帧的进程 CPU 时间
+- 分配：每 1,000 帧由 tracemalloc 记录到的临时分配字节数（逐步峰值增量之和）
+
+用法:
+    python benchmarks/bench_pcm_path.py
+    python benchmarks/bench_pcm_path.py --frames 5000 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from av import AudioFrame
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from server import AudioQueueManager  # noqa: E402
+from tts.decoder import BYTES_PER_SAMPLE, DecoderBackend  # noqa: E402
+
+SAMPLE_RATE = 48000
+CHUNK_SIZE = SAMPLE_RATE * 20 // 1000
+# 24kHz MP3 每帧 1152 样本，重采样到 48kHz 后为 2304 样本
+DECODED_BLOCK = 2304
+
+
+class _BenchDecoder(DecoderBackend):
+    """只使用基类的切片逻辑"""
+
+    async def start(self):
+        pass
+
+    async def feed(self, data):
+        await self._push_pcm(data)
+
+    async def finish(self):
+        await self._flush_pcm()
+
+    async def abort(self):
+        pass
+
+
+class _LegacyQueue:
+    """原有 AudioQueueManager 的出帧逻辑"""
+
+    def __init__(self):
+        self.audio_queue = asyncio.Queue()
+        self.current = None
+        self.index = 0
+
+    async def put_audio_data(self, audio_data, tag=None):
+        await self.audio_queue.put((audio_data, tag))
+
+    async def get_next_frame(self):
+        if self.current is None or self.index >= len(self.current):
+            if self.audio_queue.empty():
+                return None, None
+            self.current, _ = self.audio_queue.get_nowait()
+            self.index = 0
+        end = self.index + CHUNK_SIZE
+        if end > len(self.current):
+            frame = np.concatenate([self.current[self.index:], np.zeros(end - len(self.current), dtype=np.float32)])
+            self.current = None
+        else:
+            frame = self.current[self.index:end]
+            self.index = end
+        return frame, None
+
+
+async def _legacy_push(buffer: bytearray, data: bytes, queue: _LegacyQueue) -> None:
+    buffer.extend(data)
+    bytes_per_chunk = CHUNK_SIZE * 4
+    while len(buffer) >= bytes_per_chunk:
+        raw = buffer[:bytes_per_chunk]
+        del buffer[:bytes_per_chunk]
+        await queue.put_audio_data(np.frombuffer(raw, dtype=np.float32))
+
+
+def _legacy_frame(frame_data) -> AudioFrame:
+    frame = AudioFrame(format="s16", layout="mono", samples=CHUNK_SIZE)
+    frame.planes[0].update((frame_data * 32767).astype(np.int16).tobytes())
+    return frame
+
+
+def _current_frame(frame_data) -> AudioFrame:
+    frame = AudioFrame(format="s16", layout="mono", samples=CHUNK_SIZE)
+    frame.planes[0].update(frame_data)
+    return frame
+
+
+def make_blocks(frames: int, dtype) -> list:
+    t = np.arange(frames * CHUNK_SIZE + DECODED_BLOCK) / SAMPLE_RATE
+    wave = 0.3 * np.sin(2 * np.pi * 440 * t)
+    pcm = wave.astype(np.float32) if dtype == np.float32 else (wave * 32767).astype(np.int16)
+    # 解码器每次输出的都是新的字节对象
+    return [pcm[i:i + DECODED_BLOCK].tobytes() for i in range(0, frames * CHUNK_SIZE, DECODED_BLOCK)]
+
+
+async def run_legacy(blocks, frames, trace):
+    queue = _LegacyQueue()
+    buffer = bytearray()
+    produced = 0
+    for block in blocks:
+        with trace:
+            await _legacy_push(buffer, block, queue)
+        while produced < frames:
+            with trace:
+                frame_data, _ = await queue.get_next_frame()
+                if frame_data is None:
+                    break
+                _legacy_frame(frame_data)
+            produced += 1
+    return produced
+
+
+async def run_current(blocks, frames, trace):
+    queue = AudioQueueManager(SAMPLE_RATE, 20)
+    decoder = _BenchDecoder(SAMPLE_RATE, CHUNK_SIZE, lambda pcm: queue.put_audio_data(pcm))
+    produced = 0
+    for block in blocks:
+        with trace:
+            await decoder.feed(block)
+        while produced < frames and queue.has_pending():
+            with trace:
+                frame_data, _ = await queue.get_next_frame()
+                _current_frame(frame_data)
+            produced += 1
+    return produced
+
+
+class _Trace:
+    """逐步累计 tracemalloc 峰值增量"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.bytes = 0
+
+    def __enter__(self):
+        if self.enabled:
+            tracemalloc.reset_peak()
+            self._current, _ = tracemalloc.get_traced_memory()
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            _, peak = tracemalloc.get_traced_memory()
+            self.bytes += max(0, peak - self._current)
+        return False
+
+
+def measure(name, runner, dtype, frames, rounds):
+    blocks = make_blocks(frames, dtype)
+    cpu = []
+    for _ in range(rounds):
+        started = time.process_time()
+        produced = asyncio.run(runner(blocks, frames, _Trace(False)))
+        cpu.append((time.process_time() - started) / produced * 1000)
+
+    tracemalloc.start()
+    trace = _Trace(True)
+    produced = asyncio.run(runner(blocks, frames, trace))
+    tracemalloc.stop()
+    per_1k = 1000 / produced
+    print(f"{name:<8} {statistics.median(cpu) * 1000:>16.2f} {trace.bytes * per_1k / 1024:>18.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PCM 输出路径微基准")
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"每轮 {args.frames} 帧, {args.rounds} 轮; 每 1,000 帧统计 (int16 每样本 {BYTES_PER_SAMPLE} 字节)")
+    print(f"{'path':<8} {'CPU (ms/1k帧)':>16} {'临时分配 (KiB)':>18}")
+    measure("legacy", run_legacy, np.float32, args.frames, args.rounds)
+    measure("current", run_current, np.int16, args.frames, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+段边界处理基准：对比关闭 / 去静音 + 交叉淡化 / 再加响度归一化三种配置
+
+合成若干段模拟的 TTS 输出（段首 150ms、段尾 400ms 低电平噪声，中间为响度各不相同的调幅正弦），
+按 PendingSynthesis.deliver 的调用顺序（begin_segment → 分块 put_audio_data → end_segment）写入
+AudioQueueManager，再逐帧取出。指标：
+- 音频时长：写入队列的总时长（越短，队列占用越小、后续段越早播放）
+- 最长段间空白：两段有声部分之间的最长静音
+- 首个有声帧：从第一帧开始到第一个有声帧的时长（感知首字延迟中由静音贡献的部分）
+- 各段 RMS 极差（dB）：响度归一化的效果
+- CPU：每秒音频的写入处理耗时
+
+用法:
+    python benchmarks/bench_segment_shaping.py
+    python benchmarks/bench_segment_shaping.py --segments 20 --rounds 5
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from server import AudioQueueManager  # noqa: E402
+from tts.shaping import create_shaper, db_to_amplitude  # noqa: E402
+
+SAMPLE_RATE = 48000
+# 24kHz MP3 每帧 1152 样本，重采样到 48kHz 后为 2304 样本
+DECODED_BLOCK = 2304
+THRESHOLD_DB = -45
+
+MODES = {
+    "off": {"trim_silence": False, "crossfade_ms": 0, "normalize": False},
+    "trim+xfade": {"trim_silence": True, "crossfade_ms": 10, "normalize": False},
+    "trim+xfade+norm": {"trim_silence": True, "crossfade_ms": 10, "normalize": True},
+}
+
+
+def make_segment(rng, seconds, level_db, lead=0.15, tail=0.4):
+    """低电平噪声 + 调幅正弦（模拟一句话）+ 低电平噪声"""
+    noise_level = db_to_amplitude(-60)
+    lead_n, body_n, tail_n = (int(SAMPLE_RATE * x) for x in (lead, seconds, tail))
+    t = np.arange(body_n) / SAMPLE_RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 3 * t)
+    body = np.sin(2 * np.pi * 220 * t) * envelope * db_to_amplitude(level_db) * math.sqrt(2)
+    noise = rng.standard_normal(lead_n + body_n + tail_n) * noise_level
+    pcm = noise
+    pcm[lead_n:lead_n + body_n] += body
+    return np.clip(pcm, -32768, 32767).astype(np.int16)
+
+
+async def run_mode(config, segments):
+    queue = AudioQueueManager(SAMPLE_RATE, 20, buffer_seconds=600)
+    queue.shaper = create_shaper(dict(config, silence_threshold_db=THRESHOLD_DB), SAMPLE_RATE)
+    cpu = 0.0
+    for pcm in segments:
+        start = time.process_time()
+        queue.begin_segment("reply")
+        for offset in range(0, len(pcm), DECODED_BLOCK):
+            await queue.put_audio_data(pcm[offset:offset + DECODED_BLOCK], "reply")
+        queue.end_segment("reply")
+        cpu += time.process_time() - start
+    queued = queue._fill
+    frames = []
+    while True:
+        frame, _ = await queue.get_next_frame()
+        if frame is None:
+            break
+        frames.append(frame.copy())
+    return queued, np.concatenate(frames), cpu
+
+
+def analyse(out):
+    threshold = db_to_amplitude(THRESHOLD_DB)
+    loud = np.flatnonzero((out > threshold) | (out < -threshold))
+    first = loud[0] / SAMPLE_RATE if len(loud) else 0.0
+    gaps = np.diff(loud)
+    longest_gap = (gaps.max() - 1) / SAMPLE_RATE if len(gaps) else 0.0
+    return first, longest_gap
+
+
+def segment_rms_spread(out):
+    """按静音切分有声段（>100ms 的静音视为段间隔），返回各段 RMS 的极差（dB）"""
+    threshold = db_to_amplitude(THRESHOLD_DB)
+    loud = np.flatnonzero((out > threshold) | (out < -threshold))
+    if not len(loud):
+        return 0.0
+    splits = np.flatnonzero(np.diff(loud) > SAMPLE_RATE // 10) + 1
+    levels = []
+    for run in np.split(loud, splits):
+        body = out[run[0]:run[-1] + 1].astype(np.float64)
+        levels.append(20 * math.log10(max(np.sqrt(np.mean(body * body)), 1.0)))
+    return max(levels) - min(levels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="段边界处理基准")
+    parser.add_argument("--segments", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    segments = [make_segment(rng, rng.uniform(0.8, 2.5), rng.uniform(-28, -14)) for _ in range(args.segments)]
+    source_seconds = sum(len(s) for s in segments) / SAMPLE_RATE
+    print(f"{args.segments} 段, 源音频 {source_seconds:.2f}s")
+    print(f"{'mode':<16} {'音频 (s)':>9} {'最长空白 (ms)':>14} {'首个有声 (ms)':>14} "
+          f"{'RMS 极差 (dB)':>14} {'CPU (ms/音频s)':>15}")
+    for name, config in MODES.items():
+        cpu_runs = []
+        for _ in range(args.rounds):
+            queued, out, cpu = asyncio.run(run_mode(config, segments))
+            cpu_runs.append(cpu)
+        first, longest_gap = analyse(out)
+        print(f"{name:<16} {queued / SAMPLE_RATE:>9.2f} {longest_gap * 1000:>14.0f} {first * 1000:>14.0f} "
+              f"{segment_rms_spread(out):>14.1f} {min(cpu_runs) * 1000 / source_seconds:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
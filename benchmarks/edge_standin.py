@@ -0,0 +1,131 @@
+"""
+本地 EdgeTTS 替身服务
+
+实现 readaloud websocket 协议的最小子集（speech.config / ssml → turn.start / audio / audio.metadata / turn.end），
+同一连接上可连续完成多次合成，用于在不访问外网的情况下验证连接池与合成管线。
+
+用法:
+    python benchmarks/edge_standin.py --port 8765 --audio sample.mp3 --connect-delay 0.15
+然后在 config.json 中设置 "tts": {"edge_url": "ws://127.0.0.1:8765/edge"}
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Optional
+
+from aiohttp import web, WSMsgType
+
+
+def _text_message(path: str, body: str = "") -> str:
+    return f"X-RequestId:standin\r\nContent-Type:application/json; charset=utf-8\r\nPath:{path}\r\n\r\n{body}"
+
+
+def _audio_message(data: bytes) -> bytes:
+    header = b"X-RequestId:standin\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n"
+    return len(header).to_bytes(2, "big") + header + data
+
+
+def _extract_text(ssml: str) -> str:
+    start = ssml.find("<prosody")
+    start = ssml.find(">", start) + 1
+    end = ssml.find("</prosody>", start)
+    return ssml[start:end]
+
+
+class EdgeStandIn:
+    """可编程的本地替身服务"""
+
+    def __init__(self, audio: bytes = b"\x00" * 16384, chunk_size: int = 4096, connect_delay: float = 0.0,
+                 first_byte_delay: float = 0.0, chunk_delay: float = 0.0):
+        """
+        Args:
+            audio: 每次合成返回的音频字节
+            chunk_size: 每个二进制消息携带的音频字节数
+            connect_delay: 模拟握手耗时（秒）
+            first_byte_delay: 收到 ssml 到发送第一段音频的延迟（秒）
+            chunk_delay: 音频分片之间的间隔（秒）
+        """
+        self.audio = audio
+        self.chunk_size = chunk_size
+        self.connect_delay = connect_delay
+        self.first_byte_delay = first_byte_delay
+        self.chunk_delay = chunk_delay
+        self.connections = 0
+        self.syntheses = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url = None
+
+    async def _synthesize(self, ws: web.WebSocketResponse, text: str) -> None:
+        self.syntheses += 1
+        await ws.send_str(_text_message("turn.start", "{}"))
+        await asyncio.sleep(self.first_byte_delay)
+        chunks = [self.audio[i:i + self.chunk_size] for i in range(0, len(self.audio), self.chunk_size)]
+        words = text.split() or [text]
+        offset = 0
+        for i, chunk in enumerate(chunks):
+            if i < len(words):
+                meta = {"Metadata": [{"Type": "WordBoundary", "Data": {
+                    "Offset": offset, "Duration": 1000000, "text": {"Text": words[i]}}}]}
+                await ws.send_str(_text_message("audio.metadata", json.dumps(meta)))
+                offset += 1000000
+            await ws.send_bytes(_audio_message(chunk))
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        await ws.send_str(_text_message("turn.end", "{}"))
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        await asyncio.sleep(self.connect_delay)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            if "Path:ssml" in msg.data:
+                await self._synthesize(ws, _extract_text(msg.data))
+        return ws
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/edge", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"ws://{host}:{port}/edge"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="本地 EdgeTTS 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--audio", help="每次合成返回的音频文件")
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--first-byte-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    audio = b"\x00" * 16384
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+
+    standin = EdgeStandIn(audio, connect_delay=args.connect_delay, first_byte_delay=args.first_byte_delay)
+    url = await standin.start(args.host, args.port)
+    print(f"EdgeTTS 替身服务已启动: {url}")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await standin.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+帧节拍漂移模拟：在虚拟时钟上回放长时间播放，对比两种节拍方式的累积漂移
+
+- legacy: 原有实现，每帧处理完后 asyncio.sleep(一帧时长)
+- pacer: FramePacer，按单调时钟计算每帧的绝对发送时刻
+
+每次休眠都会被注入事件循环延迟（指数分布的小延迟 + 周期性的长卡顿），每帧另有固定处理耗时。
+漂移 = 经过的时间 - 已发送音频的时长。pacer 的最终漂移超过 --max-drift 时以非零状态退出，可作为回归检查。
+
+用法:
+    python benchmarks/sim_pacer_drift.py                       # 模拟 10 分钟
+    python benchmarks/sim_pacer_drift.py --minutes 60 --lag-ms 3 --stall-ms 500
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tts.pacing import FramePacer  # noqa: E402
+
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = 960
+
+
+class VirtualLoop:
+    """虚拟时钟：休眠立即返回，但时钟按休眠时长加注入的延迟前进"""
+
+    def __init__(self, lag: float, stall: float, stall_every: float, seed: int):
+        self.now = 0.0
+        self.lag = lag
+        self.stall = stall
+        self.stall_every = stall_every
+        self._next_stall = stall_every
+        self._random = random.Random(seed)
+
+    def clock(self) -> float:
+        return self.now
+
+    def _injected_lag(self) -> float:
+        lag = self._random.expovariate(1 / self.lag) if self.lag > 0 else 0.0
+        if self.stall_every and self.now >= self._next_stall:
+            self._next_stall += self.stall_every
+            lag += self.stall
+        return lag
+
+    def work(self, seconds: float) -> None:
+        self.now += seconds
+
+    async def sleep(self, seconds: float) -> None:
+        self.now += max(0.0, seconds) + self._injected_lag()
+
+
+async def simulate_legacy(loop: VirtualLoop, frames: int, work: float):
+    frame_seconds = FRAME_SAMPLES / SAMPLE_RATE
+    max_drift = 0.0
+    for i in range(frames):
+        loop.work(work)
+        await loop.sleep(frame_seconds)
+        max_drift = max(max_drift, loop.now - (i + 1) * frame_seconds)
+    return loop.now - frames * frame_seconds, max_drift, {}
+
+
+async def simulate_pacer(loop: VirtualLoop, frames: int, work: float, max_lag: float):
+    frame_seconds = FRAME_SAMPLES / SAMPLE_RATE
+    pacer = FramePacer(SAMPLE_RATE, max_lag=max_lag, clock=loop.clock, sleep=loop.sleep)
+    pacer.start()
+    max_drift = 0.0
+    for _ in range(frames):
+        loop.work(work)
+        await pacer.wait(FRAME_SAMPLES)
+        # wait 返回时本帧开始发送，pacer.drift() 以下一帧为基准，需加回一帧
+        max_drift = max(max_drift, pacer.drift() + frame_seconds)
+    return pacer.drift() + frame_seconds, max_drift, pacer.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="帧节拍漂移模拟")
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--work-ms", type=float, default=0.3, help="每帧处理耗时")
+    parser.add_argument("--lag-ms", type=float, default=1.0, help="每次休眠注入的平均事件循环延迟")
+    parser.add_argument("--stall-ms", type=float, default=300.0, help="周期性长卡顿时长")
+    parser.add_argument("--stall-every", type=float, default=30.0, help="长卡顿间隔（秒），0 表示不注入")
+    parser.add_argument("--max-lag", type=float, default=0.2, help="FramePacer 的 max_lag（秒）")
+    parser.add_argument("--max-drift", type=float, default=0.25, help="pacer 允许的最终漂移（秒）")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # 跳帧告警每次卡顿都会触发，这里只看汇总
+    logging.disable(logging.WARNING)
+    frames = int(args.minutes * 60 * SAMPLE_RATE / FRAME_SAMPLES)
+    work = args.work_ms / 1000
+
+    def make_loop():
+        return VirtualLoop(args.lag_ms / 1000, args.stall_ms / 1000, args.stall_every, args.seed)
+
+    legacy = asyncio.run(simulate_legacy(make_loop(), frames, work))
+    paced = asyncio.run(simulate_pacer(make_loop(), frames, work, args.max_lag))
+
+    print(f"模拟 {args.minutes:g} 分钟 ({frames} 帧), 处理 {args.work_ms}ms/帧, "
+          f"注入延迟 {args.lag_ms}ms/次, 卡顿 {args.stall_ms}ms/{args.stall_every:g}s")
+    print(f"{'mode':<8} {'最终漂移 (ms)':>14} {'最大漂移 (ms)':>14} {'落后帧':>8} {'跳过样本':>10}")
+    for name, (drift, max_drift, stats) in (("legacy", legacy), ("pacer", paced)):
+        print(f"{name:<8} {drift * 1000:>14.1f} {max_drift * 1000:>14.1f} "
+              f"{stats.get('late_frames', '-'):>8} {stats.get('skipped_samples', '-'):>10}")
+
+    if paced[0] > args.max_drift:
+        print(f"pacer 最终漂移超过 {args.max_drift * 1000:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -100,6 +100,9 @@ async function start() {
             } else if (message.type === "tts_complete") {
                 // TTS完成
                 handleTTSComplete();
+            } else if (message.type === "interrupted") {
+                // 当前回复被打断
+                handleInterrupted(message.tag);
             }
         } catch (e) {
             // 如果不是JSON，直接显示文本
@@ -214,6 +217,29 @@ function handleTTSComplete() {
     responseStatus.className = "status";
 }
 
+// 处理回复被打断
+function handleInterrupted(tag) {
+    const audioStatus = document.getElementById("audioStatus");
+    const responseStatus = document.getElementById("responseStatus");
+    
+    console.log(`回复已被打断 (标签: ${tag})`);
+    audioStatus.textContent = "语音已打断";
+    audioStatus.className = "status";
+    
+    responseStatus.textContent = "响应已打断";
+    responseStatus.className = "status";
+}
+
+// 发送打断指令：停止当前回复的生成与播放
+function sendInterrupt() {
+    if (dc && dc.readyState === "open") {
+        dc.send(JSON.stringify({ type: "interrupt" }));
+        console.log("发送打断指令");
+    } else {
+        console.warn("DataChannel 未打开");
+    }
+}
+
 function sendText() {
     const text = document.getElementById("textInput").value;
     const responseStatus = document.getElementById("responseStatus");
@@ -0,0 +1,193 @@
+"""
+LLM 响应缓存
+
+CachedLLMProvider 包装任意 LLMProvider：
+- 相同提示词在 TTL 内直接重放缓存的流式片段，并保持原始的片段间隔
+- 同一时刻相同的提示词合并为一次上游请求（single-flight），上游流同时分发给所有等待的会话
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from .provider import ErrorChunk, LLMProvider
+
+_WHITESPACE = re.compile(r"\s+")
+
+# (相对首个片段的时间偏移, 片段文本)
+TimedChunk = Tuple[float, str]
+
+
+class _Flight:
+    """一次进行中的上游流式请求"""
+
+    def __init__(self):
+        self.chunks: List[TimedChunk] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.failed = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self) -> None:
+        """唤醒所有等待新片段的订阅者"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class CachedLLMProvider(LLMProvider):
+    """带 TTL 缓存与请求合并的 LLM 提供者包装"""
+
+    def __init__(self, provider: LLMProvider, ttl: float = 300.0, max_entries: int = 1000,
+                 replay_speed: float = 1.0):
+        """
+        初始化缓存包装
+
+        Args:
+            provider: 被包装的提供者
+            ttl: 缓存有效期（秒）
+            max_entries: 最多缓存的提示词数量
+            replay_speed: 重放速度倍率，1.0 为原始节奏，0 表示不等待
+        """
+        self.provider = provider
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.replay_speed = replay_speed
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+        self._cache: "OrderedDict[str, Tuple[float, List[TimedChunk]]]" = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+
+    def _key(self, text: str) -> str:
+        return _WHITESPACE.sub(" ", text).strip()
+
+    def _lookup(self, key: str) -> Optional[List[TimedChunk]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, chunks = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return chunks
+
+    def _store(self, key: str, chunks: List[TimedChunk]) -> None:
+        self._cache[key] = (time.monotonic() + self.ttl, chunks)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def _run_upstream(self, key: str, text: str, flight: _Flight) -> None:
+        first_at = None
+        try:
+            async for chunk in self.provider.generate_response_stream(text):
+                now = time.monotonic()
+                if first_at is None:
+                    first_at = now
+                if isinstance(chunk, ErrorChunk):
+                    flight.failed = True
+                flight.chunks.append((now - first_at, chunk))
+                flight.publish()
+            if not flight.failed:
+                self._store(key, flight.chunks)
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.publish()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _replay(self, chunks: List[TimedChunk]) -> AsyncGenerator[str, None]:
+        started = time.monotonic()
+        for offset, chunk in chunks:
+            if self.replay_speed > 0:
+                delay = offset / self.replay_speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk
+
+    async def _follow(self, key: str, flight: _Flight) -> AsyncGenerator[str, None]:
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(flight.chunks):
+                    yield flight.chunks[index][1]
+                    index += 1
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            # 所有会话都已离开时取消上游请求
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                flight.task.cancel()
+
+    async def generate_response_stream(self, text: str) -> AsyncGenerator[str, None]:
+        """
+        流式生成回复文本（命中缓存时重放，否则合并到进行中的上游请求）
+
+        Args:
+            text: 输入文本
+
+        Yields:
+            回复文本的片段
+        """
+        key = self._key(text)
+        cached = self._lookup(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            logging.info(f"LLM 响应缓存命中: {key[:30]}...")
+            async for chunk in self._replay(cached):
+                yield chunk
+            return
+
+        flight = self._flights.get(key)
+        if flight is None:
+            self.stats["misses"] += 1
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run_upstream(key, text, flight))
+        else:
+            self.stats["coalesced"] += 1
+            logging.info(f"合并相同的进行中 LLM 请求: {key[:30]}...")
+
+        async for chunk in self._follow(key, flight):
+            yield chunk
+
+    async def generate_response(self, text: str) -> str:
+        """
+        非流式生成回复文本（直接调用被包装的提供者）
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            完整的回复文本
+        """
+        return await self.provider.generate_response(text)
+
+    async def warmup(self) -> None:
+        await self.provider.warmup()
+
+    def get_name(self) -> str:
+        """
+        获取提供者名称
+
+        Returns:
+            提供者名称
+        """
+        return self.provider.get_name()
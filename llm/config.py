@@ -42,6 +42,11 @@ def load_config_from_env() -> Dict[str, Any]:
     """
     config = {
         "llm_provider": os.getenv("LLM_PROVIDER", "openai"),
+        "tts": {
+            "voice": os.getenv("TTS_VOICE", "zh-CN-XiaoyiNeural"),
+            "decoder": os.getenv("TTS_DECODER", "pyav"),
+            "opus_passthrough": os.getenv("TTS_OPUS_PASSTHROUGH", "false").lower() == "true",
+        },
         "providers": {
             "openai": {
                 "api_key": os.getenv("OPENAI_API_KEY", ""),
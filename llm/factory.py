@@ -1,15 +1,112 @@
 """
 LLM 提供者工厂
 """
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, List, Optional
+import httpx
 from .provider import LLMProvider
 from .config import get_provider_config
 
+_shared_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_http_client(config: Dict[str, Any]) -> httpx.AsyncClient:
+    """
+    获取所有提供者共享的 keep-alive HTTP 客户端
+    
+    Args:
+        config: 配置字典（读取 http 段）
+        
+    Returns:
+        httpx.AsyncClient 实例
+    """
+    global _shared_http_client
+    if _shared_http_client is None:
+        http_config = config.get("http", {})
+        _shared_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=http_config.get("max_connections", 200),
+                max_keepalive_connections=http_config.get("max_keepalive_connections", 50),
+                keepalive_expiry=http_config.get("keepalive_expiry", 120.0),
+            ),
+            timeout=httpx.Timeout(http_config.get("timeout", 60.0), connect=http_config.get("connect_timeout", 10.0)),
+        )
+    return _shared_http_client
+
+
+async def close_shared_http_client() -> None:
+    """关闭共享的 HTTP 客户端（服务关闭时调用）"""
+    global _shared_http_client
+    if _shared_http_client is not None:
+        await _shared_http_client.aclose()
+        _shared_http_client = None
+
 
 def create_llm_provider(config: Dict[str, Any], provider_name: str = None) -> LLMProvider:
     """
     创建 LLM 提供者实例
     
+    Args:
+        config: 配置字典
+        provider_name: 提供者名称，如果为 None 则使用配置中的 llm_provider
+        
+    Returns:
+        LLMProvider 实例（"pool" 为提供者池；启用 llm_cache 时包装为 CachedLLMProvider）
+    """
+    if provider_name is None:
+        provider_name = config.get("llm_provider", "openai")
+
+    names = [provider_name]
+    if provider_name == "pool":
+        from .pool import ProviderPool
+        pool_config = config.get("llm_pool", {})
+        names = pool_config.get("providers", list(config.get("providers", {})))
+        hedge_after = pool_config.get("hedge_after")
+        provider = ProviderPool(
+            [(name, create_single_provider(config, name)) for name in names],
+            hedge_after=float(hedge_after) if hedge_after is not None else None,
+            ewma_alpha=float(pool_config.get("ewma_alpha", 0.3)),
+            failure_threshold=int(pool_config.get("failure_threshold", 2)),
+            failure_cooldown=float(pool_config.get("failure_cooldown", 30.0)),
+        )
+    else:
+        provider = create_single_provider(config, provider_name)
+
+    cache_config = config.get("llm_cache", {})
+    if cache_config.get("enabled", False):
+        sampling = [] if cache_config.get("allow_sampling", False) else _sampling_providers(config, names)
+        if sampling:
+            # temperature > 0 时同一提示词本应得到不同的回答，缓存会改变行为
+            logging.warning(f"LLM 响应缓存已跳过：提供者 {', '.join(sampling)} 的 temperature 大于 0"
+                            f"（如确需缓存，设置 llm_cache.allow_sampling 为 true）")
+        else:
+            from .cache import CachedLLMProvider
+            provider = CachedLLMProvider(
+                provider,
+                ttl=float(cache_config.get("ttl", 300)),
+                max_entries=int(cache_config.get("max_entries", 1000)),
+                replay_speed=float(cache_config.get("replay_speed", 1.0)),
+            )
+    return provider
+
+
+def _sampling_providers(config: Dict[str, Any], names: List[str]) -> List[str]:
+    """返回 temperature 大于 0（回答不确定）的提供者名称"""
+    sampling = []
+    for name in names:
+        try:
+            temperature = float(get_provider_config(config, name).get("temperature", 0.7))
+        except ValueError:
+            continue
+        if temperature > 0:
+            sampling.append(name)
+    return sampling
+
+
+def create_single_provider(config: Dict[str, Any], provider_name: str = None) -> LLMProvider:
+    """
+    创建单个 LLM 提供者实例（不做任何包装）
+    
     Args:
         config: 配置字典
         provider_name: 提供者名称，如果为 None 则使用配置中的 llm_provider
@@ -24,10 +121,10 @@ def create_llm_provider(config: Dict[str, Any], provider_name: str = None) -> LL
     
     if provider_name == "openai":
         from providers.openai_provider import OpenAIProvider
-        return OpenAIProvider(provider_config)
+        return OpenAIProvider(provider_config, http_client=get_shared_http_client(config))
     elif provider_name == "dashscope":
         from providers.dashscope_provider import DashScopeProvider
-        return DashScopeProvider(provider_config)
+        return DashScopeProvider(provider_config, http_client=get_shared_http_client(config))
     elif provider_name == "local":
         from providers.local_provider import LocalProvider
         return LocalProvider(provider_config)
@@ -0,0 +1,242 @@
+"""
+LLM 提供者池
+
+ProviderPool 组合多个已配置的提供者：
+- 记录每个提供者首个片段延迟（TTFT）的 EWMA，优先路由到最快的健康提供者
+- 连续失败的提供者在冷却期内不参与路由
+- 可选对冲请求：首个片段迟迟未到时向次优提供者并发请求，先到者胜出，另一方被取消
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from .provider import ErrorChunk, LLMProvider
+
+_END = object()
+
+
+class _ProviderState:
+    """单个提供者的延迟与健康状态"""
+
+    def __init__(self, name: str, provider: LLMProvider):
+        self.name = name
+        self.provider = provider
+        self.ewma_ttft: Optional[float] = None
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.requests = 0
+        self.wins = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+
+class _Attempt:
+    """在独立任务中拉取一个提供者的流式输出"""
+
+    def __init__(self, state: _ProviderState, text: str):
+        self.state = state
+        self.started = time.monotonic()
+        self.ttft: Optional[float] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.ready = asyncio.Event()
+        self.task = asyncio.create_task(self._run(text))
+
+    async def _run(self, text: str) -> None:
+        try:
+            async for chunk in self.state.provider.generate_response_stream(text):
+                if self.ttft is None:
+                    self.ttft = time.monotonic() - self.started
+                self.queue.put_nowait(chunk)
+                self.ready.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.queue.put_nowait(ErrorChunk(f"{self.state.name} 错误: {e}"))
+        finally:
+            self.queue.put_nowait(_END)
+            self.ready.set()
+
+    async def cancel(self) -> None:
+        if not self.task.done():
+            self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+class ProviderPool(LLMProvider):
+    """按首字延迟路由并支持对冲请求的提供者池"""
+
+    def __init__(self, providers: List[Tuple[str, LLMProvider]], hedge_after: Optional[float] = None,
+                 ewma_alpha: float = 0.3, failure_threshold: int = 2, failure_cooldown: float = 30.0):
+        """
+        初始化提供者池
+
+        Args:
+            providers: (名称, 提供者) 列表，顺序作为无延迟数据时的优先级
+            hedge_after: 首个片段超过该秒数未到达时发起对冲请求，None 表示不对冲
+            ewma_alpha: TTFT 指数加权平均的平滑系数
+            failure_threshold: 连续失败多少次后进入冷却
+            failure_cooldown: 冷却时长（秒）
+        """
+        if not providers:
+            raise ValueError("提供者池至少需要一个提供者")
+        self._states = [_ProviderState(name, provider) for name, provider in providers]
+        self.hedge_after = hedge_after
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.failure_cooldown = failure_cooldown
+        self.stats = {"hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    def _ranked(self, exclude=()) -> List[_ProviderState]:
+        """健康的提供者按 EWMA 升序排列（尚无数据的视为最快以便采样），不健康的排在最后"""
+        now = time.monotonic()
+        candidates = [s for s in self._states if s not in exclude]
+        healthy = [s for s in candidates if s.healthy(now)]
+        unhealthy = [s for s in candidates if not s.healthy(now)]
+        healthy.sort(key=lambda s: s.ewma_ttft if s.ewma_ttft is not None else 0.0)
+        unhealthy.sort(key=lambda s: s.unhealthy_until)
+        return healthy + unhealthy
+
+    def _observe(self, state: _ProviderState, ttft: float) -> None:
+        if state.ewma_ttft is None:
+            state.ewma_ttft = ttft
+        else:
+            state.ewma_ttft = self.ewma_alpha * ttft + (1 - self.ewma_alpha) * state.ewma_ttft
+
+    def _record_success(self, state: _ProviderState, ttft: float) -> None:
+        self._observe(state, ttft)
+        state.consecutive_failures = 0
+        state.wins += 1
+
+    def _record_failure(self, state: _ProviderState) -> None:
+        state.consecutive_failures += 1
+        if state.consecutive_failures >= self.failure_threshold:
+            state.unhealthy_until = time.monotonic() + self.failure_cooldown
+            logging.warning(f"LLM 提供者 {state.name} 连续失败 {state.consecutive_failures} 次，冷却 {self.failure_cooldown}s")
+
+    def _start(self, state: _ProviderState, text: str) -> _Attempt:
+        state.requests += 1
+        return _Attempt(state, text)
+
+    async def _first_chunk(self, attempts: List[_Attempt], timeout: Optional[float]):
+        """等待任一尝试产生首个片段；超时返回 (None, None)"""
+        waiters = {asyncio.ensure_future(a.ready.wait()): a for a in attempts}
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.cancel()
+        if not done:
+            return None, None
+        attempt = waiters[next(iter(done))]
+        return attempt, attempt.queue.get_nowait()
+
+    async def generate_response_stream(self, text: str) -> AsyncGenerator[str, None]:
+        """
+        流式生成回复文本
+
+        Args:
+            text: 输入文本
+
+        Yields:
+            胜出提供者的回复片段
+        """
+        tried = []
+        attempts: List[_Attempt] = []
+        winner = None
+        first = None
+        try:
+            while winner is None:
+                ranked = self._ranked(exclude=tried)
+                if not attempts:
+                    if not ranked:
+                        break
+                    attempts.append(self._start(ranked[0], text))
+                    tried.append(ranked[0])
+                    ranked = ranked[1:]
+
+                can_hedge = self.hedge_after is not None and ranked and len(attempts) == 1
+                attempt, first = await self._first_chunk(attempts, self.hedge_after if can_hedge else None)
+
+                if attempt is None:
+                    # 首个片段超时：向次优提供者发起对冲请求
+                    hedge = ranked[0]
+                    logging.info(f"LLM 首字超过 {self.hedge_after}s，对冲请求 {hedge.name}")
+                    self.stats["hedged"] += 1
+                    attempts.append(self._start(hedge, text))
+                    tried.append(hedge)
+                    continue
+
+                if first is _END or isinstance(first, ErrorChunk):
+                    # 该提供者失败：丢弃它，继续等待其余尝试或切换到下一个提供者
+                    self._record_failure(attempt.state)
+                    attempts.remove(attempt)
+                    await attempt.cancel()
+                    if not attempts and not self._ranked(exclude=tried):
+                        if isinstance(first, ErrorChunk):
+                            yield first
+                        return
+                    self.stats["failovers"] += 1
+                    continue
+
+                winner = attempt
+
+            if winner is None:
+                return
+
+            for loser in attempts:
+                if loser is not winner:
+                    # 被取消的一方至少慢于当前耗时
+                    self._observe(loser.state, time.monotonic() - loser.started)
+                    await loser.cancel()
+            if len(attempts) > 1 and winner is attempts[-1]:
+                self.stats["hedge_wins"] += 1
+            attempts = [winner]
+            self._record_success(winner.state, winner.ttft or (time.monotonic() - winner.started))
+
+            yield first
+            while True:
+                chunk = await winner.queue.get()
+                if chunk is _END:
+                    break
+                yield chunk
+        finally:
+            for attempt in attempts:
+                await attempt.cancel()
+
+    async def generate_response(self, text: str) -> str:
+        """
+        非流式生成回复文本（使用当前最快的健康提供者）
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            完整的回复文本
+        """
+        return await self._ranked()[0].provider.generate_response(text)
+
+    async def warmup(self) -> None:
+        await asyncio.gather(*(s.provider.warmup() for s in self._states), return_exceptions=True)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            s.name: {
+                "ewma_ttft": s.ewma_ttft,
+                "healthy": s.healthy(time.monotonic()),
+                "requests": s.requests,
+                "wins": s.wins,
+            }
+            for s in self._states
+        }
+
+    def get_name(self) -> str:
+        """
+        获取提供者名称
+
+        Returns:
+            提供者名称
+        """
+        return "Pool(" + ", ".join(s.name for s in self._states) + ")"
@@ -5,6 +5,16 @@ from abc import ABC, abstractmethod
 from typing import AsyncGenerator, Optional
 
 
+class ErrorChunk(str):
+    """
+    表示错误信息的回复片段
+
+    提供者在出错时仍以普通文本片段的形式返回错误信息（前端与 TTS 照常处理），
+    使用该类型标记后，缓存等中间层可以识别并跳过这类响应。
+    """
+    pass
+
+
 class LLMProvider(ABC):
     """LLM 提供者抽象基类"""
     
@@ -34,6 +44,12 @@ class LLMProvider(ABC):
         """
         pass
     
+    async def warmup(self) -> None:
+        """
+        预热提供者（例如提前建立 HTTP keep-alive 连接），默认不做任何事
+        """
+        pass
+    
     @abstractmethod
     def get_name(self) -> str:
         """
@@ -2,23 +2,26 @@
 DashScope (阿里云通义千问) LLM 提供者实现
 """
 import os
-from typing import AsyncGenerator, Dict, Any
+from typing import AsyncGenerator, Dict, Any, Optional
+import httpx
 from openai import AsyncOpenAI
-from ..llm.provider import LLMProvider
+from llm.provider import ErrorChunk, LLMProvider
 
 
 class DashScopeProvider(LLMProvider):
     """DashScope 提供者"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], http_client: Optional[httpx.AsyncClient] = None):
         """
         初始化 DashScope 提供者
         
         Args:
             config: 提供者配置
+            http_client: 共享的 keep-alive HTTP 客户端，None 时使用 SDK 默认客户端
         """
         self.config = config
         self.client = AsyncOpenAI(
+            http_client=http_client,
             api_key=config.get("api_key", ""),
             base_url=config.get("base_url", 
                               "https://dashscope.aliyuncs.com/compatible-mode/v1"),
@@ -56,7 +59,7 @@ class DashScopeProvider(LLMProvider):
                         yield content
         
         except Exception as e:
-            yield f"DashScope API 错误: {str(e)}"
+            yield ErrorChunk(f"DashScope API 错误: {str(e)}")
     
     async def generate_response(self, text: str) -> str:
         """
@@ -84,6 +87,16 @@ class DashScopeProvider(LLMProvider):
         except Exception as e:
             return f"DashScope API 错误: {str(e)}"
     
+    async def warmup(self) -> None:
+        """
+        预先建立到 API 的 keep-alive 连接
+        """
+        try:
+            await self.client.with_options(max_retries=0, timeout=5.0).models.list()
+        except Exception:
+            # 任何 HTTP 响应都已完成握手，错误可以忽略
+            pass
+    
     def get_name(self) -> str:
         """
         获取提供者名称
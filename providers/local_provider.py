@@ -3,7 +3,7 @@
 """
 import asyncio
 from typing import AsyncGenerator, Dict, Any
-from ..llm.provider import LLMProvider
+from llm.provider import LLMProvider
 
 
 class LocalProvider(LLMProvider):
@@ -6,24 +6,39 @@ import tempfile
 import json
 import numpy as np
 import time
+from collections import deque
 from fractions import Fraction
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse
 from aiortc import RTCPeerConnection, RTCSessionDescription, MediaStreamTrack
-from edge_tts import Communicate
-from av import AudioFrame
+from aiortc.mediastreams import MediaStreamError
+from av import AudioFrame, Packet
 
 # LLM 模块导入（保留你原来的 LLM 接口）
 from llm.config import load_config
-from llm.factory import create_llm_provider
+from llm.factory import create_llm_provider, close_shared_http_client
+from tts.cache import AudioCache, pack_packets, unpack_packets
+from tts.chunker import create_chunker
+from tts.decoder import BYTES_PER_SAMPLE, create_decoder
+from tts.encoding import EncoderPool, PooledOpusEncoder, profile_needs_encoder, resolve_encoder_profile
+from tts.edge import EdgeTTSConnectionPool, MP3_OUTPUT_FORMAT, OPUS_OUTPUT_FORMAT
+from tts.pacing import FramePacer
+from tts.resume import SynthesisProgress
+from tts.scheduler import TTSScheduler
+from tts.shaping import create_shaper, crossfade_into, db_to_amplitude, fade_window, first_loud, last_loud
+from tts.opus import OggOpusDemuxer, opus_packet_samples, opus_silence_packet, OPUS_CLOCK_RATE, OPUS_SILENCE_PACKET
 
 logging.basicConfig(level=logging.INFO)
 app = FastAPI()
 pcs = set()
 ROOT = os.path.dirname(__file__)
 TEMP_DIR = tempfile.gettempdir()
+# 多进程模式下由 supervisor.py 设置：worker 编号与共享的磁盘缓存目录
+WORKER_ID = os.environ.get("WEBRTC_TTS_WORKER_ID")
+SHARED_CACHE_DIR = os.environ.get("WEBRTC_TTS_CACHE_DIR")
 
 # ------------ LLM 初始化 ------------
+llm_config = {}
 try:
     llm_config = load_config()
     logging.info(f"加载配置成功: {llm_config.get('llm_provider', 'unknown')}")
@@ -33,6 +48,176 @@ except Exception as e:
     logging.error(f"LLM 提供者初始化失败: {e}", exc_info=True)
     llm_provider = None
 
+# ------------ TTS 配置 ------------
+tts_config = llm_config.get("tts", {})
+TTS_VOICE = tts_config.get("voice", "zh-CN-XiaoyiNeural")
+# 解码后端："pyav"（进程内流式解码）或 "ffmpeg"（子进程，兼容回退）
+TTS_DECODER_BACKEND = tts_config.get("decoder", "pyav")
+# Opus 直通：请求 TTS 直接输出 Ogg/Opus，跳过本地解码与重新编码
+TTS_OPUS_PASSTHROUGH = tts_config.get("opus_passthrough", False)
+TTS_OPUS_FORMAT = tts_config.get("opus_output_format", OPUS_OUTPUT_FORMAT)
+# 预合成窗口：同时合成的后续文本段数量
+TTS_LOOKAHEAD = int(tts_config.get("lookahead", 3))
+# 合成中途失败时从最后一个已开始播放的单词续传（不重复播放已播放的音频）
+TTS_RESUME_RETRIES = tts_config.get("resume_retries", True)
+# 首字节超过该时长（毫秒）时发起对冲请求，0 表示不对冲
+TTS_HEDGE_AFTER = float(tts_config.get("hedge_after_ms", 0)) / 1000
+# 段边界处理：去除段首/段尾静音、同一回复相邻段交叉淡化、可选响度归一化
+TTS_SHAPING_CONFIG = tts_config.get("shaping", {})
+# 文本分段策略："adaptive"（短首段、逐步增长）或 "fixed"（原有固定策略）
+TTS_CHUNKER_CONFIG = tts_config.get("chunker", {})
+# 打断模式：新消息到达时立即终止正在播放的回复
+TTS_BARGE_IN = tts_config.get("barge_in", False)
+# 每个会话的待播放音频上限（秒）：写满后 TTS 合成与 LLM 流依次暂停，直到播放腾出空间
+TTS_AUDIO_BUFFER_SECONDS = float(tts_config.get("audio_buffer_seconds", 10))
+# 等待合成的文本段上限：超过后 LLM 流暂停读取
+TTS_MAX_PENDING_CHUNKS = int(tts_config.get("max_pending_chunks", 16))
+# 帧节拍允许追赶的最大落后时长（秒），超过后跳过积压的帧
+TTS_PACER_MAX_LAG = float(tts_config.get("pacer_max_lag", 0.2))
+# 空闲策略："silence" 按节拍持续发送静音帧；"dtx" 播放结束后（保留 hangover 帧）停止发帧直到有新音频，
+# 期间每隔 dtx_keepalive 秒发一帧静音保活（0 表示完全挂起）
+TTS_IDLE_MODE = tts_config.get("idle_mode", "dtx")
+TTS_DTX_HANGOVER_FRAMES = int(tts_config.get("dtx_hangover_frames", 10))
+TTS_DTX_KEEPALIVE = float(tts_config.get("dtx_keepalive", 0.4))
+# 填充语音：回复开始后超过 delay_ms 仍没有真实音频时，播放启动时预先合成的短语（如“嗯，让我想想”）
+filler_config = tts_config.get("filler", {})
+TTS_FILLER_PHRASES = list(filler_config.get("phrases", [])) if filler_config.get("enabled", True) else []
+TTS_FILLER_DELAY = float(filler_config.get("delay_ms", 800)) / 1000
+# 真实音频开始时，填充语音尚未播放的部分淡出的时长（毫秒）
+TTS_FILLER_FADE_MS = float(filler_config.get("fade_ms", 30))
+# 填充语音在音频队列中使用的标签
+FILLER_TAG = "__filler__"
+
+# 编码配置："low-latency"（20ms 帧）或 "high-density"（60ms 帧、低复杂度），也可在 encoder_profiles 中自定义
+TTS_ENCODER_PROFILE = resolve_encoder_profile(
+    tts_config.get("encoder_profile", "low-latency"),
+    tts_config.get("encoder_profiles"),
+)
+
+# 编码线程池：启用后轨道在专用线程池中自行编码 Opus，事件循环只做调度
+encoder_pool_config = tts_config.get("encoder_pool", {})
+encoder_pool = EncoderPool(
+    workers=int(encoder_pool_config.get("workers", 0)),
+) if encoder_pool_config.get("enabled", False) else None
+
+# EdgeTTS 长连接池：按发音人保持预热连接，所有 PeerConnection 共享
+tts_connection_pool = EdgeTTSConnectionPool(
+    url=tts_config.get("edge_url"),
+    max_idle_per_voice=int(tts_config.get("pool_max_idle", 4)),
+    max_idle_seconds=float(tts_config.get("pool_idle_timeout", 60.0)),
+    reuse=tts_config.get("reuse_connections", True),
+)
+
+# 全局 TTS 调度器：所有会话共享的上游合成并发上限，会话间轮转，回复首段优先
+tts_scheduler = TTSScheduler(max_concurrency=int(tts_config.get("max_concurrency", 8)))
+
+# 合成音频缓存：内存 LRU + 磁盘 mmap（多 worker 共享）
+cache_config = tts_config.get("cache", {})
+# 由 supervisor 启动的 worker：磁盘条目一律按需 mmap、不进入本进程的内存层，
+# 各 worker 共享同一份页缓存，而不是每个进程各复制一份
+CACHE_SHARED = WORKER_ID is not None
+tts_audio_cache = AudioCache(
+    memory_max_bytes=int(cache_config.get("memory_max_mb", 64)) * 1024 * 1024,
+    disk_dir=cache_config.get("disk_dir") or SHARED_CACHE_DIR,
+    max_text_chars=int(cache_config.get("max_text_chars", 120)),
+    disk_max_bytes=int(cache_config.get("disk_max_mb", 1024)) * 1024 * 1024,
+    mmap_min_bytes=0 if CACHE_SHARED else int(cache_config.get("mmap_min_kb", 1024)) * 1024,
+) if cache_config.get("enabled", True) else None
+
+# ------------ 准入控制：过载时快速拒绝新连接，而不是让所有会话一起变差 ------------
+admission_config = llm_config.get("admission", {})
+ADMISSION_MAX_SESSIONS = int(admission_config.get("max_sessions", 200))
+ADMISSION_MAX_TTS_QUEUE = int(admission_config.get("max_tts_queue_depth", 64))
+ADMISSION_MAX_LOOP_LAG = float(admission_config.get("max_loop_lag_ms", 100)) / 1000
+ADMISSION_RETRY_AFTER = int(admission_config.get("retry_after", 5))
+
+# ------------ 预建 PeerConnection 池：offer 到来时直接取出已收集好候选地址的连接 ------------
+pc_pool_config = llm_config.get("pc_pool", {})
+PC_POOL_SIZE = int(pc_pool_config.get("size", 4)) if pc_pool_config.get("enabled", True) else 0
+# 池中连接的最长保留时间（秒）：超过后 STUN 获得的公网映射可能已失效，丢弃重建
+PC_POOL_MAX_AGE = float(pc_pool_config.get("max_age", 120))
+
+# ------------ 广播：一个生产者合成、编码一次，多个听众共享 ------------
+broadcast_config = llm_config.get("broadcast", {})
+BROADCAST_ENABLED = broadcast_config.get("enabled", False)
+# 听众最多落后多少毫秒；超过后直接跳到最新位置
+BROADCAST_BACKLOG_MS = int(broadcast_config.get("backlog_ms", 1000))
+# 同时存在的频道数上限；没有听众也没有待播报内容超过 idle_timeout 秒的频道被关闭
+BROADCAST_MAX_CHANNELS = int(broadcast_config.get("max_channels", 16))
+BROADCAST_IDLE_TIMEOUT = float(broadcast_config.get("idle_timeout", 60))
+# 每个频道排队中（含正在播报）的播报数上限
+BROADCAST_MAX_QUEUED = int(broadcast_config.get("max_queued", 8))
+
+
+class LoopLagMonitor:
+    """周期性测量事件循环延迟（实际唤醒时间与预期之差）"""
+
+    def __init__(self, interval=0.25, alpha=0.3):
+        self.interval = interval
+        self.alpha = alpha
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lag = self.alpha * lag + (1 - self.alpha) * self.lag
+            self.max_lag = max(self.max_lag, lag)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+def load_report():
+    """
+    当前负载：各项指标相对其上限的比例，load 取最大值（>= 1 表示已满）
+
+    Returns:
+        负载字典
+    """
+    sessions = len(pcs) + len(ws_sessions)
+    queue_depth = tts_scheduler.queue_depth
+    ratios = {
+        "sessions": sessions / ADMISSION_MAX_SESSIONS if ADMISSION_MAX_SESSIONS > 0 else 0.0,
+        "tts_queue": queue_depth / ADMISSION_MAX_TTS_QUEUE if ADMISSION_MAX_TTS_QUEUE > 0 else 0.0,
+        "loop_lag": loop_lag_monitor.lag / ADMISSION_MAX_LOOP_LAG if ADMISSION_MAX_LOOP_LAG > 0 else 0.0,
+    }
+    limiting = max(ratios, key=ratios.get)
+    return {
+        "load": round(ratios[limiting], 4),
+        "limiting": limiting,
+        "accepting": ratios[limiting] < 1.0,
+        "sessions": sessions,
+        "max_sessions": ADMISSION_MAX_SESSIONS,
+        "tts_queue_depth": queue_depth,
+        "loop_lag_ms": round(loop_lag_monitor.lag * 1000, 2),
+        "worker": WORKER_ID,
+        "pid": os.getpid(),
+    }
+
+
+def overloaded_response(report):
+    """过载时返回的 503（附带 Retry-After）"""
+    return JSONResponse(
+        status_code=503,
+        content={"error": "overloaded", **report},
+        headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+    )
+
 # ------------ 辅助：为每个 pc 管理任务的工具函数 ------------
 def create_pc_task(pc: RTCPeerConnection, coro):
     """创建任务并绑定到 PeerConnection，方便统一取消与跟踪"""
@@ -65,130 +250,572 @@ async def cancel_pc_tasks(pc: RTCPeerConnection):
     pc._tasks.clear()
     logging.info("后台任务已全部取消并清理完毕。")
 
-# ------------ 流式音频队列管理（保留原实现，略作小改动） ------------
+async def wait_for_event(event: asyncio.Event, timeout=None):
+    """等待事件；timeout 为 None 时无限期挂起（不创建定时器），超时返回 False"""
+    if timeout is None:
+        await event.wait()
+        return True
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+def apply_encoder_profile_to_sdp(sdp: str, profile) -> str:
+    """在 answer 的音频段中声明编码配置的 ptime 与 Opus 码率上限"""
+    ptime_lines = [f"a=ptime:{profile['ptime']}", f"a=maxptime:{profile['ptime']}"]
+    out = []
+    in_audio = False
+    opus_pt = None
+    for line in sdp.rstrip("\r\n").split("\r\n"):
+        if line.startswith("m="):
+            if in_audio:
+                out.extend(ptime_lines)
+            in_audio = line.startswith("m=audio")
+        elif in_audio and line.startswith("a=rtpmap:") and "opus/48000" in line.lower():
+            opus_pt = line[len("a=rtpmap:"):].split(" ", 1)[0]
+        elif in_audio and opus_pt and line.startswith(f"a=fmtp:{opus_pt} ") and profile.get("bitrate"):
+            line += f";maxaveragebitrate={profile['bitrate']}"
+        elif in_audio and line.startswith(("a=ptime:", "a=maxptime:")):
+            continue
+        out.append(line)
+    if in_audio:
+        out.extend(ptime_lines)
+    return "\r\n".join(out) + "\r\n"
+
+# ------------ 流式音频队列管理：预分配的环形缓冲区，写满时阻塞写入方形成背压 ------------
 class AudioQueueManager:
-    def __init__(self, sample_rate=48000, frame_ms=20):
+    def __init__(self, sample_rate=48000, frame_ms=20, buffer_seconds=None):
         self.sample_rate = sample_rate
         self.chunk_size = int(sample_rate * frame_ms / 1000)
-        self.audio_queue = asyncio.Queue()
+        seconds = TTS_AUDIO_BUFFER_SECONDS if buffer_seconds is None else buffer_seconds
+        # 容量按整帧取整，至少两帧
+        self.max_frames = max(2, int(seconds * 1000 / frame_ms))
+        self.capacity = self.max_frames * self.chunk_size
+        # int16 PCM，与解码器输出及 AudioFrame(s16) 一致，全程无格式转换
+        self._buffer = np.zeros(self.capacity, dtype=np.int16)
+        # 输出帧复用同一块内存（recv 会立即拷入 AudioFrame）
+        self._frame = np.zeros(self.chunk_size, dtype=np.int16)
+        self._read_pos = 0
+        self._fill = 0
+        # 标签边界：按播放顺序排列的 [标签, 剩余样本数]，标签播放完毕即出队
+        self._segments = deque()
+        self._data_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
         self.is_playing = False
-        self.current_audio_data = None
         self.current_tag = None
-        self.current_index = 0
-        self.tag_sequence = []
-        self.tag_data_map = {}
         self.active_tag = None
+        # 被打断的标签：其后到达的数据直接丢弃
+        self.dropped_tags = set()
+        # 段边界处理（由 PendingSynthesis 调用 begin_segment / end_segment 标记段的起止）
+        self.shaper = create_shaper(TTS_SHAPING_CONFIG, sample_rate)
+        self._open_tag = None
+        self._crossfade_pending = False
+        # 当前段写入缓冲区的样本数（不含叠加到上一段结尾的部分）
+        self._segment_samples = 0
+        # 最近写入真实音频的标签；填充语音只在当前回复还没有音频时播放
+        self._last_tag = None
+        self._filler_active = False
+        self._filler_fade = int(sample_rate * TTS_FILLER_FADE_MS / 1000)
+
+    def has_pending(self):
+        return self._fill > 0
+
+    def _held(self):
+        """正在写入的段不足一帧的尾部：等待后续数据凑满一帧，避免在段中间补零"""
+        if (self._open_tag is not None and self._fill < self.chunk_size and len(self._segments) == 1
+                and self._segments[0][0] == self._open_tag):
+            return self._fill
+        return 0
+
+    def _tail_samples(self, tag):
+        """缓冲区末尾属于 tag 且尚未播放的样本数"""
+        if self._segments and self._segments[-1][0] == tag:
+            return self._segments[-1][1]
+        return 0
+
+    def begin_segment(self, tag=None):
+        """一段合成音频开始写入"""
+        self._open_tag = tag
+        self._segment_samples = 0
+        if self.shaper is not None:
+            self.shaper.begin()
+            self._crossfade_pending = self.shaper.crossfade_samples > 0
+
+    def end_segment(self, tag=None):
+        """一段合成音频写入完毕：回退段尾多余的静音（只影响尚未播放的部分）"""
+        self._open_tag = None
+        self._crossfade_pending = False
+        if self.shaper is not None and tag not in self.dropped_tags:
+            trim = min(self.shaper.trailing_excess(), self._tail_samples(tag), self._segment_samples)
+            if trim > 0:
+                self._fill -= trim
+                self._segments[-1][1] -= trim
+                if self._segments[-1][1] == 0:
+                    self._segments.pop()
+                self._space_ready.set()
+        if self._fill > 0:
+            self._data_ready.set()
+
+    def free_samples(self):
+        return self.capacity - self._fill
+
+    def is_full(self):
+        return self._fill >= self.capacity
 
     async def put_audio_data(self, audio_data, tag=None):
-        if tag and tag not in self.tag_sequence:
-            self.tag_sequence.append(tag)
-        if tag not in self.tag_data_map:
-            self.tag_data_map[tag] = []
-        self.tag_data_map[tag].append(audio_data)
+        """写入 int16 采样（ndarray 或 bytes/memoryview）；缓冲区写满时等待播放腾出空间"""
+        if tag in self.dropped_tags:
+            return
+        if isinstance(audio_data, np.ndarray):
+            samples = audio_data
+        else:
+            samples = np.frombuffer(audio_data, dtype=np.int16)
+        gain = 1.0
+        if self.shaper is not None:
+            # 以下均为视图，不复制采样
+            samples = self.shaper.leading(samples)
+            if not len(samples):
+                return
+            gain = self.shaper.observe(samples, trimmable=tag == self._open_tag)
+            if self._crossfade_pending:
+                self._crossfade_pending = False
+                samples = samples[self._crossfade(samples, tag, gain):]
+        self._last_tag = tag
+        if self._filler_active:
+            self.stop_filler()
+        offset = 0
+        while offset < len(samples):
+            while self._fill >= self.capacity:
+                self._space_ready.clear()
+                await self._space_ready.wait()
+                if tag in self.dropped_tags:
+                    return
+            count = min(len(samples) - offset, self.capacity - self._fill)
+            self._write(samples[offset:offset + count], gain)
+            if self._segments and self._segments[-1][0] == tag:
+                self._segments[-1][1] += count
+            else:
+                self._segments.append([tag, count])
+            offset += count
+            self._segment_samples += count
+            if self._fill > self._held():
+                self._data_ready.set()
         if self.active_tag is None and tag:
             self.active_tag = tag
-        await self.audio_queue.put((audio_data, tag))
 
-    async def get_next_frame(self):
-        if self.current_audio_data is None or self.current_index >= len(self.current_audio_data):
-            try:
-                self.current_audio_data, self.current_tag = await asyncio.wait_for(self.audio_queue.get(), timeout=0.1)
-                self.current_index = 0
-                self.is_playing = True
-                if self.current_tag and self.current_tag != self.active_tag:
-                    self.active_tag = self.current_tag
-            except asyncio.TimeoutError:
-                self.is_playing = False
-                return None, self.active_tag
+    def _write(self, samples, gain=1.0):
+        start = (self._read_pos + self._fill) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        if gain == 1.0:
+            self._buffer[start:start + first] = samples[:first]
+            if first < len(samples):
+                self._buffer[:len(samples) - first] = samples[first:]
+        else:
+            # 增益在拷入缓冲区时完成；observe 已保证这一块不会削波
+            np.multiply(samples[:first], gain, out=self._buffer[start:start + first], casting="unsafe")
+            if first < len(samples):
+                np.multiply(samples[first:], gain, out=self._buffer[:len(samples) - first], casting="unsafe")
+        self._fill += len(samples)
+
+    def _crossfade(self, samples, tag, gain):
+        """
+        把新段开头原地叠加到同一标签尚未播放的上一段结尾
+
+        Returns:
+            已叠加的样本数（这部分不再追加到缓冲区）
+        """
+        count = min(self.shaper.crossfade_samples, len(samples), self._tail_samples(tag))
+        if count <= 0:
+            return 0
+        window = self.shaper.window(count)
+        start = (self._read_pos + self._fill - count) % self.capacity
+        first = min(count, self.capacity - start)
+        crossfade_into(self._buffer[start:start + first], samples[:first], window[:first], gain)
+        if first < count:
+            crossfade_into(self._buffer[:count - first], samples[first:count], window[first:], gain)
+        return count
+
+    def _copy_out(self, position, out):
+        first = min(len(out), self.capacity - position)
+        out[:first] = self._buffer[position:position + first]
+        if first < len(out):
+            out[first:] = self._buffer[:len(out) - first]
+
+    async def wait_for_data(self, timeout=None):
+        """空闲时挂起直到有音频写入；返回 False 表示超时"""
+        if self._fill > self._held():
+            return True
+        self._data_ready.clear()
+        return await wait_for_event(self._data_ready, timeout)
 
-        if self.current_audio_data is None:
+    async def get_next_frame(self):
+        """取出下一帧（不等待）；没有待播放音频时返回 (None, active_tag)"""
+        if self._fill == 0:
+            self.is_playing = False
+            return None, self.active_tag
+        if self._held():
             return None, self.active_tag
 
-        end_index = self.current_index + self.chunk_size
-        if end_index > len(self.current_audio_data):
-            frame = np.concatenate([
-                self.current_audio_data[self.current_index:],
-                np.zeros(end_index - len(self.current_audio_data), dtype=np.float32)
-            ])
-            self.current_audio_data = None
-            self.current_index = 0
-        else:
-            frame = self.current_audio_data[self.current_index:end_index]
-            self.current_index = end_index
-
-        return frame, self.current_tag
+        # 一帧只属于一个标签：标签的最后一帧不足部分补零
+        segment = self._segments[0]
+        tag = segment[0]
+        count = min(self.chunk_size, segment[1])
+        self._copy_out(self._read_pos, self._frame[:count])
+        if count < self.chunk_size:
+            self._frame[count:] = 0
+        self._read_pos = (self._read_pos + count) % self.capacity
+        self._fill -= count
+        segment[1] -= count
+        if segment[1] == 0:
+            self._segments.popleft()
+        self._space_ready.set()
+
+        self.is_playing = True
+        self.current_tag = tag
+        if tag and tag != self.active_tag:
+            self.active_tag = tag
+        return self._frame, tag
 
     def get_active_tag(self):
         return self.active_tag
 
     def has_tag_data(self, tag):
-        return tag in self.tag_data_map and len(self.tag_data_map[tag]) > 0
+        return any(segment[0] == tag for segment in self._segments)
+
+    def drop_tag(self, tag):
+        """丢弃标签尚未播放的全部音频，下一帧即停止输出；被阻塞的写入方随后直接返回"""
+        self.dropped_tags.add(tag)
+        if self.has_tag_data(tag):
+            self._compact(tag)
+        self._space_ready.set()
+
+    def forget_tag(self, tag):
+        """被打断的标签已没有写入方：从 dropped_tags 中移除，使其不随会话时长无限增长"""
+        self.dropped_tags.discard(tag)
+
+    def _compact(self, tag, keep=0):
+        """
+        丢弃标签尚未播放的音频并把保留的数据压缩到缓冲区开头（只在打断或截断填充语音时发生）
+
+        Args:
+            tag: 要丢弃的标签
+            keep: 保留该标签最前面的样本数，并将其淡出
+        """
+        kept = np.empty(self._fill, dtype=np.int16)
+        segments = deque()
+        position = self._read_pos
+        size = 0
+        for segment_tag, count in self._segments:
+            retain = count
+            if segment_tag == tag:
+                retain = min(count, keep)
+                keep -= retain
+            if retain:
+                self._copy_out(position, kept[size:size + retain])
+                if segment_tag == tag:
+                    fade = kept[size:size + retain]
+                    np.multiply(fade, fade_window(retain)[::-1], out=fade, casting="unsafe")
+                size += retain
+                if segments and segments[-1][0] == segment_tag:
+                    segments[-1][1] += retain
+                else:
+                    segments.append([segment_tag, retain])
+            position = (position + count) % self.capacity
+        self._buffer[:size] = kept[:size]
+        self._read_pos = 0
+        self._fill = size
+        self._segments = segments
+
+    def start_filler(self, clip, tag):
+        """
+        播放预先合成的填充语音（int16 PCM）；队列中已有音频或 tag 已写入过真实音频时不播放
+
+        Returns:
+            是否开始播放
+        """
+        if self._fill > 0 or tag == self._last_tag or tag in self.dropped_tags:
+            return False
+        count = min(len(clip), self.capacity)
+        self._write(clip[:count])
+        self._segments.append([FILLER_TAG, count])
+        self._filler_active = True
+        self._data_ready.set()
+        return True
+
+    def stop_filler(self):
+        """截断填充语音：尚未播放部分的开头淡出，其余丢弃，下一帧即可播放真实音频"""
+        self._filler_active = False
+        if self.has_tag_data(FILLER_TAG):
+            self._compact(FILLER_TAG, keep=self._filler_fade)
+            self._space_ready.set()
+
+# ------------ Opus 直通模式的编码包队列（接口与 AudioQueueManager 对应） ------------
+class EncodedPacketQueue:
+    def __init__(self, sample_rate=OPUS_CLOCK_RATE, frame_ms=20, buffer_seconds=None):
+        self.sample_rate = sample_rate
+        seconds = TTS_AUDIO_BUFFER_SECONDS if buffer_seconds is None else buffer_seconds
+        # 有界队列：写满时阻塞写入方（按每包 frame_ms 估算容量）
+        self.max_frames = max(2, int(seconds * 1000 / frame_ms))
+        self.audio_queue = asyncio.Queue(maxsize=self.max_frames)
+        self.is_playing = False
+        self.active_tag = None
+        self.dropped_tags = set()
+        self._data_ready = asyncio.Event()
+        self._last_tag = None
+        self._filler_active = False
+
+    def has_pending(self):
+        return not self.audio_queue.empty()
+
+    def is_full(self):
+        return self.audio_queue.full()
+
+    async def wait_for_data(self, timeout=None):
+        if self.has_pending():
+            return True
+        self._data_ready.clear()
+        return await wait_for_event(self._data_ready, timeout)
+
+    async def put_audio_data(self, packet: bytes, tag=None):
+        if tag in self.dropped_tags:
+            return
+        self._last_tag = tag
+        if self._filler_active:
+            self.stop_filler()
+        if self.active_tag is None and tag:
+            self.active_tag = tag
+        await self.audio_queue.put((packet, tag))
+        self._data_ready.set()
+
+    async def get_next_packet(self):
+        while True:
+            if self.audio_queue.empty():
+                self.is_playing = False
+                return None, self.active_tag
+            packet, tag = self.audio_queue.get_nowait()
+            # 打断前已阻塞在 put 中的写入方可能在打断后才写入
+            if tag not in self.dropped_tags:
+                break
+        self.is_playing = True
+        if tag and tag != self.active_tag:
+            self.active_tag = tag
+        return packet, tag
+
+    def get_active_tag(self):
+        return self.active_tag
+
+    def begin_segment(self, tag=None):
+        # 编码包无法在包内裁剪或叠加，段边界不做处理
+        pass
+
+    def end_segment(self, tag=None):
+        pass
+
+    def start_filler(self, packets, tag):
+        """播放预先合成的填充语音（Opus 包列表），条件与 AudioQueueManager.start_filler 相同"""
+        if self.has_pending() or tag == self._last_tag or tag in self.dropped_tags:
+            return False
+        for packet in packets[:self.max_frames]:
+            self.audio_queue.put_nowait((packet, FILLER_TAG))
+        self._filler_active = True
+        self._data_ready.set()
+        return True
+
+    def stop_filler(self):
+        """截断填充语音：在包边界处丢弃尚未发送的包"""
+        self._filler_active = False
+        self.drop_tag(FILLER_TAG)
+        self.forget_tag(FILLER_TAG)
+
+    def forget_tag(self, tag):
+        """被打断的标签已没有写入方：清除打断后才完成的 put 留下的包，再从 dropped_tags 中移除"""
+        if tag in self.dropped_tags:
+            self.drop_tag(tag)
+            self.dropped_tags.discard(tag)
+
+    def drop_tag(self, tag):
+        self.dropped_tags.add(tag)
+        kept = []
+        while not self.audio_queue.empty():
+            item = self.audio_queue.get_nowait()
+            if item[1] != tag:
+                kept.append(item)
+        for item in kept:
+            self.audio_queue.put_nowait(item)
+
+# ------------ 预合成中的文本段：先缓存输出，轮到它时按顺序转交音频队列 ------------
+class PendingSynthesis:
+    _END = object()
+
+    def __init__(self, target, tag=None):
+        self.tag = tag
+        # 解码器从 sink 读取采样率与帧大小
+        self.sample_rate = target.sample_rate
+        self.chunk_size = getattr(target, "chunk_size", None)
+        self.task = None
+        self._items = asyncio.Queue()
+        # 缓存上限与目标队列相同（每条约一帧）：写满后暂停合成，背压传递到解码器与 TTS 连接
+        self._slots = asyncio.Semaphore(target.max_frames)
+
+    def is_full(self):
+        return self._slots.locked()
+
+    async def put_audio_data(self, audio_data, tag=None):
+        await self._slots.acquire()
+        self._items.put_nowait((audio_data, tag))
+
+    async def run(self, coro):
+        try:
+            await coro
+        finally:
+            self._items.put_nowait(self._END)
 
-    def clear_tag_data(self, tag):
-        if tag in self.tag_data_map:
-            del self.tag_data_map[tag]
-        if tag in self.tag_sequence:
-            self.tag_sequence.remove(tag)
+    async def deliver(self, target):
+        """把已缓存及后续到达的数据写入目标队列，直到该段合成结束"""
+        target.begin_segment(self.tag)
+        try:
+            while True:
+                item = await self._items.get()
+                if item is self._END:
+                    break
+                self._slots.release()
+                if self.task.cancelled():
+                    # 被打断的合成：剩余数据不再写入
+                    return
+                await target.put_audio_data(*item)
+        finally:
+            target.end_segment(self.tag)
+        if self.task.cancelled():
+            return
+        # 抛出合成过程中的异常
+        await self.task
 
 # ------------ 智能音频轨道（不在 __init__ 中创建后台任务） ------------
 class SmartAudioTrack(MediaStreamTrack):
     kind = "audio"
 
-    def __init__(self, sample_rate=48000, frame_ms=20):
+    def __init__(self, sample_rate=None, frame_ms=None, profile=None, encode=False):
         super().__init__()
+        # 采样率与帧时长来自编码配置，依次传给音频队列、解码器与编码器
+        profile = profile or TTS_ENCODER_PROFILE
+        sample_rate = sample_rate or profile["sample_rate"]
+        frame_ms = frame_ms or profile["ptime"]
         self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
         self.samples = int(self.sample_rate * frame_ms / 1000)
         self._current_player = None
         self._silence_mode = True
         self._frame_count = 0
-        self._start_time = time.time()
+        # 音频帧与静音帧共用的节拍器：按单调时钟计算每帧的绝对发送时刻
+        self._pacer = FramePacer(self.sample_rate, max_lag=TTS_PACER_MAX_LAG)
+        self.idle_mode = TTS_IDLE_MODE
+        self._idle_frames = 0
+        # 预分配的静音帧：空闲时反复发送同一帧，只更新时间戳
+        self._silence_frame = AudioFrame(format="s16", layout="mono", samples=self.samples)
+        self._silence_frame.planes[0].update(bytes(self.samples * BYTES_PER_SAMPLE))
+        self._silence_frame.time_base = Fraction(1, self.sample_rate)
+        self._silence_frame.sample_rate = self.sample_rate
+        # 启用编码池、编码配置需要自定义帧长/码率或调用方要求（广播）时，recv 返回已编码的 Opus 包；
+        # 静音直接使用静音包，不经过编码器
+        self._encoder = None
+        if encode or encoder_pool is not None or profile_needs_encoder(profile):
+            self._encoder = PooledOpusEncoder.from_profile(encoder_pool, dict(profile, sample_rate=sample_rate,
+                                                                              ptime=frame_ms))
+        self._silence_packet = Packet(opus_silence_packet(frame_ms))
+        self._silence_packet.time_base = Fraction(1, self.sample_rate)
         self.audio_queue = AudioQueueManager(sample_rate, frame_ms)
-        self.task_queue = asyncio.Queue()
-        self.text_buffer = ""
+        # 有界：TTS 跟不上时 add_text_to_buffer 阻塞，进而暂停读取 LLM 流
+        self.task_queue = asyncio.Queue(maxsize=max(1, TTS_MAX_PENDING_CHUNKS))
+        # 同时合成的文本段数量（1 表示串行）
+        self.lookahead = max(1, TTS_LOOKAHEAD)
+        self._synthesis_tasks = set()
+        # 每个标签已创建但尚未交付（或丢弃）的合成数量
+        self._outstanding = {}
+        self._last_dispatched_tag = None
+        # 分段策略：决定何时把累积的 LLM 文本送往 TTS
+        self.chunker = create_chunker(TTS_CHUNKER_CONFIG)
         self.buffer_lock = asyncio.Lock()
-        self.min_buffer_size = 20
-        self.sentence_endings = {'.', '。', '!', '！', '?', '？', ';', '；', ',', '，', ':', '：', '\n'}
         # 不在 __init__ 创建 worker；由 offer() 创建并将任务归属于 pc
         # 标签相关属性
         self.tag_text_map = {}
         self.channel = None
         self.message_counter = 0
         self.message_lock = asyncio.Lock()
+        # 最近一条回复的标签与其 LLM 任务（用于打断）
+        self.response_tag = None
+        self.response_task = None
+        # 打断模式下仍在等待 message_lock 的最新消息（更新的消息到达时将其取消）
+        self.queued_message_task = None
         # 标志位，用于外部通知关闭（可选）
         self._closing = False
 
     async def recv(self):
         frame_data, tag = await self.audio_queue.get_next_frame()
+        if frame_data is None and await self._idle_wait():
+            frame_data, tag = await self.audio_queue.get_next_frame()
         if tag and tag in self.tag_text_map and self.tag_text_map[tag]:
             await self._send_text_for_tag(tag)
 
         if frame_data is None:
             return await self._generate_silence_frame()
 
+        self._idle_frames = 0
+        frame = self._make_frame(frame_data)
+        if self._encoder is not None:
+            # 先在线程池中编码（按帧顺序逐个提交），再等待发送时刻
+            payload = await self._encoder.encode(frame)
+            if payload is not None:
+                packet = Packet(payload)
+                packet.pts = await self._next_pts()
+                packet.time_base = Fraction(1, self.sample_rate)
+                return packet
+            return await self._generate_silence_frame()
+        frame.pts = await self._next_pts()
+        return frame
+
+    def _make_frame(self, frame_data):
         frame = AudioFrame(format="s16", layout="mono", samples=self.samples)
-        frame.pts = self._frame_count * self.samples
+        frame.planes[0].update(frame_data)
         frame.time_base = Fraction(1, self.sample_rate)
         frame.sample_rate = self.sample_rate
-
-        # float32 -> int16
-        audio_int16 = (frame_data * 32767).astype(np.int16).tobytes()
-        frame.planes[0].update(audio_int16)
-        self._frame_count += 1
-
-        await asyncio.sleep(self.samples / self.sample_rate)
         return frame
 
     async def _generate_silence_frame(self):
-        frame = AudioFrame(format="s16", layout="mono", samples=self.samples)
-        frame.pts = self._frame_count * self.samples
-        frame.time_base = Fraction(1, self.sample_rate)
-        frame.sample_rate = self.sample_rate
-        silence = np.zeros(self.samples, dtype=np.int16).tobytes()
-        frame.planes[0].update(silence)
-        self._frame_count += 1
-        await asyncio.sleep(self.samples / self.sample_rate)
+        if self._encoder is not None:
+            packet = self._silence_packet
+            packet.pts = await self._next_pts()
+            return packet
+        # 发送方在下一次 recv 前已完成对上一帧的编码，复用同一帧是安全的
+        frame = self._silence_frame
+        frame.pts = await self._next_pts()
         return frame
 
+    async def _idle_wait(self):
+        """
+        没有待播放音频时调用；dtx 模式下 hangover 帧之后挂起，直到有音频写入或需要保活
+
+        Returns:
+            等待期间是否有音频到达
+        """
+        self._idle_frames += 1
+        if self.idle_mode != "dtx" or self._idle_frames <= TTS_DTX_HANGOVER_FRAMES:
+            return False
+        arrived = await self.audio_queue.wait_for_data(TTS_DTX_KEEPALIVE or None)
+        # 挂起期间不发帧，时间戳照常按实际时间推进
+        self._pacer.resume(self.samples)
+        return arrived
+
+    async def _next_pts(self, samples=None):
+        """等到下一帧的发送时刻并返回其时间戳；落后过多而跳过的帧同样计入时间戳"""
+        samples = samples or self.samples
+        skipped = await self._pacer.wait(samples)
+        pts = self._pacer.position - samples
+        self._frame_count += 1
+        if skipped:
+            logging.debug(f"节拍器跳过 {skipped} 个样本 (累计落后帧: {self._pacer.stats['late_frames']})")
+        return pts
+
     async def add_text_to_buffer(self, text: str, tag: str = None):
         async with self.buffer_lock:
             if tag:
@@ -196,15 +823,7 @@ class SmartAudioTrack(MediaStreamTrack):
                     self.tag_text_map[tag] = []
                 self.tag_text_map[tag].append(text)
                 logging.debug(f"已将chunk添加到tag_text_map队列 (标签: {tag}): {text[:50]}...")
-            self.text_buffer += text
-            should_flush = False
-            if len(self.text_buffer) >= self.min_buffer_size * 3:
-                should_flush = True
-            elif self.text_buffer and self.text_buffer[-1] in self.sentence_endings:
-                should_flush = True
-            if should_flush and self.text_buffer.strip():
-                text_to_process = self.text_buffer
-                self.text_buffer = ""
+            for text_to_process in self.chunker.feed(text):
                 await self.task_queue.put((text_to_process, tag))
                 logging.debug(f"缓冲区已刷新并发送到TTS (标签: {tag}): {text_to_process[:50]}...")
 
@@ -235,32 +854,27 @@ class SmartAudioTrack(MediaStreamTrack):
 
     async def flush_buffer(self, tag: str = None):
         async with self.buffer_lock:
-            if self.text_buffer.strip():
-                text_to_process = self.text_buffer
-                self.text_buffer = ""
+            text_to_process = self.chunker.flush()
+            if text_to_process:
                 await self.task_queue.put((text_to_process, tag))
                 logging.debug(f"缓冲区强制刷新 (标签: {tag}): {text_to_process[:50]}...")
 
     async def _worker_loop(self):
-        """串行执行每个 TTS 任务，支持标签；会响应取消"""
-        logging.info("SmartAudioTrack worker 启动")
+        """按 lookahead 窗口并发合成后续文本段，严格按入队顺序写入音频队列；会响应取消"""
+        logging.info(f"SmartAudioTrack worker 启动 (lookahead: {self.lookahead})")
+        window = asyncio.Semaphore(self.lookahead)
+        pending = asyncio.Queue()
+        dispatcher = asyncio.create_task(self._dispatch_loop(window, pending))
         try:
             while True:
                 try:
-                    task = await self.task_queue.get()
+                    synthesis = await pending.get()
                 except asyncio.CancelledError:
                     logging.info("SmartAudioTrack worker 捕获到取消信号，退出循环")
                     break
 
                 try:
-                    if isinstance(task, tuple) and len(task) == 2:
-                        text, tag = task
-                        logging.info(f"TTS worker 开始处理 (标签: {tag}): {text[:100]}...")
-                        await stream_edge_tts_to_audio_queue(text, self.audio_queue, tag, max_retries=3)
-                    else:
-                        text = task
-                        logging.info(f"TTS worker 开始处理 (无标签): {text[:100]}...")
-                        await stream_edge_tts_to_audio_queue(text, self.audio_queue, None, max_retries=3)
+                    await synthesis.deliver(self.audio_queue)
                     logging.info("TTS worker 本次任务完成")
                 except asyncio.CancelledError:
                     logging.info("TTS worker 在处理任务时被取消")
@@ -268,13 +882,105 @@ class SmartAudioTrack(MediaStreamTrack):
                 except Exception as e:
                     logging.exception("TTS worker 发生异常: %s", e)
                 finally:
+                    window.release()
+                    self._finish_synthesis(synthesis.tag)
                     try:
                         self.task_queue.task_done()
                     except Exception:
                         pass
         finally:
+            # 取消调度循环以及所有仍在进行中的预合成
+            dispatcher.cancel()
+            in_flight = [t for t in self._synthesis_tasks if not t.done()]
+            for t in in_flight:
+                t.cancel()
+            await asyncio.gather(dispatcher, *in_flight, return_exceptions=True)
+            self._synthesis_tasks.clear()
             logging.info("SmartAudioTrack worker 已退出")
 
+    async def _dispatch_loop(self, window: asyncio.Semaphore, pending: asyncio.Queue):
+        """从 task_queue 取任务并在窗口允许时立即开始合成"""
+        while True:
+            await window.acquire()
+            task = await self.task_queue.get()
+            if isinstance(task, tuple) and len(task) == 2:
+                text, tag = task
+            else:
+                text, tag = task, None
+            logging.info(f"TTS worker 开始处理 (标签: {tag}): {text[:100]}...")
+            # 每条回复的首段在全局调度器中优先
+            first = tag != self._last_dispatched_tag
+            self._last_dispatched_tag = tag
+
+            synthesis = PendingSynthesis(self.audio_queue, tag)
+            self._outstanding[tag] = self._outstanding.get(tag, 0) + 1
+            synthesis.task = asyncio.create_task(synthesis.run(self._synthesize(text, tag, synthesis, first)))
+            self._synthesis_tasks.add(synthesis.task)
+            synthesis.task.add_done_callback(self._synthesis_tasks.discard)
+            await pending.put(synthesis)
+
+    def _finish_synthesis(self, tag):
+        """一段合成已交付或被丢弃；被打断的标签没有剩余的合成时，音频队列不再需要记住它"""
+        remaining = self._outstanding.get(tag, 0) - 1
+        if remaining > 0:
+            self._outstanding[tag] = remaining
+            return
+        self._outstanding.pop(tag, None)
+        self.audio_queue.forget_tag(tag)
+
+    async def _synthesize(self, text: str, tag: str = None, sink=None, first=False):
+        """合成一段文本并写入 sink（默认为音频队列；子类可替换合成管线）"""
+        await stream_edge_tts_to_audio_queue(text, sink or self.audio_queue, tag, max_retries=3,
+                                             session=self, priority=first)
+
+    async def interrupt(self):
+        """
+        打断当前回复：取消 LLM 流、丢弃待合成文本、终止进行中的合成并清空已排队的音频
+
+        Returns:
+            被打断的标签，没有可打断的回复时返回 None
+        """
+        tag = self.response_tag
+        task = self.response_task
+        busy = (
+            (task is not None and not task.done())
+            or not self.task_queue.empty()
+            or any(not t.done() for t in self._synthesis_tasks)
+            or self.audio_queue.is_playing
+            or self.audio_queue.has_pending()
+        )
+        if not busy:
+            return None
+
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        async with self.buffer_lock:
+            self.chunker.flush()
+        while not self.task_queue.empty():
+            try:
+                self.task_queue.get_nowait()
+                self.task_queue.task_done()
+            except Exception:
+                break
+
+        in_flight = [t for t in self._synthesis_tasks if not t.done()]
+        for t in in_flight:
+            t.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+        if tag is not None:
+            self.audio_queue.drop_tag(tag)
+            self.tag_text_map.pop(tag, None)
+            if not self._outstanding.get(tag):
+                # 没有待交付的合成：之后不会再有该标签的写入
+                self.audio_queue.forget_tag(tag)
+        self.audio_queue.stop_filler()
+        logging.info(f"已打断回复 (标签: {tag}, 取消合成: {len(in_flight)})")
+        return tag
+
     async def close(self):
         """外部可调用的关闭方法，标记关闭并清理"""
         self._closing = True
@@ -288,166 +994,871 @@ class SmartAudioTrack(MediaStreamTrack):
         except Exception:
             pass
 
+# ------------ Opus 直通音频轨道：直接输出编码包，aiortc 只做 RTP 打包 ------------
+class OpusPassthroughTrack(SmartAudioTrack):
+    def __init__(self):
+        # TTS 输出的 Opus 固定为 48kHz / 20ms，不受编码配置影响
+        super().__init__(sample_rate=OPUS_CLOCK_RATE, frame_ms=20)
+        self.audio_queue = EncodedPacketQueue()
+        self._encoder = None
+
+    async def recv(self):
+        packet_data, tag = await self.audio_queue.get_next_packet()
+        if packet_data is None and await self._idle_wait():
+            packet_data, tag = await self.audio_queue.get_next_packet()
+        if tag and tag in self.tag_text_map and self.tag_text_map[tag]:
+            await self._send_text_for_tag(tag)
+
+        if packet_data is None:
+            packet = self._silence_packet
+            packet.pts = await self._next_pts(opus_packet_samples(OPUS_SILENCE_PACKET))
+            return packet
+
+        self._idle_frames = 0
+        duration = opus_packet_samples(packet_data) or self.samples
+        packet = Packet(packet_data)
+        packet.pts = await self._next_pts(duration)
+        packet.time_base = Fraction(1, OPUS_CLOCK_RATE)
+        return packet
+
+    async def _synthesize(self, text: str, tag: str = None, sink=None, first=False):
+        await stream_edge_tts_opus_to_packet_queue(text, sink or self.audio_queue, tag, max_retries=3,
+                                                   session=self, priority=first)
+
 # ------------ 流式 EdgeTTS 处理（增加取消/清理逻辑） ------------
-async def stream_edge_tts_to_audio_queue(text, audio_queue_manager, tag=None, max_retries=3):
+async def put_downstream(sink, data, tag, permit=None):
+    """写入下游；下游已满（将阻塞在背压上）时先归还调度许可，腾出空间后再重新申请"""
+    is_full = getattr(sink, "is_full", None)
+    if permit is not None and is_full is not None and is_full():
+        async with permit.released():
+            await sink.put_audio_data(data, tag)
+    else:
+        await sink.put_audio_data(data, tag)
+
+async def stream_edge_tts_to_audio_queue(text, audio_queue_manager, tag=None, max_retries=3, session=None,
+                                         priority=False, voice=None, pool=None, resume=None):
+    """
+    合成 MP3 并解码写入 PCM 音频队列
+
+    pool / resume 默认使用全局连接池与 tts.resume_retries 配置（测试时可传入替身）
+    """
     if not text or not text.strip():
         logging.warning("EdgeTTS接收到空文本，跳过处理")
         return
 
     text = text.strip()
+    voice = voice or TTS_VOICE
+    pool = pool or tts_connection_pool
+    resume = TTS_RESUME_RETRIES if resume is None else resume
     logging.info(f"开始流式EdgeTTS处理 (标签: {tag}): '{text[:50]}...'")
 
+    cache_format = f"s16le_{audio_queue_manager.sample_rate}"
+    use_cache = tts_audio_cache is not None and tts_audio_cache.cacheable(text)
+    if use_cache:
+        cached = tts_audio_cache.get(voice, cache_format, text)
+        if cached is not None:
+            logging.info(f"命中合成缓存 (标签: {tag}): '{text[:30]}...'")
+            pcm = memoryview(cached)
+            chunk_bytes = audio_queue_manager.chunk_size * BYTES_PER_SAMPLE
+            for i in range(0, len(pcm), chunk_bytes):
+                await audio_queue_manager.put_audio_data(pcm[i:i + chunk_bytes], tag)
+            return
+
+    captured = []
+    progress = SynthesisProgress(text)
+    sample_rate = audio_queue_manager.sample_rate
+    # 当前尝试持有的调度许可
+    permit = None
+
+    async def on_pcm(samples):
+        if resume:
+            # 续传时丢弃新音频开头已经播放过的部分
+            count = len(samples) // BYTES_PER_SAMPLE
+            dropped = round(progress.consume(count / sample_rate) * sample_rate)
+            if dropped >= count:
+                return
+            if dropped:
+                samples = samples[dropped * BYTES_PER_SAMPLE:]
+        if use_cache:
+            captured.append(samples)
+        await put_downstream(audio_queue_manager, samples, tag, permit)
+
     for attempt in range(max_retries):
-        ffmpeg = None
-        read_task = None
-        communicate = None
-        pcm_buffer = bytearray()
-        bytes_per_chunk = audio_queue_manager.chunk_size * 4  # float32
-        audio_received = False
+        decoder = None
+        attempt_text = text
+        if resume and progress.delivered > 0:
+            attempt_text, skip = progress.begin_attempt()
+            # 拼接出的音频不写入缓存
+            use_cache = False
+            logging.info(f"从已播放的 {progress.delivered:.2f}s 处续传 (标签: {tag}, 丢弃 {skip:.2f}s): "
+                         f"'{attempt_text[:30]}...'")
+        else:
+            progress = SynthesisProgress(text)
+            captured.clear()
 
         try:
-            logging.info(f"EdgeTTS尝试 {attempt + 1}/{max_retries}")
-            communicate = Communicate(text, voice="zh-CN-XiaoyiNeural")
-
-            ffmpeg = await asyncio.create_subprocess_exec(
-                "ffmpeg",
-                "-loglevel", "quiet",
-                "-f", "mp3",
-                "-i", "pipe:0",
-                "-f", "f32le",
-                "-ac", "1",
-                "-ar", str(audio_queue_manager.sample_rate),
-                "pipe:1",
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            async def read_pcm():
-                nonlocal audio_received, pcm_buffer
+            # 每次尝试向全局调度器申请许可（重试前的退避等待与下游背压期间不占用许可）
+            async with tts_scheduler.slot(session, priority) as permit:
+                logging.info(f"EdgeTTS尝试 {attempt + 1}/{max_retries}")
+                decoder = await create_decoder(
+                    TTS_DECODER_BACKEND,
+                    audio_queue_manager.sample_rate,
+                    audio_queue_manager.chunk_size,
+                    on_pcm,
+                )
+
+                # 中途失败的异常直接交给外层重试（开启续传时从已播放的位置续传），截断的音频不会写入缓存
                 try:
-                    while True:
-                        data = await ffmpeg.stdout.read(4096)
-                        if not data:
-                            break
-                        pcm_buffer.extend(data)
-                        audio_received = True
-                        while len(pcm_buffer) >= bytes_per_chunk:
-                            raw = pcm_buffer[:bytes_per_chunk]
-                            del pcm_buffer[:bytes_per_chunk]
-                            samples = np.frombuffer(raw, dtype=np.float32)
-                            await audio_queue_manager.put_audio_data(samples, tag)
+                    async for chunk in pool.stream_hedged(attempt_text, voice, MP3_OUTPUT_FORMAT,
+                                                          hedge_after=TTS_HEDGE_AFTER):
+                        # 在取消点检查
+                        await asyncio.sleep(0)
+                        if chunk["type"] == "audio":
+                            await decoder.feed(chunk["data"])
+                        elif chunk["type"] == "WordBoundary":
+                            progress.on_word_boundary(chunk["offset"], chunk["text"])
                 except asyncio.CancelledError:
-                    logging.info("read_pcm 被取消")
-                    raise
-                except Exception as e:
-                    logging.exception(f"read_pcm 异常: {e}")
+                    logging.info("EdgeTTS 流式合成正在被取消")
+                    # propagate cancellation
                     raise
 
-            read_task = asyncio.create_task(read_pcm())
+                await decoder.finish()
 
-            try:
-                async for chunk in communicate.stream():
-                    # 在取消点检查
-                    await asyncio.sleep(0)
-                    if chunk["type"] == "audio":
-                        if ffmpeg.stdin is not None:
-                            try:
-                                ffmpeg.stdin.write(chunk["data"])
-                                await ffmpeg.stdin.drain()
-                            except Exception as e:
-                                logging.warning(f"写入 ffmpeg.stdin 失败: {e}")
-            except asyncio.CancelledError:
-                logging.info("EdgeTTS 的 communicate.stream 正在被取消")
-                # propagate cancellation
+                if not decoder.audio_received:
+                    raise Exception("未接收到音频数据")
+
+                if use_cache:
+                    tts_audio_cache.put(voice, cache_format, text, b"".join(captured))
+                logging.info(f"EdgeTTS 流式处理完成 (标签: {tag}, 解码: {decoder.name}): '{text[:30]}...'")
+                return
+
+        except asyncio.CancelledError:
+            logging.info("EdgeTTS 任务被取消，进行清理")
+            if decoder:
+                await decoder.abort()
+            raise
+        except Exception as e:
+            logging.exception(f"EdgeTTS 尝试 {attempt + 1} 失败: {e}")
+            # 清理解码器（子任务/子进程）
+            if decoder:
+                await decoder.abort()
+            if attempt < max_retries - 1 and resume and progress.delivered > 0:
+                # 已经在播放：立即续传，避免播放中断
+                continue
+            if attempt < max_retries - 1:
+                wait_time = 2 ** attempt
+                logging.info(f"等待 {wait_time} 秒后重试...")
+                await asyncio.sleep(wait_time)
+            else:
+                logging.error(f"EdgeTTS 处理失败，重试 {max_retries} 次后放弃 (标签: {tag}): '{text[:30]}...'")
+                raise
+
+async def stream_edge_tts_opus_to_packet_queue(text, packet_queue, tag=None, max_retries=3, session=None,
+                                               priority=False, voice=None, pool=None, resume=None):
+    """请求 Ogg/Opus 输出并把解封装出的 Opus 包直接放入队列（不解码）；pool / resume 同上"""
+    if not text or not text.strip():
+        logging.warning("EdgeTTS接收到空文本，跳过处理")
+        return
+
+    text = text.strip()
+    voice = voice or TTS_VOICE
+    pool = pool or tts_connection_pool
+    resume = TTS_RESUME_RETRIES if resume is None else resume
+    logging.info(f"开始 Opus 直通 EdgeTTS 处理 (标签: {tag}): '{text[:50]}...'")
+
+    use_cache = tts_audio_cache is not None and tts_audio_cache.cacheable(text)
+    if use_cache:
+        cached = tts_audio_cache.get(voice, TTS_OPUS_FORMAT, text)
+        if cached is not None:
+            logging.info(f"命中合成缓存 (标签: {tag}): '{text[:30]}...'")
+            for packet in unpack_packets(cached):
+                await packet_queue.put_audio_data(packet, tag)
+            return
+
+    progress = SynthesisProgress(text)
+    for attempt in range(max_retries):
+        demuxer = OggOpusDemuxer()
+        packets_received = 0
+        captured = []
+        attempt_text = text
+        if resume and progress.delivered > 0:
+            attempt_text, skip = progress.begin_attempt()
+            use_cache = False
+            logging.info(f"从已播放的 {progress.delivered:.2f}s 处续传 (标签: {tag}, 丢弃 {skip:.2f}s): "
+                         f"'{attempt_text[:30]}...'")
+        else:
+            progress = SynthesisProgress(text)
+        try:
+            # 每次尝试向全局调度器申请许可（重试前的退避等待与下游背压期间不占用许可）
+            async with tts_scheduler.slot(session, priority) as permit:
+                logging.info(f"EdgeTTS尝试 {attempt + 1}/{max_retries}")
+                async for chunk in pool.stream_hedged(attempt_text, voice, TTS_OPUS_FORMAT,
+                                                      hedge_after=TTS_HEDGE_AFTER):
+                    if chunk["type"] == "WordBoundary":
+                        progress.on_word_boundary(chunk["offset"], chunk["text"])
+                    if chunk["type"] != "audio":
+                        continue
+                    for packet in demuxer.feed(chunk["data"]):
+                        # 以包为单位丢弃与已播放部分重叠的音频
+                        if progress.consume(opus_packet_samples(packet) / OPUS_CLOCK_RATE) > 0:
+                            continue
+                        await put_downstream(packet_queue, packet, tag, permit)
+                        packets_received += 1
+                        if use_cache:
+                            captured.append(packet)
+
+                if not packets_received:
+                    raise Exception("未接收到音频数据")
+
+                if use_cache:
+                    tts_audio_cache.put(voice, TTS_OPUS_FORMAT, text, pack_packets(captured))
+
+                logging.info(f"Opus 直通处理完成 (标签: {tag}, {packets_received} 个包): '{text[:30]}...'")
+                return
+
+        except asyncio.CancelledError:
+            logging.info("EdgeTTS 任务被取消")
+            raise
+        except Exception as e:
+            logging.exception(f"EdgeTTS 尝试 {attempt + 1} 失败: {e}")
+            if attempt < max_retries - 1 and resume and progress.delivered > 0:
+                continue
+            if attempt < max_retries - 1:
+                wait_time = 2 ** attempt
+                logging.info(f"等待 {wait_time} 秒后重试...")
+                await asyncio.sleep(wait_time)
+            else:
+                logging.error(f"EdgeTTS 处理失败，重试 {max_retries} 次后放弃 (标签: {tag}): '{text[:30]}...'")
                 raise
+
+# ------------ 合成缓存预热 ------------
+class _DiscardSink:
+    """预热缓存时使用的空目标队列"""
+    def __init__(self, sample_rate=48000, frame_ms=20):
+        self.sample_rate = sample_rate
+        self.chunk_size = int(sample_rate * frame_ms / 1000)
+
+    def is_full(self):
+        return False
+
+    async def put_audio_data(self, audio_data, tag=None):
+        pass
+
+def load_prewarm_phrases(config):
+    phrases = list(config.get("prewarm", []))
+    path = config.get("prewarm_file")
+    if path:
+        try:
+            with open(os.path.join(ROOT, path), "r", encoding="utf-8") as f:
+                phrases.extend(line.strip() for line in f if line.strip())
+        except OSError as e:
+            logging.warning(f"读取预热短语文件失败 {path}: {e}")
+    return phrases
+
+async def prewarm_tts_cache(phrases, concurrency=4):
+    """合成短语列表并写入缓存（已缓存的短语直接命中，不会重复合成）"""
+    if tts_audio_cache is None or not phrases:
+        return
+    semaphore = asyncio.Semaphore(concurrency)
+    synthesize = stream_edge_tts_opus_to_packet_queue if TTS_OPUS_PASSTHROUGH else stream_edge_tts_to_audio_queue
+
+    async def warm_one(phrase):
+        async with semaphore:
+            try:
+                await synthesize(phrase, _DiscardSink(), None, max_retries=2)
             except Exception as e:
-                logging.warning(f"EdgeTTS 流式读取异常: {e}")
-                # 尝试读取 stderr
-                try:
-                    if ffmpeg and ffmpeg.stderr:
-                        stderr_data = await ffmpeg.stderr.read()
-                        if stderr_data:
-                            logging.error(f"ffmpeg stderr: {stderr_data.decode('utf-8', errors='ignore')}")
-                except Exception:
-                    pass
+                logging.warning(f"预热短语失败 '{phrase[:30]}': {e}")
 
-            if ffmpeg.stdin is not None:
-                try:
-                    ffmpeg.stdin.close()
-                    await ffmpeg.stdin.wait_closed()
-                except Exception:
-                    pass
+    await asyncio.gather(*(warm_one(p) for p in phrases))
+    logging.info(f"合成缓存预热完成: {len(phrases)} 条短语, 统计: {tts_audio_cache.summary()}")
+
+# ------------ 填充语音：启动时合成一次，常驻内存 ------------
+class _ClipSink(_DiscardSink):
+    """收集一条短语的全部输出（PCM 字节或 Opus 包）"""
+    def __init__(self, sample_rate=48000, frame_ms=20, opus=False):
+        super().__init__(sample_rate, frame_ms)
+        self.opus = opus
+        self.pcm = bytearray()
+        self.packets = []
+
+    async def put_audio_data(self, audio_data, tag=None):
+        if self.opus:
+            self.packets.append(bytes(audio_data))
+        else:
+            self.pcm.extend(audio_data)
+
+class FillerBank:
+    """
+    预先合成的填充短语：PCM 会话使用去掉首尾静音的 int16 数组，Opus 直通会话使用 Opus 包列表
 
-            # 等待读取任务完成或取消
+    各短语轮流使用，避免连续两次听到同一句
+    """
+
+    def __init__(self, phrases, sample_rate):
+        self.phrases = [p for p in phrases if p.strip()]
+        self.sample_rate = sample_rate
+        self.pcm_clips = []
+        self.opus_clips = []
+        self.stats = {"played": 0, "skipped": 0}
+        self._next = 0
+
+    async def render(self, opus=False):
+        """合成全部短语；失败的短语跳过"""
+        threshold = db_to_amplitude(float(TTS_SHAPING_CONFIG.get("silence_threshold_db", -45)))
+        for phrase in self.phrases:
             try:
-                await read_task
-            except asyncio.CancelledError:
-                logging.info("read_task 被取消，继续清理")
-                raise
+                sink = _ClipSink(self.sample_rate)
+                await stream_edge_tts_to_audio_queue(phrase, sink, None, max_retries=2)
+                samples = np.frombuffer(bytes(sink.pcm), dtype=np.int16)
+                start, end = first_loud(samples, threshold), last_loud(samples, threshold)
+                if start >= 0:
+                    self.pcm_clips.append(samples[start:end + 1])
+                if opus:
+                    sink = _ClipSink(OPUS_CLOCK_RATE, opus=True)
+                    await stream_edge_tts_opus_to_packet_queue(phrase, sink, None, max_retries=2)
+                    if sink.packets:
+                        self.opus_clips.append(sink.packets)
+            except Exception as e:
+                logging.warning(f"合成填充语音失败 '{phrase[:30]}': {e}")
+        logging.info(f"填充语音已就绪: PCM {len(self.pcm_clips)} 条, Opus {len(self.opus_clips)} 条")
+
+    def clip_for(self, audio_queue):
+        """返回适用于该音频队列的下一条填充语音，没有时返回 None"""
+        if isinstance(audio_queue, EncodedPacketQueue):
+            clips = self.opus_clips
+        elif audio_queue.sample_rate == self.sample_rate:
+            clips = self.pcm_clips
+        else:
+            return None
+        if not clips:
+            return None
+        self._next += 1
+        return clips[self._next % len(clips)]
+
+    def summary(self):
+        return {
+            "phrases": len(self.phrases),
+            "pcm_clips": len(self.pcm_clips),
+            "opus_clips": len(self.opus_clips),
+            **self.stats,
+        }
+
+filler_bank = FillerBank(TTS_FILLER_PHRASES, TTS_ENCODER_PROFILE["sample_rate"]) if TTS_FILLER_PHRASES else None
+
+async def play_filler(smart_audio_track: SmartAudioTrack, tag: str):
+    """回复开始 TTS_FILLER_DELAY 秒后仍没有真实音频时播放一条填充语音；真实音频写入时由音频队列截断"""
+    await asyncio.sleep(TTS_FILLER_DELAY)
+    if smart_audio_track.response_tag != tag:
+        return
+    clip = filler_bank.clip_for(smart_audio_track.audio_queue)
+    if clip is not None and smart_audio_track.audio_queue.start_filler(clip, tag):
+        filler_bank.stats["played"] += 1
+        logging.info(f"首段音频未到达，播放填充语音 (标签: {tag})")
+    else:
+        filler_bank.stats["skipped"] += 1
+
+def is_interrupt_message(message) -> bool:
+    """DataChannel 上的显式打断指令：{"type": "interrupt"}"""
+    if not isinstance(message, str) or not message.startswith("{"):
+        return False
+    try:
+        return json.loads(message).get("type") == "interrupt"
+    except (ValueError, AttributeError):
+        return False
+
+# ------------ 消息处理（WebRTC DataChannel 与 WebSocket 共用） ------------
+async def handle_interrupt(smart_audio_track: SmartAudioTrack, channel):
+    """打断当前回复并通知前端"""
+    tag = await smart_audio_track.interrupt()
+    if tag is not None and channel.readyState == "open":
+        try:
+            channel.send(json.dumps({"type": "interrupted", "tag": tag}))
+        except Exception:
+            pass
+
+async def handle_message(smart_audio_track: SmartAudioTrack, channel, message: str):
+    """把原 on_message 的逻辑抽成协程，便于用 create_pc_task 追踪与取消；channel 为 DataChannel 或 WebSocketChannel"""
+    logging.info("收到文本: %s", message)
+
+    if llm_provider is None:
+        error_msg = "LLM 提供者未初始化，请检查配置"
+        logging.error(error_msg)
+        try:
+            if channel.readyState == "open":
+                channel.send(json.dumps({"type": "error", "error": error_msg}))
+        except Exception:
+            pass
+        return
 
-            return_code = await ffmpeg.wait()
-            if return_code != 0:
-                logging.warning(f"ffmpeg 非零退出: {return_code}")
+    # 打断模式：新消息立即终止上一条回复（包括仍在播放的音频），而不是排队等待
+    if TTS_BARGE_IN:
+        # 仍在等待 message_lock 的上一条消息同样作废：只回复最新的一条
+        queued = smart_audio_track.queued_message_task
+        if queued is not None and not queued.done() and queued is not asyncio.current_task():
+            queued.cancel()
+        smart_audio_track.queued_message_task = asyncio.current_task()
+        await handle_interrupt(smart_audio_track, channel)
+
+    async with smart_audio_track.message_lock:
+        if smart_audio_track.queued_message_task is asyncio.current_task():
+            smart_audio_track.queued_message_task = None
+        tts_started = False
+        tag = None
+        filler_task = None
+        try:
+            smart_audio_track.message_counter += 1
+            tag = f"msg_{smart_audio_track.message_counter}"
+            logging.info(f"为本次LLM响应生成标签: {tag}")
+            smart_audio_track.tag_text_map[tag] = []
+            smart_audio_track.response_tag = tag
+            smart_audio_track.response_task = asyncio.current_task()
+
+            if channel.readyState == "open":
                 try:
-                    stderr_data = await ffmpeg.stderr.read()
-                    if stderr_data:
-                        logging.error(f"ffmpeg stderr: {stderr_data.decode('utf-8', errors='ignore')}")
+                    channel.send(json.dumps({"type": "tts_start", "text": "正在处理LLM响应..."}))
                 except Exception:
                     pass
+            if filler_bank is not None:
+                filler_task = asyncio.create_task(play_filler(smart_audio_track, tag))
+
+            logging.info("开始流式 LLM 处理")
+            # 开始流式 LLM
+            async for chunk in llm_provider.generate_response_stream(message):
+                # 如果此任务被取消，会在 await 时抛出 CancelledError
+                if chunk.strip():
+                    await smart_audio_track.add_text_to_buffer(chunk, tag)
+                    logging.debug(f"TTS chunk已添加到缓冲区 (标签: {tag}): {chunk[:50]}...")
+                    if not tts_started:
+                        tts_started = True
+                        if channel.readyState == "open":
+                            try:
+                                channel.send(json.dumps({"type": "tts_start", "text": "开始生成语音..."}))
+                            except Exception:
+                                pass
 
-            if not audio_received:
-                raise Exception("未接收到音频数据")
-
-            logging.info(f"EdgeTTS 流式处理完成 (标签: {tag}): '{text[:30]}...'")
-            return
+            # 强制刷新剩余缓冲区
+            await smart_audio_track.flush_buffer(tag)
 
-        except asyncio.CancelledError:
-            logging.info("EdgeTTS 任务被取消，进行清理")
-            # 取消 read_task
-            if read_task and not read_task.done():
-                read_task.cancel()
+            if channel.readyState == "open":
                 try:
-                    await read_task
+                    channel.send(json.dumps({"type": "tts_complete"}))
                 except Exception:
                     pass
-            # 关闭 stdin
-            try:
-                if ffmpeg and ffmpeg.stdin:
-                    ffmpeg.stdin.close()
-                    await ffmpeg.stdin.wait_closed()
-            except Exception:
-                pass
-            # kill ffmpeg
+
+            logging.info(f"TTS 流式处理完成 (标签: {tag})")
+
+        except asyncio.CancelledError:
+            logging.info(f"handle_message for {tag} 被取消（连接断开或被打断）")
+            if filler_task is not None:
+                filler_task.cancel()
+            # 可能希望通知前端，但连接已经断开或正在断开，忽略
+            raise
+        except Exception as e:
+            error_msg = f"LLM 处理失败: {str(e)}"
+            logging.exception(error_msg)
             try:
-                if ffmpeg and ffmpeg.returncode is None:
-                    ffmpeg.kill()
-                    await ffmpeg.wait()
+                if channel.readyState == "open":
+                    channel.send(json.dumps({"type": "error", "error": error_msg}))
             except Exception:
                 pass
-            raise
-        except Exception as e:
-            logging.exception(f"EdgeTTS 尝试 {attempt + 1} 失败: {e}")
-            # 清理子任务/子进程
-            if read_task and not read_task.done():
-                read_task.cancel()
+        finally:
+            # 没有产生任何文本（LLM 失败或空回复）时不再播放填充语音
+            if filler_task is not None and not tts_started:
+                filler_task.cancel()
+            if smart_audio_track.response_task is asyncio.current_task():
+                smart_audio_track.response_task = None
+
+# ------------ WebSocket 会话：不经过 ICE/DTLS，直接在同一个连接上收发文本与音频 ------------
+ws_sessions = set()
+# WebSocket 会话的音频格式
+WS_AUDIO_FORMATS = ("pcm", "opus")
+
+
+class WebSocketChannel:
+    """
+    以 DataChannel 的接口（readyState / send）包装 WebSocket
+
+    send 只把文本事件放进发件箱，由 ws_audio_sender 与音频帧按顺序写出，
+    因此 text_chunk 总在对应的音频之前到达，且同一时刻只有一个协程写 socket
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.readyState = "open"
+        self.outbox = deque()
+        self.wakeup = asyncio.Event()
+        self._tasks = []
+
+    def send(self, message):
+        if self.readyState == "open":
+            self.outbox.append(message)
+            self.wakeup.set()
+
+    async def flush(self):
+        while self.outbox:
+            await self.websocket.send_text(self.outbox.popleft())
+
+
+async def wait_first(*coros):
+    """等待任意一个协程完成，取消其余的"""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def ws_audio_sender(track: SmartAudioTrack, channel: WebSocketChannel, audio_format: str):
+    """
+    把轨道音频队列中的帧写入 WebSocket（PCM: s16le 原始帧；Opus: 每条消息一个包）
+
+    不按实时节拍发送：send 在 socket 写缓冲区满时阻塞，由此向音频队列、合成与 LLM 流反压
+    """
+    audio_queue = track.audio_queue
+    while True:
+        frame_data, tag = await audio_queue.get_next_frame()
+        if tag and tag in track.tag_text_map and track.tag_text_map[tag]:
+            await track._send_text_for_tag(tag)
+        await channel.flush()
+        if frame_data is None:
+            channel.wakeup.clear()
+            if not channel.outbox:
+                await wait_first(audio_queue.wait_for_data(), channel.wakeup.wait())
+            continue
+        if audio_format == "opus":
+            payload = await track._encoder.encode(track._make_frame(frame_data))
+            if payload is None:
+                continue
+            await channel.websocket.send_bytes(payload)
+        else:
+            await channel.websocket.send_bytes(frame_data.tobytes())
+
+
+# ------------ 预建 PeerConnection ------------
+def create_connection():
+    """创建 PeerConnection 与音频轨道（不收集候选地址，也不启动 worker）"""
+    pc = RTCPeerConnection()
+    # 初始化任务列表与标志
+    pc._tasks = []
+    pc._cancelled = False
+    # 创建智能音频轨道（注意：不在内部创建 worker）
+    track = OpusPassthroughTrack() if TTS_OPUS_PASSTHROUGH else SmartAudioTrack()
+    pc.addTrack(track)
+    return pc, track
+
+async def gather_connection(pc: RTCPeerConnection):
+    """提前收集 ICE 候选地址（包括 STUN 查询）；setLocalDescription 时不会重复收集"""
+    await asyncio.gather(*(
+        transceiver.sender.transport.transport.iceGatherer.gather()
+        for transceiver in pc.getTransceivers()
+    ))
+
+
+class PeerConnectionPool:
+    """预先创建并收集好候选地址的 PeerConnection + 音频轨道，取出后在后台补充"""
+
+    def __init__(self, size=4, max_age=120.0):
+        self.size = size
+        self.max_age = max_age
+        self._ready = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "expired": 0,
+            "errors": 0,
+        }
+
+    def start(self):
+        if self._task is None and self.size > 0:
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def _discard(self, pc, track):
+        try:
+            await track.close()
+            await pc.close()
+        except Exception:
+            logging.exception("关闭预建连接时出错")
+
+    async def _refill_loop(self):
+        while True:
+            # 先丢弃过期的连接
+            now = time.monotonic()
+            while self._ready and now - self._ready[0][0] > self.max_age:
+                _, pc, track = self._ready.popleft()
+                self.stats["expired"] += 1
+                await self._discard(pc, track)
+            if len(self._ready) < self.size:
+                pc, track = create_connection()
                 try:
-                    await read_task
+                    await gather_connection(pc)
                 except Exception:
-                    pass
+                    self.stats["errors"] += 1
+                    logging.exception("预建 PeerConnection 失败")
+                    await self._discard(pc, track)
+                    await asyncio.sleep(1.0)
+                    continue
+                self._ready.append((time.monotonic(), pc, track))
+                self.stats["created"] += 1
+                continue
+            self._wakeup.clear()
+            await wait_for_event(self._wakeup, self.max_age / 2)
+
+    def take(self):
+        """
+        取出一个可用的连接（不等待）
+
+        Returns:
+            (pc, track)，池为空时返回 None
+        """
+        now = time.monotonic()
+        result = None
+        while self._ready:
+            created, pc, track = self._ready.pop()
+            if now - created <= self.max_age:
+                result = (pc, track)
+                break
+            self.stats["expired"] += 1
+            asyncio.create_task(self._discard(pc, track))
+        self.stats["hits" if result is not None else "misses"] += 1
+        self._wakeup.set()
+        return result
+
+    def summary(self):
+        stats = dict(self.stats)
+        stats["size"] = self.size
+        stats["ready"] = len(self._ready)
+        return stats
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._ready:
+            _, pc, track = self._ready.popleft()
+            await self._discard(pc, track)
+
+
+pc_pool = PeerConnectionPool(PC_POOL_SIZE, PC_POOL_MAX_AGE) if PC_POOL_SIZE > 0 else None
+
+# ------------ 广播频道 ------------
+class ChannelFanout:
+    """把生产者轨道发出的文本事件转发给所有听众的 DataChannel"""
+
+    def __init__(self):
+        self.channels = set()
+
+    @property
+    def readyState(self):
+        return "open" if any(c.readyState == "open" for c in self.channels) else "closed"
+
+    def send(self, message):
+        for channel in list(self.channels):
+            if channel.readyState != "open":
+                continue
             try:
-                if ffmpeg and ffmpeg.returncode is None:
-                    ffmpeg.kill()
-                    await ffmpeg.wait()
+                channel.send(message)
             except Exception:
-                pass
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                logging.info(f"等待 {wait_time} 秒后重试...")
-                await asyncio.sleep(wait_time)
+                logging.exception("向听众发送消息失败")
+
+
+class BroadcastHub:
+    """一个生产者（LLM → 分段 → TTS → 编码）的输出包被多个订阅轨道按引用共享"""
+
+    def __init__(self, name, backlog_ms=1000, max_queued=8):
+        self.name = name
+        self.max_queued = max_queued
+        # 最近一次有听众进出或播报的时刻，用于回收空闲频道
+        self.last_active = time.monotonic()
+        # 生产者轨道直接输出 Opus 包：只编码一次，订阅者的发送端只做 RTP 打包
+        self.track = OpusPassthroughTrack() if TTS_OPUS_PASSTHROUGH else SmartAudioTrack(encode=True)
+        self.channel = ChannelFanout()
+        self.track.channel = self.channel
+        self._packets = deque(maxlen=max(1, backlog_ms // self.track.frame_ms))
+        # 已发布的包数（下一个包的序号）
+        self.seq = 0
+        # 所有等待下一个包的订阅者共享同一个 future，每次发布只唤醒一次
+        self._next = None
+        self.subscribers = set()
+        self._tasks = []
+        self._speech_tasks = set()
+        self.stats = {
+            "published": 0,
+            "skipped": 0,
+        }
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self.track._worker_loop()), asyncio.create_task(self._pump())]
+
+    async def _pump(self):
+        """按生产者轨道的节拍取包并发布"""
+        silence = self.track._silence_packet
+        while True:
+            packet = await self.track.recv()
+            if packet is silence:
+                # 生产者复用同一个静音包对象，发布前换成独立的包，避免修改已发布包的时间戳
+                shared = Packet(bytes(packet))
+                shared.pts = packet.pts
+                shared.time_base = packet.time_base
+                packet = shared
+            self._publish(packet)
+
+    def _publish(self, packet):
+        self._packets.append(packet)
+        self.seq += 1
+        self.stats["published"] += 1
+        if self._next is not None and not self._next.done():
+            self._next.set_result(None)
+        self._next = None
+
+    def speak(self, text, use_llm=False):
+        """
+        在后台播报（多次调用按顺序排队，由生产者轨道的 message_lock 串行）
+
+        Returns:
+            排队的播报已达 max_queued 时返回 False（不排队）
+        """
+        if self.max_queued > 0 and len(self._speech_tasks) >= self.max_queued:
+            return False
+        self.last_active = time.monotonic()
+        task = asyncio.create_task(broadcast_speak(self, text, use_llm))
+        self._speech_tasks.add(task)
+        task.add_done_callback(self._speech_done)
+        return True
+
+    def _speech_done(self, task):
+        self._speech_tasks.discard(task)
+        self.last_active = time.monotonic()
+
+    def is_idle(self, timeout):
+        """没有听众、没有待播报内容，且已空闲超过 timeout 秒"""
+        return (not self.subscribers and not self._speech_tasks
+                and time.monotonic() - self.last_active >= timeout)
+
+    def subscribe(self, subscriber):
+        # 新听众从最新位置开始，不回放积压的音频
+        subscriber.seq = self.seq
+        self.subscribers.add(subscriber)
+        self.last_active = time.monotonic()
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        self.last_active = time.monotonic()
+
+    async def read(self, subscriber):
+        """返回订阅者的下一个包（与其它订阅者共享同一对象），没有新包时等待"""
+        while subscriber.seq >= self.seq:
+            if self._next is None:
+                self._next = asyncio.get_running_loop().create_future()
+            await asyncio.shield(self._next)
+        oldest = self.seq - len(self._packets)
+        if subscriber.seq < oldest:
+            # 落后超过积压上限：跳到最新的包
+            self.stats["skipped"] += self.seq - 1 - subscriber.seq
+            subscriber.seq = self.seq - 1
+        packet = self._packets[subscriber.seq - oldest]
+        subscriber.seq += 1
+        return packet
+
+    def summary(self):
+        stats = dict(self.stats)
+        stats["name"] = self.name
+        stats["subscribers"] = len(self.subscribers)
+        stats["listeners"] = len(self.channel.channels)
+        stats["seq"] = self.seq
+        stats["queued"] = len(self._speech_tasks)
+        return stats
+
+    async def close(self):
+        tasks = self._tasks + list(self._speech_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        await self.track.close()
+
+
+class BroadcastSubscriberTrack(MediaStreamTrack):
+    """听众的音频轨道：不合成也不编码，只转发 BroadcastHub 发布的包"""
+    kind = "audio"
+
+    def __init__(self, hub):
+        super().__init__()
+        self.hub = hub
+        self.seq = 0
+        hub.subscribe(self)
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+        return await self.hub.read(self)
+
+    def stop(self):
+        self.hub.unsubscribe(self)
+        super().stop()
+
+
+broadcasts = {}
+
+def get_broadcast(name):
+    """按名称获取广播频道，不存在时创建并启动；频道数已达上限时返回 None"""
+    hub = broadcasts.get(name)
+    if hub is None:
+        if BROADCAST_MAX_CHANNELS > 0 and len(broadcasts) >= BROADCAST_MAX_CHANNELS:
+            return None
+        hub = broadcasts[name] = BroadcastHub(name, BROADCAST_BACKLOG_MS, BROADCAST_MAX_QUEUED)
+        hub.start()
+        logging.info(f"广播频道已创建: {name}")
+    return hub
+
+async def reap_idle_broadcasts():
+    """关闭并移除空闲的广播频道"""
+    for name, hub in list(broadcasts.items()):
+        if hub.is_idle(BROADCAST_IDLE_TIMEOUT) and broadcasts.get(name) is hub:
+            del broadcasts[name]
+            logging.info(f"广播频道空闲，已关闭: {hub.summary()}")
+            await hub.close()
+
+async def broadcast_reaper_loop():
+    interval = max(1.0, BROADCAST_IDLE_TIMEOUT / 2)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reap_idle_broadcasts()
+        except Exception:
+            logging.exception("回收广播频道失败")
+
+def broadcast_full_response():
+    return JSONResponse(status_code=503, content={"error": "too many broadcast channels",
+                                                  "max_channels": BROADCAST_MAX_CHANNELS},
+                        headers={"Retry-After": str(max(1, int(BROADCAST_IDLE_TIMEOUT)))})
+
+async def broadcast_speak(hub, text, use_llm=False):
+    """在广播频道中播报：use_llm 时把 text 作为提问交给 LLM 流式生成，否则直接合成 text"""
+    track = hub.track
+    async with track.message_lock:
+        track.message_counter += 1
+        tag = f"bc_{track.message_counter}"
+        track.tag_text_map[tag] = []
+        hub.channel.send(json.dumps({"type": "tts_start", "text": "开始生成语音..."}))
+        try:
+            if use_llm:
+                async for chunk in llm_provider.generate_response_stream(text):
+                    if chunk.strip():
+                        await track.add_text_to_buffer(chunk, tag)
             else:
-                logging.error(f"EdgeTTS 处理失败，重试 {max_retries} 次后放弃 (标签: {tag}): '{text[:30]}...'")
-                raise
+                await track.add_text_to_buffer(text, tag)
+            await track.flush_buffer(tag)
+            hub.channel.send(json.dumps({"type": "tts_complete"}))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.exception(f"广播 {hub.name} 播报失败")
+            hub.channel.send(json.dumps({"type": "error", "error": f"广播失败: {e}"}))
 
 # ------------ 路由和 WebRTC 逻辑（主逻辑在这里） ------------
 @app.get("/", response_class=HTMLResponse)
@@ -460,24 +1871,53 @@ async def js():
     with open(os.path.join(ROOT, "client.js"), "r", encoding="utf-8") as f:
         return HTMLResponse(f.read(), media_type="application/javascript")
 
+@app.get("/healthz")
+async def healthz():
+    """健康检查：可接受新连接时 200，过载时 503（负载均衡器据此暂停分配新连接）"""
+    report = load_report()
+    if not report["accepting"]:
+        return overloaded_response(report)
+    return {"status": "ok", "load": report["load"]}
+
+@app.get("/capacity")
+async def capacity():
+    """负载评分与剩余容量，供负载均衡器按负载分配新连接"""
+    report = load_report()
+    report["available_sessions"] = max(0, ADMISSION_MAX_SESSIONS - report["sessions"]) if ADMISSION_MAX_SESSIONS > 0 else None
+    return report
+
+@app.get("/stats")
+async def stats():
+    """运行统计：TTS 调度器的排队深度与等待时间，以及缓存、连接池、编码池与预建连接池"""
+    return {
+        "sessions": len(pcs),
+        "ws_sessions": len(ws_sessions),
+        "tts_scheduler": tts_scheduler.summary(),
+        "tts_connection_pool": dict(tts_connection_pool.stats),
+        "tts_cache": tts_audio_cache.summary() if tts_audio_cache is not None else None,
+        "encoder_pool": encoder_pool.summary() if encoder_pool is not None else None,
+        "pc_pool": pc_pool.summary() if pc_pool is not None else None,
+        "filler": filler_bank.summary() if filler_bank is not None else None,
+        "broadcasts": [hub.summary() for hub in broadcasts.values()],
+    }
+
 @app.post("/offer")
 async def offer(request: Request):
     params = await request.json()
     offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
 
-    pc = RTCPeerConnection()
-    # 初始化任务列表与标志
-    pc._tasks = []
-    pc._cancelled = False
+    # 准入检查与 pcs.add 之间没有 await，并发的 offer 不会同时越过上限
+    report = load_report()
+    if not report["accepting"]:
+        logging.warning(f"拒绝新连接 ({report['limiting']}, load={report['load']})")
+        return overloaded_response(report)
 
-    pcs.add(pc)
-    logging.info("新连接来自: %s", request.client.host)
+    # 优先使用预建连接（已收集候选地址）；池为空时现场创建，候选地址在 setLocalDescription 时收集
+    prepared = pc_pool.take() if pc_pool is not None else None
+    pc, smart_audio_track = prepared if prepared is not None else create_connection()
 
-    # 创建智能音频轨道（注意：不在内部创建 worker）
-    smart_audio_track = SmartAudioTrack()
-
-    # 将轨道加入到 PeerConnection
-    audio_sender = pc.addTrack(smart_audio_track)
+    pcs.add(pc)
+    logging.info("新连接来自: %s (预建: %s)", request.client.host, prepared is not None)
 
     # 启动 SmartAudioTrack worker 并把任务关联到 pc
     create_pc_task(pc, smart_audio_track._worker_loop())
@@ -490,79 +1930,10 @@ async def offer(request: Request):
         @channel.on("message")
         def on_message_local(message):
             # datachannel 的回调不能直接 await，所以把实际处理放到 handle_message 协程并注册为 pc 任务
-            create_pc_task(pc, handle_message(pc, smart_audio_track, channel, message))
-
-    async def handle_message(pc: RTCPeerConnection, smart_audio_track: SmartAudioTrack, channel, message: str):
-        """把原 on_message 的逻辑抽成协程，便于用 create_pc_task 追踪与取消"""
-        logging.info("收到文本: %s", message)
-
-        if llm_provider is None:
-            error_msg = "LLM 提供者未初始化，请检查配置"
-            logging.error(error_msg)
-            try:
-                if channel.readyState == "open":
-                    channel.send(json.dumps({"type": "error", "error": error_msg}))
-            except Exception:
-                pass
-            return
-
-        async with smart_audio_track.message_lock:
-            tts_started = False
-            tag = None
-            try:
-                smart_audio_track.message_counter += 1
-                tag = f"msg_{smart_audio_track.message_counter}"
-                logging.info(f"为本次LLM响应生成标签: {tag}")
-                smart_audio_track.tag_text_map[tag] = []
-
-                if channel.readyState == "open":
-                    try:
-                        channel.send(json.dumps({"type": "tts_start", "text": "正在处理LLM响应..."}))
-                    except Exception:
-                        pass
-
-                logging.info("开始流式 LLM 处理")
-                # 开始流式 LLM
-                async for chunk in llm_provider.generate_response_stream(message):
-                    # 如果此任务被取消，会在 await 时抛出 CancelledError
-                    if chunk.strip():
-                        await smart_audio_track.add_text_to_buffer(chunk, tag)
-                        logging.debug(f"TTS chunk已添加到缓冲区 (标签: {tag}): {chunk[:50]}...")
-                        if not tts_started:
-                            tts_started = True
-                            if channel.readyState == "open":
-                                try:
-                                    channel.send(json.dumps({"type": "tts_start", "text": "开始生成语音..."}))
-                                except Exception:
-                                    pass
-
-                # 强制刷新剩余缓冲区
-                await smart_audio_track.flush_buffer(tag)
-
-                if channel.readyState == "open":
-                    try:
-                        channel.send(json.dumps({"type": "tts_complete"}))
-                    except Exception:
-                        pass
-
-                logging.info(f"TTS 流式处理完成 (标签: {tag})")
-
-            except asyncio.CancelledError:
-                logging.info(f"handle_message for {tag} 被取消（连接可能断开）")
-                # 可能希望通知前端，但连接已经断开或正在断开，忽略
-                try:
-                    await smart_audio_track.flush_buffer(tag)
-                except Exception:
-                    pass
-                raise
-            except Exception as e:
-                error_msg = f"LLM 处理失败: {str(e)}"
-                logging.exception(error_msg)
-                try:
-                    if channel.readyState == "open":
-                        channel.send(json.dumps({"type": "error", "error": error_msg}))
-                except Exception:
-                    pass
+            if is_interrupt_message(message):
+                create_pc_task(pc, handle_interrupt(smart_audio_track, channel))
+                return
+            create_pc_task(pc, handle_message(smart_audio_track, channel, message))
 
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
@@ -573,6 +1944,7 @@ async def offer(request: Request):
                 # 已经开始取消流程，避免重复
                 return
             pc._cancelled = True
+            logging.info(f"音频节拍统计: {smart_audio_track._pacer.stats}")
 
             # 标记并取消 SmartAudioTrack（触发 task_queue 退出）
             try:
@@ -599,7 +1971,184 @@ async def offer(request: Request):
     answer = await pc.createAnswer()
     await pc.setLocalDescription(answer)
 
-    return {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+    sdp = pc.localDescription.sdp
+    if not TTS_OPUS_PASSTHROUGH:
+        sdp = apply_encoder_profile_to_sdp(sdp, TTS_ENCODER_PROFILE)
+    return {"sdp": sdp, "type": pc.localDescription.type}
+
+@app.post("/broadcast/{name}/offer")
+async def broadcast_offer(name: str, request: Request):
+    """以听众身份加入广播频道：只接收共享的音频包与文本事件"""
+    if not BROADCAST_ENABLED:
+        return JSONResponse(status_code=404, content={"error": "broadcast disabled"})
+    params = await request.json()
+    offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
+
+    report = load_report()
+    if not report["accepting"]:
+        logging.warning(f"拒绝广播听众 ({report['limiting']}, load={report['load']})")
+        return overloaded_response(report)
+
+    hub = get_broadcast(name)
+    if hub is None:
+        return broadcast_full_response()
+    pc = RTCPeerConnection()
+    pc._tasks = []
+    pc._cancelled = False
+    pcs.add(pc)
+    subscriber = BroadcastSubscriberTrack(hub)
+    pc.addTrack(subscriber)
+    logging.info("广播 %s 新听众: %s", name, request.client.host)
+
+    @pc.on("datachannel")
+    def on_datachannel(channel):
+        hub.channel.channels.add(channel)
+
+    @pc.on("connectionstatechange")
+    async def on_connectionstatechange():
+        if pc.connectionState in ("failed", "closed", "disconnected"):
+            if pc._cancelled:
+                return
+            pc._cancelled = True
+            subscriber.stop()
+            hub.channel.channels = {c for c in hub.channel.channels if c.readyState == "open"}
+            try:
+                await pc.close()
+            except Exception:
+                logging.exception("关闭 pc 时出错")
+            pcs.discard(pc)
+            logging.info("广播 %s 听众离开，剩余 %d", name, len(hub.subscribers))
+
+    await pc.setRemoteDescription(offer)
+    answer = await pc.createAnswer()
+    await pc.setLocalDescription(answer)
+
+    sdp = pc.localDescription.sdp
+    if not TTS_OPUS_PASSTHROUGH:
+        sdp = apply_encoder_profile_to_sdp(sdp, TTS_ENCODER_PROFILE)
+    return {"sdp": sdp, "type": pc.localDescription.type}
+
+@app.post("/broadcast/{name}/say")
+async def broadcast_say(name: str, request: Request):
+    """向广播频道播报一段文本；{"text": ..., "llm": true} 时把文本作为提问交给 LLM"""
+    if not BROADCAST_ENABLED:
+        return JSONResponse(status_code=404, content={"error": "broadcast disabled"})
+    params = await request.json()
+    text = (params.get("text") or "").strip()
+    if not text:
+        return JSONResponse(status_code=400, content={"error": "text is required"})
+    use_llm = bool(params.get("llm", False))
+    if use_llm and llm_provider is None:
+        return JSONResponse(status_code=503, content={"error": "LLM 提供者未初始化，请检查配置"})
+    # 播报同样占用 LLM / TTS 资源：过载时拒绝
+    report = load_report()
+    if not report["accepting"]:
+        logging.warning(f"拒绝广播播报 ({report['limiting']}, load={report['load']})")
+        return overloaded_response(report)
+    hub = get_broadcast(name)
+    if hub is None:
+        return broadcast_full_response()
+    if not hub.speak(text, use_llm):
+        return JSONResponse(status_code=429, content={"error": "broadcast queue full", **hub.summary()},
+                            headers={"Retry-After": "1"})
+    return JSONResponse(status_code=202, content={"queued": True, **hub.summary()})
+
+@app.get("/broadcast/{name}")
+async def broadcast_stats(name: str):
+    hub = broadcasts.get(name)
+    if hub is None:
+        return JSONResponse(status_code=404, content={"error": "no such broadcast"})
+    return hub.summary()
+
+@app.websocket("/ws")
+async def websocket_session(websocket: WebSocket):
+    """
+    WebSocket 会话：客户端发送文本（或 {"type": "interrupt"}），服务端返回 JSON 事件与二进制音频帧
+
+    查询参数 format=pcm（默认，s16le 单声道）或 format=opus（每条二进制消息一个 Opus 包）
+    """
+    await websocket.accept()
+    audio_format = websocket.query_params.get("format", "pcm")
+    if audio_format not in WS_AUDIO_FORMATS:
+        await websocket.send_text(json.dumps({"type": "error", "error": f"不支持的音频格式: {audio_format}"}))
+        await websocket.close(code=1003)
+        return
+    report = load_report()
+    if not report["accepting"]:
+        logging.warning(f"拒绝 WebSocket 会话 ({report['limiting']}, load={report['load']})")
+        await websocket.send_text(json.dumps({"type": "error", "error": "overloaded", **report}))
+        # 1013: Try Again Later
+        await websocket.close(code=1013)
+        return
+
+    track = SmartAudioTrack(encode=audio_format == "opus")
+    channel = WebSocketChannel(websocket)
+    track.channel = channel
+    ws_sessions.add(channel)
+    logging.info("新 WebSocket 会话来自: %s (格式: %s)", websocket.client.host, audio_format)
+    await websocket.send_text(json.dumps({
+        "type": "ready",
+        "format": audio_format,
+        "sample_rate": track.sample_rate,
+        "channels": 1,
+        "frame_ms": track.frame_ms,
+    }))
+    create_pc_task(channel, track._worker_loop())
+    sender = create_pc_task(channel, ws_audio_sender(track, channel, audio_format))
+    try:
+        while True:
+            receive = asyncio.ensure_future(websocket.receive_text())
+            await asyncio.wait([receive, sender], return_when=asyncio.FIRST_COMPLETED)
+            if not receive.done():
+                # 发送端异常退出（连接已断开）
+                receive.cancel()
+                break
+            message = receive.result()
+            if is_interrupt_message(message):
+                create_pc_task(channel, handle_interrupt(track, channel))
+                continue
+            if message.startswith("{"):
+                try:
+                    message = json.loads(message).get("text", "")
+                except (ValueError, AttributeError):
+                    pass
+            if isinstance(message, str) and message.strip():
+                create_pc_task(channel, handle_message(track, channel, message))
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        logging.exception("WebSocket 会话异常")
+    finally:
+        channel.readyState = "closed"
+        await track.close()
+        await cancel_pc_tasks(channel)
+        ws_sessions.discard(channel)
+        logging.info("WebSocket 会话已关闭")
+
+@app.on_event("startup")
+async def on_startup():
+    loop_lag_monitor.start()
+    if pc_pool is not None:
+        pc_pool.start()
+    # 预先建立到 LLM API 的 keep-alive 连接
+    if llm_provider is not None:
+        try:
+            await llm_provider.warmup()
+        except Exception:
+            logging.exception("预热 LLM 提供者失败（已忽略）")
+    # 预热 EdgeTTS 连接，去掉首句的握手延迟
+    output_format = TTS_OPUS_FORMAT if TTS_OPUS_PASSTHROUGH else MP3_OUTPUT_FORMAT
+    try:
+        await tts_connection_pool.warm(TTS_VOICE, output_format, count=int(tts_config.get("pool_warm", 2)))
+    except Exception:
+        logging.exception("预热 EdgeTTS 连接失败（已忽略）")
+    # 后台预热合成缓存，不阻塞服务启动
+    app.state.cache_prewarm_task = asyncio.create_task(prewarm_tts_cache(load_prewarm_phrases(cache_config)))
+    # 填充语音在后台合成，完成前的回复不播放填充语音
+    if filler_bank is not None:
+        app.state.filler_task = asyncio.create_task(filler_bank.render(opus=TTS_OPUS_PASSTHROUGH))
+    if BROADCAST_ENABLED and BROADCAST_IDLE_TIMEOUT > 0:
+        app.state.broadcast_reaper_task = asyncio.create_task(broadcast_reaper_loop())
 
 @app.on_event("shutdown")
 async def on_shutdown():
@@ -617,3 +2166,23 @@ async def on_shutdown():
         await asyncio.gather(*coros, return_exceptions=True)
     pcs.clear()
     logging.info("所有 PeerConnections 已清理完成")
+    for name in ("cache_prewarm_task", "filler_task", "broadcast_reaper_task"):
+        task = getattr(app.state, name, None)
+        if task and not task.done():
+            task.cancel()
+    if tts_audio_cache is not None:
+        logging.info(f"合成缓存统计: {tts_audio_cache.summary()}")
+    logging.info(f"TTS 调度器统计: {tts_scheduler.summary()}")
+    await loop_lag_monitor.stop()
+    for hub in list(broadcasts.values()):
+        logging.info(f"广播频道统计: {hub.summary()}")
+        await hub.close()
+    broadcasts.clear()
+    if pc_pool is not None:
+        logging.info(f"预建连接池统计: {pc_pool.summary()}")
+        await pc_pool.close()
+    if encoder_pool is not None:
+        logging.info(f"编码线程池统计: {encoder_pool.summary()}")
+        encoder_pool.shutdown()
+    await tts_connection_pool.close()
+    await close_shared_http_client()
@@ -0,0 +1,394 @@
+"""
+多进程分片模式
+
+单个 Python 进程同时承担 LLM 流、TTS 解码、帧节拍与 Opus 编码，会话多时整机只能用到一个核。
+supervisor 启动多个 server.py worker 进程（各自监听本机端口），每个 worker 端到端拥有自己创建的
+PeerConnection（媒体走 worker 自己的 UDP 端口，不经过 supervisor）。supervisor 只做 HTTP 入口：
+- /offer：按各 worker 的 /capacity 负载选择最空闲的 worker，该 worker 返回 503 时依次尝试下一个
+- /ws：WebSocket 会话整体转发到最空闲的 worker
+- 会话亲和：/offer 的响应带上 worker 编号（JSON 字段与 X-Worker 响应头），
+  之后带 X-Worker 请求头或 ?worker= 参数的请求都转发到创建该会话的 worker
+- /broadcast/{name}/*：广播频道只存在于一个 worker 的内存中，按频道名的哈希固定转发到同一个 worker，
+  播报方与所有听众总在同一进程
+- /workers：每个 worker 的进程号、端口、会话数与负载；/healthz：任一 worker 可接受新连接时 200
+- worker 进程退出后自动重启
+- 合成音频缓存的磁盘层放在同一目录；worker 的磁盘命中一律以 mmap 读取、不进入进程内的内存层
+  （忽略 mmap_min_kb），共享页缓存而不是各自复制一份
+
+用法:
+    python supervisor.py                    # worker 数取 config.json 的 workers.count（0 为 CPU 核数）
+    python supervisor.py --workers 4 --port 8000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from llm.config import load_config
+
+logging.basicConfig(level=logging.INFO)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 转发时保留的请求头 / 响应头
+_FORWARD_REQUEST_HEADERS = ("Content-Type", "Accept", "User-Agent")
+_FORWARD_RESPONSE_HEADERS = ("Content-Type", "Retry-After")
+
+
+class Worker:
+    """一个 server.py worker 进程及其最近一次上报的负载"""
+
+    def __init__(self, index: int, host: str, port: int):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.restarts = 0
+        self.report: Dict[str, Any] = {}
+        self.last_seen = 0.0
+        # 两次轮询之间分配出去的会话，避免突发的 offer 全部落到同一个 worker
+        self.assigned = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None and self.last_seen > 0
+
+    @property
+    def sessions(self) -> int:
+        return int(self.report.get("sessions", 0)) + self.assigned
+
+    def score(self) -> float:
+        """负载评分：上报的 load 加上未计入的新会话占的比例"""
+        load = float(self.report.get("load", 0.0))
+        max_sessions = int(self.report.get("max_sessions") or 0)
+        if max_sessions > 0:
+            load = max(load, self.sessions / max_sessions)
+        return load
+
+    async def start(self, env: Dict[str, str]) -> None:
+        worker_env = dict(env, WEBRTC_TTS_WORKER_ID=str(self.index))
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "server:app",
+            "--host", self.host, "--port", str(self.port),
+            cwd=ROOT, env=worker_env,
+        )
+        self.report = {}
+        self.last_seen = 0.0
+        self.assigned = 0
+        logging.info(f"worker {self.index} 已启动: pid={self.process.pid}, 端口 {self.port}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"worker {self.index} 未在 {timeout:g}s 内退出，强制结束")
+            self.process.kill()
+            await self.process.wait()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "worker": self.index,
+            "pid": self.process.pid if self.process is not None else None,
+            "port": self.port,
+            "alive": self.alive,
+            "restarts": self.restarts,
+            "sessions": self.sessions,
+            "load": round(self.score(), 4),
+            "accepting": self.alive and bool(self.report.get("accepting", False)),
+            "limiting": self.report.get("limiting"),
+            "tts_queue_depth": self.report.get("tts_queue_depth"),
+            "loop_lag_ms": self.report.get("loop_lag_ms"),
+        }
+
+
+class Supervisor:
+    """启动 worker、轮询负载并把 HTTP 请求路由到合适的 worker"""
+
+    def __init__(self, count: int, host: str = "127.0.0.1", base_port: int = 8100,
+                 poll_interval: float = 1.0, cache_dir: Optional[str] = None):
+        """
+        初始化 supervisor
+
+        Args:
+            count: worker 进程数
+            host: worker 监听地址（只需本机可达）
+            base_port: 第一个 worker 的端口，其余依次递增
+            poll_interval: 轮询 /capacity 的间隔（秒）
+            cache_dir: 各 worker 共享的合成缓存磁盘目录
+        """
+        self.workers = [Worker(i, host, base_port + i) for i in range(count)]
+        self.poll_interval = poll_interval
+        self.env = dict(os.environ)
+        if cache_dir:
+            self.env["WEBRTC_TTS_CACHE_DIR"] = cache_dir
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ws_session: Optional[aiohttp.ClientSession] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def start(self) -> None:
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        # WebSocket 会话是长连接，不设总超时
+        self._ws_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, connect=10))
+        for worker in self.workers:
+            await worker.start(self.env)
+        self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            await asyncio.gather(self._poll_task, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self.workers), return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            await self._ws_session.close()
+
+    async def _poll(self, worker: Worker) -> None:
+        if worker.process is not None and worker.process.returncode is not None and not self._closing:
+            logging.warning(f"worker {worker.index} 已退出 (code={worker.process.returncode})，重新启动")
+            worker.restarts += 1
+            await worker.start(self.env)
+            return
+        try:
+            async with self._session.get(f"{worker.url}/capacity",
+                                         timeout=aiohttp.ClientTimeout(total=self.poll_interval)) as resp:
+                if resp.status == 200:
+                    worker.report = await resp.json()
+                    worker.last_seen = time.monotonic()
+                    worker.assigned = 0
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # 启动中或暂时无响应：保留上次的报告
+            pass
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._poll(worker) for worker in self.workers))
+            await asyncio.sleep(self.poll_interval)
+
+    def candidates(self) -> List[Worker]:
+        """可接受新连接的 worker，按负载从低到高"""
+        ready = [w for w in self.workers if w.alive and w.report.get("accepting", False) and w.score() < 1.0]
+        return sorted(ready, key=lambda w: (w.score(), w.sessions))
+
+    def pinned(self, request: web.Request) -> Optional[Worker]:
+        """请求指定的 worker（X-Worker 请求头或 ?worker= 参数）"""
+        value = request.headers.get("X-Worker") or request.query.get("worker")
+        if value is None:
+            return None
+        try:
+            index = int(value)
+        except ValueError:
+            return None
+        if 0 <= index < len(self.workers):
+            return self.workers[index]
+        return None
+
+    def broadcast_owner(self, name: str) -> Worker:
+        """频道所在的 worker：按频道名的 CRC32 取模（各进程、各次启动结果一致）"""
+        return self.workers[zlib.crc32(name.encode("utf-8")) % len(self.workers)]
+
+    async def forward(self, worker: Worker, request: web.Request, body: bytes):
+        """把请求原样转发给 worker，返回 (状态码, 响应头, 响应体)"""
+        headers = {k: request.headers[k] for k in _FORWARD_REQUEST_HEADERS if k in request.headers}
+        # worker 看到的客户端地址是 supervisor，附上真实地址
+        if request.remote:
+            headers["X-Forwarded-For"] = request.remote
+        async with self._session.request(request.method, f"{worker.url}{request.rel_url}",
+                                         data=body or None, headers=headers) as resp:
+            data = await resp.read()
+            out_headers = {k: resp.headers[k] for k in _FORWARD_RESPONSE_HEADERS if k in resp.headers}
+            return resp.status, out_headers, data
+
+    # ------------ 路由 ------------
+    async def handle_offer(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        pinned = self.pinned(request)
+        workers = [pinned] if pinned is not None else self.candidates()
+        for worker in workers:
+            try:
+                status, headers, data = await self.forward(worker, request, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"转发 offer 到 worker {worker.index} 失败: {e}")
+                continue
+            if status == 503 and pinned is None:
+                # 轮询之后该 worker 已满：换下一个
+                worker.report["accepting"] = False
+                continue
+            if status == 200:
+                worker.assigned += 1
+                try:
+                    answer = json.loads(data)
+                    answer["worker"] = worker.index
+                    return web.json_response(answer, headers={"X-Worker": str(worker.index)})
+                except ValueError:
+                    pass
+            headers["X-Worker"] = str(worker.index)
+            return web.Response(status=status, body=data, headers=headers)
+        return web.json_response(
+            {"error": "overloaded", "workers": [w.summary() for w in self.workers]},
+            status=503,
+            headers={"Retry-After": str(max(1, int(self.poll_interval * 2)))},
+        )
+
+    async def handle_ws(self, request: web.Request) -> web.StreamResponse:
+        """WebSocket 会话：整个连接转发到一个 worker（指定的或最空闲的）"""
+        worker = self.pinned(request)
+        if worker is None:
+            ready = self.candidates()
+            if not ready:
+                return web.json_response({"error": "overloaded"}, status=503,
+                                         headers={"Retry-After": str(max(1, int(self.poll_interval * 2)))})
+            worker = ready[0]
+        worker.assigned += 1
+        client = web.WebSocketResponse(headers={"X-Worker": str(worker.index)})
+        await client.prepare(request)
+        try:
+            async with self._ws_session.ws_connect(f"{worker.url}{request.rel_url}") as upstream:
+                async def pipe(source, target):
+                    # send_* 等待写缓冲区排空，两个方向的反压都会传递下去
+                    async for msg in source:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            await target.send_str(msg.data)
+                        elif msg.type == aiohttp.WSMsgType.BINARY:
+                            await target.send_bytes(msg.data)
+                        else:
+                            break
+
+                tasks = [asyncio.ensure_future(pipe(client, upstream)), asyncio.ensure_future(pipe(upstream, client))]
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"转发 WebSocket 到 worker {worker.index} 失败: {e}")
+        await client.close()
+        return client
+
+    async def handle_workers(self, request: web.Request) -> web.StreamResponse:
+        summaries = [w.summary() for w in self.workers]
+        return web.json_response({
+            "workers": summaries,
+            "sessions": sum(s["sessions"] for s in summaries),
+            "accepting": sum(1 for s in summaries if s["accepting"]),
+        })
+
+    async def handle_healthz(self, request: web.Request) -> web.StreamResponse:
+        if self.candidates():
+            return web.json_response({"status": "ok", "workers": len(self.workers)})
+        return web.json_response({"error": "overloaded"}, status=503,
+                                 headers={"Retry-After": str(max(1, int(self.poll_interval * 2)))})
+
+    async def handle_broadcast(self, request: web.Request) -> web.StreamResponse:
+        """广播频道的请求（加入、播报、统计）全部转发到该频道所在的 worker，忽略负载与 X-Worker"""
+        worker = self.broadcast_owner(request.match_info["name"])
+        if not worker.alive:
+            # 频道状态在该 worker 内存中，不能改投其它 worker（否则播报方与听众会分到不同进程）
+            return web.json_response({"error": f"worker {worker.index} unavailable", "worker": worker.index},
+                                     status=503,
+                                     headers={"Retry-After": str(max(1, int(self.poll_interval * 2)))})
+        try:
+            status, headers, data = await self.forward(worker, request, await request.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return web.json_response({"error": f"worker {worker.index} unavailable: {e}"}, status=502)
+        headers["X-Worker"] = str(worker.index)
+        return web.Response(status=status, body=data, headers=headers)
+
+    async def handle_proxy(self, request: web.Request) -> web.StreamResponse:
+        """其它请求（页面、/stats 等）：指定了 worker 时转发到该 worker，否则转发到最空闲的 worker"""
+        worker = self.pinned(request)
+        if worker is None:
+            ready = self.candidates() or [w for w in self.workers if w.alive]
+            if not ready:
+                return web.json_response({"error": "no worker available"}, status=503)
+            worker = ready[0]
+        try:
+            status, headers, data = await self.forward(worker, request, await request.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return web.json_response({"error": f"worker {worker.index} unavailable: {e}"}, status=502)
+        headers["X-Worker"] = str(worker.index)
+        return web.Response(status=status, body=data, headers=headers)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/offer", self.handle_offer)
+        app.router.add_get("/ws", self.handle_ws)
+        app.router.add_get("/workers", self.handle_workers)
+        app.router.add_get("/healthz", self.handle_healthz)
+        app.router.add_route("*", "/broadcast/{name}", self.handle_broadcast)
+        app.router.add_route("*", "/broadcast/{name}/{action}", self.handle_broadcast)
+        app.router.add_route("*", "/{tail:.*}", self.handle_proxy)
+        return app
+
+
+async def run(args, workers_config: Dict[str, Any], cache_config: Dict[str, Any]) -> None:
+    count = args.workers or int(workers_config.get("count", 0)) or os.cpu_count() or 1
+    # 磁盘缓存目录：tts.cache.disk_dir 优先（worker 自己读取），否则使用共享的默认目录
+    cache_dir = None
+    if cache_config.get("enabled", True) and not cache_config.get("disk_dir"):
+        cache_dir = workers_config.get("cache_dir") or os.path.join(tempfile.gettempdir(), "webrtc-tts-cache")
+
+    supervisor = Supervisor(
+        count,
+        host=workers_config.get("worker_host", "127.0.0.1"),
+        base_port=args.base_port or int(workers_config.get("base_port", 8100)),
+        poll_interval=float(workers_config.get("poll_interval", 1.0)),
+        cache_dir=cache_dir,
+    )
+    await supervisor.start()
+    runner = web.AppRunner(supervisor.make_app())
+    await runner.setup()
+    host = args.host or workers_config.get("host", "0.0.0.0")
+    port = args.port or int(workers_config.get("port", 8000))
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"supervisor 已启动: http://{host}:{port}, {count} 个 worker, 共享缓存目录 {cache_dir}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows 不支持 add_signal_handler，依赖 KeyboardInterrupt
+            pass
+    try:
+        await stop.wait()
+    finally:
+        logging.info("supervisor 关闭：停止所有 worker")
+        await runner.cleanup()
+        await supervisor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程分片模式")
+    parser.add_argument("--workers", type=int, default=0, help="worker 进程数，0 表示使用配置")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--base-port", type=int, default=0, help="第一个 worker 的端口")
+    args = parser.parse_args()
+
+    config = load_config()
+    try:
+        asyncio.run(run(args, config.get("workers", {}), config.get("tts", {}).get("cache", {})))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与 benchmarks/ 相同：以仓库根目录为导入路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,76 @@
+"""广播频道的数量上限、排队上限与空闲回收"""
+import asyncio
+
+import pytest
+
+for _module in ("numpy", "av", "fastapi", "aiortc", "aiohttp", "edge_tts"):
+    pytest.importorskip(_module)
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def channels(monkeypatch):
+    monkeypatch.setattr(server, "broadcasts", {})
+    monkeypatch.setattr(server, "BROADCAST_MAX_CHANNELS", 2)
+    monkeypatch.setattr(server, "BROADCAST_MAX_QUEUED", 2)
+    monkeypatch.setattr(server, "BROADCAST_IDLE_TIMEOUT", 0.05)
+    return server.broadcasts
+
+
+def run(coro):
+    async def body():
+        try:
+            return await coro
+        finally:
+            for hub in list(server.broadcasts.values()):
+                await hub.close()
+    return asyncio.run(body())
+
+
+def test_channel_count_is_capped(channels):
+    async def body():
+        assert server.get_broadcast("a") is not None
+        assert server.get_broadcast("b") is not None
+        assert server.get_broadcast("c") is None
+        assert server.get_broadcast("a") is channels["a"]
+    run(body())
+
+
+def test_speech_queue_is_bounded(channels, monkeypatch):
+    async def body():
+        gate = asyncio.Event()
+
+        async def speak(hub, text, use_llm=False):
+            await gate.wait()
+
+        monkeypatch.setattr(server, "broadcast_speak", speak)
+        hub = server.get_broadcast("a")
+        assert hub.speak("一") and hub.speak("二")
+        assert not hub.speak("三")
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert hub.summary()["queued"] == 0
+        assert hub.speak("四")
+    run(body())
+
+
+def test_idle_channels_are_reaped(channels, monkeypatch):
+    async def body():
+        gate = asyncio.Event()
+
+        async def speak(hub, text, use_llm=False):
+            await gate.wait()
+
+        monkeypatch.setattr(server, "broadcast_speak", speak)
+        idle = server.get_broadcast("idle")
+        busy = server.get_broadcast("busy")
+        busy.speak("还在播报")
+        await asyncio.sleep(0.1)
+        await server.reap_idle_broadcasts()
+        assert list(channels) == ["busy"]
+        assert not idle._tasks
+        # 频道回收后名额释放
+        assert server.get_broadcast("new") is not None
+        gate.set()
+    run(body())
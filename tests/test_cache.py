@@ -0,0 +1,72 @@
+"""AudioCache 的内存层与磁盘层"""
+import os
+import time
+
+from tts.cache import AudioCache
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("memory_max_bytes", 1024 * 1024)
+    return AudioCache(disk_dir=str(tmp_path), **kwargs)
+
+
+def test_small_disk_hit_is_read_into_bytes(tmp_path):
+    make_cache(tmp_path).put("v", "pcm", "你好", b"\x01" * 100)
+    cache = make_cache(tmp_path)
+    value = cache.get("v", "pcm", "你好")
+    assert isinstance(value, bytes) and value == b"\x01" * 100
+    assert cache.stats["disk_hits"] == 1
+    assert cache.get("v", "pcm", "你好") == value
+    assert cache.stats["memory_hits"] == 1
+
+
+def test_large_disk_entries_are_mapped_but_not_kept(tmp_path):
+    data = b"\x02" * 4096
+    cache = make_cache(tmp_path, mmap_min_bytes=1024)
+    cache.put("v", "pcm", "长句子", data)
+    assert cache.summary()["memory_entries"] == 0
+    value = cache.get("v", "pcm", "长句子")
+    assert isinstance(value, memoryview) and bytes(value) == data
+    # 内存层不持有映射：每次命中重新映射，用完即释放
+    assert cache.summary()["memory_entries"] == 0
+    value.release()
+
+
+def test_disk_budget_evicts_oldest(tmp_path):
+    cache = make_cache(tmp_path, disk_max_bytes=3000)
+    for i in range(5):
+        cache.put("v", "pcm", f"短语{i}", bytes([i]) * 1000)
+        path = cache._disk_path(cache.make_key("v", "pcm", f"短语{i}"))
+        # 已写入的条目按写入顺序设为过去的修改时间，新写入的条目总是最新
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+    summary = cache.summary()
+    assert summary["disk_bytes"] <= 3000
+    assert summary["disk_evictions"] >= 2
+    fresh = make_cache(tmp_path, disk_max_bytes=3000, memory_max_bytes=0)
+    assert fresh.get("v", "pcm", "短语4") is not None
+    assert fresh.get("v", "pcm", "短语0") is None
+
+
+def test_disk_hit_refreshes_mtime(tmp_path):
+    cache = make_cache(tmp_path, memory_max_bytes=0)
+    cache.put("v", "pcm", "你好", b"\x03" * 10)
+    path = cache._disk_path(cache.make_key("v", "pcm", "你好"))
+    os.utime(path, (0, 0))
+    assert cache.get("v", "pcm", "你好") is not None
+    assert os.stat(path).st_mtime > 0
+
+
+def test_startup_scan_counts_existing_entries(tmp_path):
+    make_cache(tmp_path).put("v", "pcm", "你好", b"\x04" * 500)
+    assert make_cache(tmp_path).summary()["disk_bytes"] == 500
+
+
+def test_shared_mode_keeps_disk_entries_out_of_memory(tmp_path):
+    cache = make_cache(tmp_path, mmap_min_bytes=0)
+    cache.put("v", "pcm", "你好", b"\x03" * 100)
+    assert cache.summary()["memory_entries"] == 0
+    other = make_cache(tmp_path, mmap_min_bytes=0)
+    value = other.get("v", "pcm", "你好")
+    assert isinstance(value, memoryview) and bytes(value) == b"\x03" * 100
+    assert other.summary()["memory_entries"] == 0
+    assert other.stats["disk_hits"] == 1
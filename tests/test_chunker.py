@@ -0,0 +1,115 @@
+"""文本分段：逐个 token 送入 FixedChunker / AdaptiveChunker"""
+import random
+
+import pytest
+
+from tts.chunker import AdaptiveChunker, FixedChunker, create_chunker
+
+
+def tokens_of(text, seed=0):
+    """模拟 LLM 流式输出：随机切成 1~4 个字符的 token"""
+    rng = random.Random(seed)
+    tokens, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, 4)
+        tokens.append(text[i:i + size])
+        i += size
+    return tokens
+
+
+def run(chunker, tokens):
+    chunks = []
+    for token in tokens:
+        chunks.extend(chunker.feed(token))
+    rest = chunker.flush()
+    if rest is not None:
+        chunks.append(rest)
+    return chunks
+
+
+def streams(text):
+    """逐字符与若干种随机 token 切法"""
+    yield list(text)
+    for seed in range(20):
+        yield tokens_of(text, seed)
+
+
+def assert_not_split(chunks, protected):
+    """protected 中的每个片段都完整地出现在某一段中"""
+    for item in protected:
+        assert any(item in chunk for chunk in chunks), (item, chunks)
+
+
+@pytest.mark.parametrize("text, protected", [
+    ("圆周率约等于3.14，比较常用。", ["3.14"]),
+    ("今年一共卖出了1,000台设备，比去年多。", ["1,000"]),
+    ("版本号是v2.10.3，请升级。", ["v2.10.3"]),
+    ("详情请访问https://example.com/docs/a.b?x=1,2 然后继续阅读。", ["https://example.com/docs/a.b?x=1,2"]),
+    ("也可以打开www.example.org/path 查看。", ["www.example.org/path"]),
+    ("他大喊：“真的吗！？」好吧。", ["！？」"]),
+    ("什么？！……我不信。", ["？！……"]),
+])
+def test_adaptive_never_splits_numbers_urls_or_punctuation_runs(text, protected):
+    for tokens in streams(text):
+        chunks = run(AdaptiveChunker(), tokens)
+        assert "".join(chunks) == text
+        assert_not_split(chunks, protected)
+
+
+def test_adaptive_first_chunk_is_short():
+    text = "好的，我来为你详细介绍一下这个问题的背景，以及可能的几种解决办法。首先我们需要了解它的成因。"
+    for tokens in streams(text):
+        chunks = run(AdaptiveChunker(first_min_chars=2, first_max_chars=24), tokens)
+        assert chunks[0] == "好的，"
+
+
+def test_adaptive_first_chunk_is_capped_without_punctuation():
+    text = "这是一段没有任何标点符号的很长很长很长很长很长很长的文本用来测试首段上限"
+    chunks = run(AdaptiveChunker(first_min_chars=2, first_max_chars=10), list(text))
+    assert len(chunks[0]) <= 10
+    assert "".join(chunks) == text
+
+
+def test_adaptive_chunks_grow_towards_target():
+    sentence = "这是用来测试分段长度的一句话。"
+    text = sentence * 40
+    chunker = AdaptiveChunker(first_min_chars=2, first_max_chars=24, target_chars=16, growth=2.0, max_chars=160)
+    chunks = run(chunker, tokens_of(text, 1))
+    assert "".join(chunks) == text
+    lengths = [len(c) for c in chunks[:-1]]
+    # 首段在第一个句号处切分；之后每段不短于当前目标长度的一半，且总体逐段增长直到上限
+    assert lengths[0] == len(sentence)
+    assert lengths[1] >= 16 // 2
+    assert lengths[3] > lengths[1]
+    assert max(lengths) <= 160
+    assert max(lengths) >= 160 - len(sentence)
+
+
+def test_adaptive_flush_restarts_with_short_first_chunk():
+    chunker = AdaptiveChunker()
+    run(chunker, tokens_of("第一条回复。" * 10))
+    chunks = run(chunker, list("好的，第二条回复的内容比较长，需要分成几段来播放。"))
+    assert chunks[0] == "好的，"
+
+
+def test_fixed_splits_at_sentence_endings_and_max_chars():
+    chunks = run(FixedChunker(max_chars=60), list("你好。今天天气不错，"))
+    assert chunks == ["你好。", "今天天气不错，"]
+    text = "没" * 130
+    chunks = run(FixedChunker(max_chars=60), list(text))
+    assert [len(c) for c in chunks] == [60, 60, 10]
+
+
+def test_fixed_preserves_text_for_any_tokenization():
+    text = "圆周率约等于3.14，详情见https://example.com 。他问：“真的吗！？」"
+    for tokens in streams(text):
+        chunks = run(FixedChunker(max_chars=20), tokens)
+        assert "".join(chunks) == text
+        assert all(len(c) <= 20 + 3 for c in chunks)
+
+
+def test_create_chunker():
+    assert isinstance(create_chunker({"strategy": "fixed"}), FixedChunker)
+    assert isinstance(create_chunker({}), AdaptiveChunker)
+    with pytest.raises(ValueError):
+        create_chunker({"strategy": "unknown"})
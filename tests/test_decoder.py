@@ -0,0 +1,57 @@
+"""PyAVDecoder 的 ID3v2 标签跳过（不需要 PyAV：只测试 feed 之前的字节处理）"""
+import pytest
+
+from tts.decoder import ID3_HEADER_SIZE, PyAVDecoder, id3v2_size
+
+
+async def _noop(pcm):
+    pass
+
+
+def make_tag(body: bytes, footer: bool = False) -> bytes:
+    size = len(body)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    flags = 0x10 if footer else 0
+    return b"ID3" + bytes([4, 0, flags]) + syncsafe + body + (b"3DI" + bytes(7) if footer else b"")
+
+
+def strip_all(decoder, pieces):
+    return b"".join(decoder._strip_id3(piece) for piece in pieces)
+
+
+@pytest.fixture
+def decoder():
+    return PyAVDecoder(24000, 480, _noop)
+
+
+def test_id3v2_size_includes_header_and_footer():
+    assert id3v2_size(make_tag(b"x" * 300)) == ID3_HEADER_SIZE + 300
+    assert id3v2_size(make_tag(b"x" * 300, footer=True)) == ID3_HEADER_SIZE + 300 + ID3_HEADER_SIZE
+
+
+def test_stream_without_tag_passes_through(decoder):
+    audio = b"\xff\xf3" + bytes(100)
+    assert strip_all(decoder, [audio[:1], audio[1:50], audio[50:]]) == audio
+
+
+def test_leading_tag_is_skipped(decoder):
+    audio = b"\xff\xf3" + bytes(100)
+    assert strip_all(decoder, [make_tag(b"TIT2" * 10) + audio]) == audio
+
+
+def test_tag_split_across_feeds(decoder):
+    audio = b"\xff\xf3" + bytes(100)
+    data = make_tag(b"x" * 5000) + audio
+    pieces = [data[i:i + 7] for i in range(0, len(data), 7)]
+    assert strip_all(decoder, pieces) == audio
+
+
+def test_consecutive_tags_are_skipped(decoder):
+    audio = b"\xff\xf3" + bytes(10)
+    assert strip_all(decoder, [make_tag(b"a" * 20) + make_tag(b"b" * 30, footer=True) + audio]) == audio
+
+
+def test_only_leading_tag_is_stripped(decoder):
+    audio = b"\xff\xf3" + bytes(10)
+    later = make_tag(b"c" * 20)
+    assert strip_all(decoder, [audio, later]) == audio + later
@@ -0,0 +1,152 @@
+"""
+EdgeTTSConnectionPool：本地替身服务上的连接复用、失效连接替换与预热；
+stream_hedged 的对冲胜出与有界队列（用替身 stream 代替 websocket）
+"""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("edge_tts")
+
+from benchmarks.edge_standin import EdgeStandIn  # noqa: E402
+from tts.edge import HEDGE_QUEUE_SIZE, MP3_OUTPUT_FORMAT, EdgeTTSConnectionPool  # noqa: E402
+
+VOICE = "zh-CN-XiaoxiaoNeural"
+AUDIO = bytes(range(256)) * 40
+
+
+class ClosingStandIn(EdgeStandIn):
+    """每次合成结束后由服务端关闭连接（模拟空闲连接被服务端断开）"""
+
+    async def _synthesize(self, ws, text):
+        await super()._synthesize(ws, text)
+        await ws.close()
+
+
+def with_standin(standin, body):
+    """启动替身服务，用指向它的连接池执行 body(pool, standin)"""
+    async def run():
+        await standin.start()
+        pool = EdgeTTSConnectionPool(url=standin.url)
+        try:
+            return await body(pool, standin)
+        finally:
+            await pool.close()
+            await standin.stop()
+    return asyncio.run(run())
+
+
+async def synthesize(pool, text="你好 世界"):
+    messages = [m async for m in pool.stream(text, VOICE, MP3_OUTPUT_FORMAT)]
+    return b"".join(m["data"] for m in messages if m["type"] == "audio")
+
+
+def test_connection_is_reused_across_chunks_and_callers():
+    async def body(pool, standin):
+        # 同一调用方的连续文本段
+        assert await synthesize(pool, "第一段") == AUDIO
+        assert await synthesize(pool, "第二段") == AUDIO
+        # 另一个调用方（另一个任务）
+        assert await asyncio.create_task(synthesize(pool, "第三段")) == AUDIO
+        assert standin.connections == 1 and standin.syntheses == 3
+        assert pool.stats["opened"] == 1 and pool.stats["reused"] == 2
+
+    with_standin(EdgeStandIn(AUDIO, chunk_size=1000), body)
+
+
+def test_closed_reused_connection_is_replaced_transparently():
+    async def body(pool, standin):
+        assert await synthesize(pool) == AUDIO
+        # 让服务端的关闭帧先到达
+        await asyncio.sleep(0.05)
+        assert await synthesize(pool) == AUDIO
+        assert pool.stats["replaced"] == 1
+        assert pool.stats["opened"] == 2 and standin.connections == 2
+
+    with_standin(ClosingStandIn(AUDIO, chunk_size=1000), body)
+
+
+def test_warm_preopens_connections_for_voice():
+    async def body(pool, standin):
+        await pool.warm(VOICE, MP3_OUTPUT_FORMAT, count=2)
+        assert pool.stats["opened"] == 2
+        assert await synthesize(pool) == AUDIO
+        # 合成使用预热的连接，不再握手
+        assert pool.stats["opened"] == 2 and pool.stats["reused"] == 1
+        # 已有足够的空闲连接时不重复建立
+        await pool.warm(VOICE, MP3_OUTPUT_FORMAT, count=2)
+        assert pool.stats["opened"] == 2
+        assert standin.connections == 2
+
+    with_standin(EdgeStandIn(AUDIO, chunk_size=1000), body)
+
+
+class ScriptedPool(EdgeTTSConnectionPool):
+    """每次 stream 依次取一个脚本：(首字节延迟, 消息列表)；记录每一路已被读取的消息数"""
+
+    def __init__(self, scripts):
+        super().__init__()
+        self.scripts = list(scripts)
+        self.pulled = []
+
+    async def stream(self, text, voice, output_format=None, **prosody):
+        delay, messages = self.scripts.pop(0)
+        leg = len(self.pulled)
+        self.pulled.append(0)
+        await asyncio.sleep(delay)
+        for message in messages:
+            self.pulled[leg] += 1
+            yield message
+
+
+def audio(i):
+    return {"type": "audio", "data": bytes([i])}
+
+
+def boundary(i):
+    return {"type": "WordBoundary", "offset": i, "duration": 1, "text": f"w{i}"}
+
+
+async def collect(pool, hedge_after):
+    return [m async for m in pool.stream_hedged("text", "voice", hedge_after=hedge_after)]
+
+
+def test_slow_first_byte_is_hedged():
+    messages = [audio(i) for i in range(5)]
+    pool = ScriptedPool([(2.0, messages), (0.0, messages)])
+
+    started = time.perf_counter()
+    received = asyncio.run(collect(pool, hedge_after=0.05))
+    assert received == messages
+    assert time.perf_counter() - started < 1.0
+    assert pool.stats["hedged"] == 1 and pool.stats["hedge_wins"] == 1
+
+
+def test_winner_is_bounded_by_consumer():
+    pool = ScriptedPool([(0.0, [audio(i % 256) for i in range(1000)])])
+
+    async def body():
+        stream = pool.stream_hedged("text", "voice", hedge_after=1.0)
+        await stream.__anext__()
+        await asyncio.sleep(0.05)
+        pulled = pool.pulled[0]
+        await stream.aclose()
+        return pulled
+
+    # 调用方只读了一条：替身最多再被读出队列容量加一条（阻塞在 put 上的那条）
+    assert asyncio.run(body()) <= 1 + HEDGE_QUEUE_SIZE + 1
+
+
+def test_metadata_before_first_audio_does_not_block():
+    messages = [boundary(i) for i in range(HEDGE_QUEUE_SIZE * 3)] + [audio(i) for i in range(3)]
+    pool = ScriptedPool([(0.0, messages)])
+    assert asyncio.run(asyncio.wait_for(collect(pool, hedge_after=1.0), 1)) == messages
+
+
+def test_no_audio_on_any_leg_returns_last_leg():
+    first = [boundary(i) for i in range(HEDGE_QUEUE_SIZE * 2)]
+    second = [boundary(i + 100) for i in range(HEDGE_QUEUE_SIZE * 2)]
+    pool = ScriptedPool([(0.1, first), (0.2, second)])
+    assert asyncio.run(asyncio.wait_for(collect(pool, hedge_after=0.01), 1)) == second
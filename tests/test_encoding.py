@@ -0,0 +1,72 @@
+"""PooledOpusEncoder：帧顺序与线程池排队延迟统计"""
+import asyncio
+import random
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+av = pytest.importorskip("av")
+
+from tts.encoding import ENCODER_PROFILES, EncoderPool, PooledOpusEncoder  # noqa: E402
+
+SAMPLE_RATE = 48000
+FRAME = 960
+
+
+def make_frame(index):
+    samples = np.full((1, FRAME), index * 100, dtype=np.int16)
+    frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+    frame.sample_rate = SAMPLE_RATE
+    return frame
+
+
+def record_order(encoder, seen):
+    encode = encoder._encode
+
+    def traced(frame):
+        # 随机耗时：并发提交时若不串行，完成顺序会被打乱
+        time.sleep(random.uniform(0, 0.002))
+        seen.append(frame.pts // FRAME)
+        encode(frame)
+
+    encoder._encode = traced
+
+
+@pytest.mark.parametrize("with_pool", [True, False])
+def test_frames_of_one_track_keep_their_order(with_pool):
+    pool = EncoderPool(workers=4) if with_pool else None
+    encoder = PooledOpusEncoder.from_profile(pool, ENCODER_PROFILES["low-latency"])
+    seen = []
+    record_order(encoder, seen)
+
+    async def body():
+        return await asyncio.gather(*(encoder.encode(make_frame(i)) for i in range(30)))
+
+    try:
+        packets = asyncio.run(body())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    assert seen == list(range(30))
+    assert sum(1 for p in packets if p) >= 25
+
+
+def test_pool_records_queue_delay():
+    pool = EncoderPool(workers=2)
+    encoders = [PooledOpusEncoder.from_profile(pool, ENCODER_PROFILES["low-latency"]) for _ in range(4)]
+
+    async def body():
+        for i in range(5):
+            await asyncio.gather(*(encoder.encode(make_frame(i)) for encoder in encoders))
+
+    try:
+        asyncio.run(body())
+    finally:
+        pool.shutdown()
+    summary = pool.summary()
+    assert summary["jobs"] == 20
+    assert summary["in_flight"] == 0
+    assert summary["queue_delay_p99"] >= summary["queue_delay_p50"] >= 0.0
+    assert summary["queue_delay_max"] >= summary["queue_delay_p99"]
+    assert summary["encode_time_total"] > 0
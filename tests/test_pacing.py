@@ -0,0 +1,119 @@
+"""FramePacer 在虚拟时钟上的节拍、漂移与恢复"""
+import asyncio
+
+from tts.pacing import FramePacer
+
+SAMPLE_RATE = 48000
+FRAME = 960
+FRAME_SECONDS = FRAME / SAMPLE_RATE
+
+
+class FakeClock:
+    """休眠立即返回，时钟按休眠时长加固定延迟前进"""
+
+    def __init__(self, lag: float = 0.0):
+        self.now = 100.0
+        self.lag = lag
+        self.sleeps = 0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps += 1
+        self.now += seconds + self.lag
+
+
+def run_frames(pacer, clock, frames, work=0.0, drifts=None):
+    async def body():
+        skipped = 0
+        for _ in range(frames):
+            skipped += await pacer.wait(FRAME)
+            clock.now += work
+            if drifts is not None:
+                # 已发出的音频时长与经过时间之差（刚发出的这一帧尚未播放完，扣除一帧）
+                drifts.append(clock.now - pacer.start_time - (pacer.position - FRAME) / SAMPLE_RATE)
+        return skipped
+    return asyncio.run(body())
+
+
+def test_no_cumulative_drift_with_loop_lag():
+    # 10 分钟（30000 帧）：每次休眠多睡 1ms、每帧处理 2ms，固定休眠一帧的旧实现会落后 90s
+    clock = FakeClock(lag=0.001)
+    pacer = FramePacer(SAMPLE_RATE, max_lag=0.2, clock=clock, sleep=clock.sleep)
+    drifts = []
+    assert run_frames(pacer, clock, 30000, work=0.002, drifts=drifts) == 0
+    assert pacer.position == 30000 * FRAME
+    # 整个播放过程中漂移都不超过单帧的延迟（1ms 休眠延迟 + 2ms 处理），不随时间累积
+    assert max(drifts) < 0.004
+    assert abs(drifts[-1] - drifts[29]) < 1e-6
+    elapsed = clock.now - pacer.start_time
+    audio = pacer.position / SAMPLE_RATE
+    assert abs(elapsed - audio) < FRAME_SECONDS
+    assert abs(pacer.drift()) < FRAME_SECONDS
+    assert pacer.stats["skipped_samples"] == 0
+
+
+def test_first_frame_is_immediate_and_later_frames_sleep_to_deadline():
+    clock = FakeClock()
+    pacer = FramePacer(SAMPLE_RATE, clock=clock, sleep=clock.sleep)
+    run_frames(pacer, clock, 1)
+    assert clock.sleeps == 0
+    run_frames(pacer, clock, 49)
+    # 时钟停在最后一帧的发送时刻
+    assert abs(clock.now - pacer.start_time - (pacer.position - FRAME) / SAMPLE_RATE) < 1e-9
+    assert pacer.stats["late_frames"] == 0
+
+
+def test_small_lag_catches_up_without_skipping():
+    clock = FakeClock()
+    pacer = FramePacer(SAMPLE_RATE, max_lag=0.2, clock=clock, sleep=clock.sleep)
+    run_frames(pacer, clock, 10)
+    # 时钟停在第 10 帧的发送时刻，再卡顿 100ms 后落后 4 帧
+    clock.now += 0.1
+    before = clock.sleeps
+    # 落后的帧不休眠，连续发出直到追上
+    assert run_frames(pacer, clock, 5) == 0
+    assert clock.sleeps == before
+    assert pacer.stats["late_frames"] == 4
+    assert abs(pacer.drift() + FRAME_SECONDS) < 1e-9
+
+
+def test_stall_beyond_max_lag_skips_whole_frames():
+    clock = FakeClock()
+    pacer = FramePacer(SAMPLE_RATE, max_lag=0.2, clock=clock, sleep=clock.sleep)
+    run_frames(pacer, clock, 10)
+    clock.now += 1.0
+    skipped = run_frames(pacer, clock, 1)
+    assert skipped > 0 and skipped % FRAME == 0
+    assert pacer.stats["skipped_samples"] == skipped
+    # 跳过后只剩不超过 max_lag 的落后
+    assert 0 <= pacer.drift() <= 0.2
+
+
+def test_resume_aligns_to_now_without_counting_late():
+    clock = FakeClock()
+    pacer = FramePacer(SAMPLE_RATE, clock=clock, sleep=clock.sleep)
+    run_frames(pacer, clock, 10)
+    position = pacer.position
+    # 空闲暂停 2.5s 后恢复
+    clock.now += 2.5
+    skipped = pacer.resume(FRAME)
+    assert skipped % FRAME == 0
+    assert pacer.position == position + skipped
+    assert abs(skipped / SAMPLE_RATE - (2.5 - FRAME_SECONDS)) < FRAME_SECONDS
+    assert pacer.deadline() == clock.now
+    before = clock.sleeps
+    run_frames(pacer, clock, 1)
+    assert clock.sleeps == before
+    assert pacer.stats["late_frames"] == 0
+    assert pacer.stats["skipped_samples"] == 0
+
+
+def test_resume_when_on_time_is_noop():
+    clock = FakeClock()
+    pacer = FramePacer(SAMPLE_RATE, clock=clock, sleep=clock.sleep)
+    run_frames(pacer, clock, 3)
+    start = pacer.start_time
+    assert pacer.resume(FRAME) == 0
+    assert pacer.start_time == start
@@ -0,0 +1,81 @@
+"""TTSScheduler 的许可发放与背压期间的归还"""
+import asyncio
+
+from tts.scheduler import TTSScheduler
+
+
+def test_released_permit_admits_waiting_task():
+    async def body():
+        scheduler = TTSScheduler(max_concurrency=1)
+        space = asyncio.Event()
+        order = []
+
+        async def blocked_writer():
+            async with scheduler.slot("a") as permit:
+                order.append("a:start")
+                async with permit.released():
+                    await space.wait()
+                assert permit.held and scheduler.active == 1
+                order.append("a:end")
+
+        async def other():
+            async with scheduler.slot("b"):
+                order.append("b")
+                space.set()
+
+        first = asyncio.create_task(blocked_writer())
+        await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(first, other()), 1)
+        assert order == ["a:start", "b", "a:end"]
+        assert scheduler.active == 0
+        assert scheduler.stats["yielded"] == 1
+
+    asyncio.run(body())
+
+
+def test_reacquire_goes_before_queued_work():
+    async def body():
+        scheduler = TTSScheduler(max_concurrency=1)
+        space = asyncio.Event()
+        order = []
+
+        async def writer():
+            async with scheduler.slot("a") as permit:
+                async with permit.released():
+                    await space.wait()
+                order.append("a")
+
+        async def other(name):
+            async with scheduler.slot(name):
+                order.append(name)
+                space.set()
+                await asyncio.sleep(0)
+
+        first = asyncio.create_task(writer())
+        await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(first, other("b"), other("c")), 1)
+        # a 在 b 归还许可后以优先级重新获得，先于排队中的 c
+        assert order == ["b", "a", "c"]
+
+    asyncio.run(body())
+
+
+def test_cancel_while_released_does_not_leak():
+    async def body():
+        scheduler = TTSScheduler(max_concurrency=1)
+
+        async def writer():
+            async with scheduler.slot("a") as permit:
+                async with permit.released():
+                    await asyncio.Event().wait()
+
+        task = asyncio.create_task(writer())
+        await asyncio.sleep(0)
+        assert scheduler.active == 0
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert scheduler.active == 0
+        async with scheduler.slot("b"):
+            assert scheduler.active == 1
+
+    asyncio.run(body())
@@ -0,0 +1,47 @@
+"""静音检测与段尾回退"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tts.shaping import LoudDetector, SegmentShaper, first_loud, last_loud  # noqa: E402
+
+
+def reference(samples, threshold):
+    loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > threshold)
+    return (int(loud[0]), int(loud[-1])) if len(loud) else (-1, -1)
+
+
+@pytest.mark.parametrize("threshold", [0.0, 100.0, 182.5, 183.0, 32767.0])
+def test_detector_matches_reference(threshold):
+    rng = np.random.default_rng(0)
+    detector = LoudDetector(threshold, tail_window=64)
+    for length in (0, 1, 63, 64, 65, 2304, 5000):
+        for scale in (10, 300, 40000):
+            samples = np.clip(rng.standard_normal(length) * scale, -32768, 32767).astype(np.int16)
+            if length > 10:
+                samples[: length // 3] //= 1000
+                samples[-length // 4:] //= 1000
+            expected = reference(samples, threshold)
+            assert (detector.first(samples), detector.last(samples)) == expected
+            assert (first_loud(samples, threshold), last_loud(samples, threshold)) == expected
+
+
+def test_extremes_and_exact_threshold():
+    samples = np.array([0, 182, -182, 183, -32768, 0], dtype=np.int16)
+    assert first_loud(samples, 182.0) == 3
+    assert last_loud(samples, 182.0) == 4
+    assert last_loud(samples, 182.5) == 4
+    assert last_loud(samples[:3], 182.0) == -1
+
+
+def test_trailing_excess_and_untrimmable_writes():
+    shaper = SegmentShaper(48000, silence_threshold_db=-45, keep_silence_ms=10)
+    loud = np.full(1000, 5000, dtype=np.int16)
+    quiet = np.zeros(2000, dtype=np.int16)
+    shaper.begin()
+    shaper.observe(shaper.leading(np.concatenate([quiet, loud])))
+    shaper.observe(quiet)
+    assert shaper.trailing_excess() == 2000 - shaper.keep
+    # 段外写入不做段尾检测：有声的块也不会推后段尾位置
+    shaper.observe(loud, trimmable=False)
+    assert shaper.trailing_excess() == 3000 - shaper.keep
@@ -0,0 +1,14 @@
+"""supervisor 的广播频道路由"""
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from supervisor import Supervisor  # noqa: E402
+
+
+def test_broadcast_owner_is_stable_and_spread():
+    supervisor = Supervisor(4)
+    names = [f"room-{i}" for i in range(64)] + ["课堂"]
+    owners = [supervisor.broadcast_owner(name).index for name in names]
+    assert owners == [Supervisor(4).broadcast_owner(name).index for name in names]
+    assert len(set(owners)) == 4
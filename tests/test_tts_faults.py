@@ -0,0 +1,158 @@
+"""
+TTS 故障注入：合成管线在中途断线时从单词边界续传
+
+替身连接池对每个单词返回同一段 MP3（拆成两条音频消息，断线可以发生在单词中间），
+并带有与音频位置一致的 WordBoundary；通过 pool= 传入合成函数，不修改 server 的全局状态
+"""
+import asyncio
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+av = pytest.importorskip("av")
+for _module in ("fastapi", "aiortc", "aiohttp", "edge_tts"):
+    pytest.importorskip(_module)
+
+import server  # noqa: E402
+from tts.cache import AudioCache  # noqa: E402
+from tts.decoder import BYTES_PER_SAMPLE  # noqa: E402
+from tts.edge import EdgeTTSError  # noqa: E402
+from tts.resume import TICKS_PER_SECOND  # noqa: E402
+
+SAMPLE_RATE = 24000
+TEXT = "alpha bravo charlie delta echo foxtrot golf hotel india juliet"
+# 续传后总时长允许的误差（秒）
+TOLERANCE = 0.06
+
+
+def make_word_mp3(seconds: float = 0.3):
+    """生成一个单词的 MP3 片段（正弦音，只有音频帧），返回 (字节, 解码后的时长)"""
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    pcm = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+    out = io.BytesIO()
+    # Edge TTS 的输出是裸 MP3 帧：关闭 mp3 封装默认写入的 ID3v2 标签与 Xing 帧
+    # （Xing 帧只在文件开头被解码器用于去除编码延迟，拼接在流中间时会多解码出一帧与填充）
+    with av.open(out, "w", format="mp3", options={"id3v2_version": "0", "write_xing": "0"}) as container:
+        stream = container.add_stream("mp3", rate=SAMPLE_RATE, layout="mono")
+        frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = SAMPLE_RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    data = out.getvalue()
+    decoded = 0
+    with av.open(io.BytesIO(data), "r") as container:
+        for frame in container.decode(audio=0):
+            decoded += frame.samples
+    return data, decoded / SAMPLE_RATE
+
+
+class FaultyPool:
+    """
+    stream_hedged 的替身；按请求顺序注入故障
+
+    faults: 每次合成依次取一项，{"drop_after": n} 在发出 n 条音频消息后抛出连接错误
+    """
+
+    def __init__(self, word_audio: bytes, word_seconds: float, faults=None):
+        self.word_audio = word_audio
+        self.word_seconds = word_seconds
+        self.faults = list(faults or [])
+        self.requests = []
+
+    async def stream_hedged(self, text, voice, output_format, hedge_after=None, **prosody):
+        self.requests.append(text)
+        fault = self.faults.pop(0) if self.faults else {}
+        half = len(self.word_audio) // 2
+        sent = 0
+        for i, word in enumerate(text.split()):
+            yield {"type": "WordBoundary", "offset": int(i * self.word_seconds * TICKS_PER_SECOND),
+                   "duration": int(self.word_seconds * TICKS_PER_SECOND), "text": word}
+            for part in (self.word_audio[:half], self.word_audio[half:]):
+                if "drop_after" in fault and sent >= fault["drop_after"]:
+                    raise EdgeTTSError("连接中断")
+                await asyncio.sleep(0)
+                yield {"type": "audio", "data": part}
+                sent += 1
+
+
+class Collector:
+    """统计写入的 PCM 时长"""
+
+    def __init__(self):
+        self.sample_rate = SAMPLE_RATE
+        self.chunk_size = SAMPLE_RATE // 50
+        self.samples = 0
+
+    async def put_audio_data(self, audio_data, tag=None):
+        self.samples += len(audio_data) // BYTES_PER_SAMPLE
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.sample_rate
+
+
+@pytest.fixture(scope="module")
+def word_audio():
+    return make_word_mp3()
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    # 替身音频不能写入共享的合成缓存
+    monkeypatch.setattr(server, "tts_audio_cache", None)
+
+
+def synthesize(word_audio, faults=(), resume=True, max_retries=3):
+    pool = FaultyPool(*word_audio, faults=faults)
+    collector = Collector()
+    asyncio.run(server.stream_edge_tts_to_audio_queue(TEXT, collector, tag="test", max_retries=max_retries,
+                                                      pool=pool, resume=resume))
+    return collector.duration, pool.requests
+
+
+def cached_seconds(cache):
+    value = cache.get(server.TTS_VOICE, f"s16le_{SAMPLE_RATE}", TEXT)
+    return None if value is None else len(value) / BYTES_PER_SAMPLE / SAMPLE_RATE
+
+
+def test_fixture_has_no_id3_tag(word_audio):
+    data, seconds = word_audio
+    assert not data.startswith(b"ID3")
+    assert seconds > 0.25
+
+
+def test_baseline_decodes_every_word(word_audio):
+    duration, requests = synthesize(word_audio)
+    assert requests == [TEXT]
+    assert duration == pytest.approx(len(TEXT.split()) * word_audio[1], abs=TOLERANCE)
+
+
+def test_drop_resumes_from_word_boundary(word_audio):
+    baseline, _ = synthesize(word_audio)
+    resumed, requests = synthesize(word_audio, faults=[{"drop_after": 7}])
+    assert len(requests) == 2
+    # 第 7 条消息是第 4 个单词的后半段：从该单词续传
+    assert requests[1] == TEXT.split(" ", 3)[3]
+    assert resumed == pytest.approx(baseline, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("resume", [True, False])
+def test_failed_stream_does_not_populate_cache(word_audio, monkeypatch, tmp_path, resume):
+    cache = AudioCache(disk_dir=str(tmp_path))
+    monkeypatch.setattr(server, "tts_audio_cache", cache)
+    with pytest.raises(Exception):
+        synthesize(word_audio, faults=[{"drop_after": 7}], resume=resume, max_retries=1)
+    assert cached_seconds(cache) is None
+    assert cache.stats["stores"] == 0
+
+
+def test_restart_without_resume_caches_only_the_complete_attempt(word_audio, monkeypatch, tmp_path):
+    cache = AudioCache(disk_dir=str(tmp_path))
+    monkeypatch.setattr(server, "tts_audio_cache", cache)
+    _, requests = synthesize(word_audio, faults=[{"drop_after": 7}], resume=False, max_retries=2)
+    # 不续传：失败后从头重新合成整段
+    assert requests == [TEXT, TEXT]
+    assert cached_seconds(cache) == pytest.approx(len(TEXT.split()) * word_audio[1], abs=TOLERANCE)
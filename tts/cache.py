@@ -0,0 +1,268 @@
+"""
+合成音频缓存
+
+以 (发音人, 音频格式, 归一化文本) 为键缓存合成结果：
+- 内存层：按字节数限制的 LRU
+- 磁盘层：每条一个文件，按总字节数上限以修改时间 LRU 淘汰（命中时刷新修改时间）。
+  较小的条目读入内存层；超过 mmap_min_bytes 的条目每次命中时 mmap 映射、用完即释放，
+  多个 worker 进程共享同一份页缓存，内存层不长期持有映射（每个映射都占用一个文件描述符）
+  mmap_min_bytes 为 0 时（多 worker 共享目录）磁盘条目一律不进入内存层
+
+音频以紧凑格式保存：PCM 为 int16，Opus 为长度前缀拼接的编码包。
+"""
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+CacheValue = Union[bytes, memoryview]
+
+_WHITESPACE = re.compile(r"\s+")
+_PACKET_LENGTH = struct.Struct("<H")
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：NFKC、去除首尾空白、合并连续空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def pack_packets(packets: Iterable[bytes]) -> bytes:
+    """把 Opus 包序列打包为长度前缀格式"""
+    out = bytearray()
+    for packet in packets:
+        out.extend(_PACKET_LENGTH.pack(len(packet)))
+        out.extend(packet)
+    return bytes(out)
+
+
+def unpack_packets(data: CacheValue) -> List[bytes]:
+    """pack_packets 的逆操作"""
+    packets = []
+    view = memoryview(data)
+    offset = 0
+    while offset + _PACKET_LENGTH.size <= len(view):
+        (length,) = _PACKET_LENGTH.unpack_from(view, offset)
+        offset += _PACKET_LENGTH.size
+        packets.append(bytes(view[offset:offset + length]))
+        offset += length
+    return packets
+
+
+class AudioCache:
+    """内存 LRU + 磁盘 mmap 两级缓存"""
+
+    # 磁盘层超过上限时淘汰到上限的该比例，避免每次写入都触发淘汰
+    DISK_LOW_WATERMARK = 0.9
+    # 每写入这么多条重新统计一次磁盘层大小（其它 worker 进程的写入只有重新统计才能看到）
+    DISK_RESCAN_EVERY = 100
+
+    def __init__(self, memory_max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 max_text_chars: int = 120, disk_max_bytes: int = 1024 * 1024 * 1024,
+                 mmap_min_bytes: int = 1024 * 1024):
+        """
+        初始化缓存
+
+        Args:
+            memory_max_bytes: 内存层最大字节数
+            disk_dir: 磁盘层目录，None 表示只使用内存层
+            max_text_chars: 超过该长度的文本不写入缓存（长文本几乎不会重复）
+            disk_max_bytes: 磁盘层最大字节数，0 表示不限制
+            mmap_min_bytes: 磁盘条目达到该大小时按需 mmap 而不读入内存层
+        """
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir
+        self.max_text_chars = max_text_chars
+        self.disk_max_bytes = disk_max_bytes
+        self.mmap_min_bytes = mmap_min_bytes
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+        self._memory: "OrderedDict[str, CacheValue]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._stores_since_scan = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._enforce_disk_budget()
+
+    @staticmethod
+    def make_key(voice: str, audio_format: str, text: str) -> str:
+        raw = f"{voice}\0{audio_format}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha1(raw).hexdigest()
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(normalize_text(text)) <= self.max_text_chars
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _remember(self, key: str, value: CacheValue) -> None:
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(value) > self.memory_max_bytes:
+            return
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def _load_disk(self, key: str) -> Optional[CacheValue]:
+        """读取磁盘条目：小条目返回 bytes，大条目返回 mmap 视图（最后一个引用释放时关闭映射）"""
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    return None
+                # 刷新修改时间：磁盘层按修改时间做 LRU 淘汰
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                if size < self.mmap_min_bytes:
+                    return f.read()
+                # 映射在文件关闭后仍然有效；页缓存由所有进程共享
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"读取磁盘缓存失败 {path}: {e}")
+            return None
+
+    def get(self, voice: str, audio_format: str, text: str) -> Optional[CacheValue]:
+        """
+        查找缓存
+
+        Args:
+            voice: 发音人
+            audio_format: 音频格式标识（例如 "s16le_48000"、"opus"）
+            text: 原始文本
+
+        Returns:
+            缓存的音频数据，未命中返回 None
+        """
+        key = self.make_key(voice, audio_format, text)
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return value
+
+        value = self._load_disk(key)
+        if value is not None:
+            self.stats["disk_hits"] += 1
+            if isinstance(value, bytes):
+                self._remember(key, value)
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, voice: str, audio_format: str, text: str, data: bytes) -> None:
+        """
+        写入缓存（内存层，以及配置了目录时的磁盘层）
+
+        Args:
+            voice: 发音人
+            audio_format: 音频格式标识
+            text: 原始文本
+            data: 音频数据
+        """
+        if not data or not self.cacheable(text):
+            return
+        key = self.make_key(voice, audio_format, text)
+        self.stats["stores"] += 1
+        if self.disk_dir and self._store_disk(key, data) and len(data) >= self.mmap_min_bytes:
+            # 大条目只保存在磁盘层：命中时 mmap，多个 worker 进程共享同一份页缓存
+            return
+        self._remember(key, data)
+
+    def _store_disk(self, key: str, data: bytes) -> bool:
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return True
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子替换，其它进程不会读到半截数据
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"写入磁盘缓存失败 {path}: {e}")
+            return False
+        self._disk_bytes += len(data)
+        self._stores_since_scan += 1
+        if self.disk_max_bytes and (self._disk_bytes > self.disk_max_bytes
+                                    or self._stores_since_scan >= self.DISK_RESCAN_EVERY):
+            self._enforce_disk_budget()
+        return True
+
+    def _scan_disk(self) -> List[Tuple[float, int, str]]:
+        """列出磁盘层的全部条目：(修改时间, 字节数, 路径)"""
+        entries = []
+        try:
+            shards = list(os.scandir(self.disk_dir))
+        except OSError:
+            return entries
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                files = list(os.scandir(shard.path))
+            except OSError:
+                continue
+            for entry in files:
+                # mkstemp 的临时文件以 "tmp" 开头，键是十六进制摘要，不会冲突
+                if entry.name.startswith("tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _enforce_disk_budget(self) -> None:
+        """重新统计磁盘层大小；超过上限时按修改时间从旧到新删除，直到低于低水位"""
+        entries = self._scan_disk()
+        total = sum(size for _, size, _ in entries)
+        if self.disk_max_bytes and total > self.disk_max_bytes:
+            target = self.disk_max_bytes * self.DISK_LOW_WATERMARK
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    # 其它进程已建立的映射在删除后仍然有效
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.warning(f"淘汰磁盘缓存失败 {path}: {e}")
+                    continue
+                total -= size
+                self.stats["disk_evictions"] += 1
+        self._disk_bytes = total
+        self._stores_since_scan = 0
+
+    def summary(self) -> Dict[str, int]:
+        stats = dict(self.stats)
+        stats["memory_entries"] = len(self._memory)
+        stats["memory_bytes"] = self._memory_bytes
+        stats["disk_bytes"] = self._disk_bytes
+        return stats
@@ -0,0 +1,238 @@
+"""
+TTS 文本分段策略
+
+把 LLM 流式输出的文本切分为送往 TTS 的片段：
+- FixedChunker: 原有策略，遇到句读符号或累积到固定长度即分段
+- AdaptiveChunker: 首段尽量短以尽早出声，后续分段逐步增长到目标长度以减少 TTS 往返；
+  不会在数字、URL 或连续的中文标点中间切分
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+STRONG_BREAKS = set("。！？!?；;\n…")
+WEAK_BREAKS = set("，,、：:")
+# 英文句点单独处理：需要后续字符确认不是小数点 / 缩写 / URL
+ASCII_BREAKS = set(".!?;,:")
+# 紧跟在标点后、应归入同一段的字符（闭合引号与括号）
+CLOSERS = set("”’」』）)》】\"'")
+ALL_BREAKS = STRONG_BREAKS | WEAK_BREAKS | {"."}
+# 原有固定策略使用的句读符号
+SENTENCE_ENDINGS = {'.', '。', '!', '！', '?', '？', ';', '；', ',', '，', ':', '：', '\n'}
+
+
+def _is_ascii_alnum(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def _is_ascii_word(ch: str) -> bool:
+    """数字、URL、版本号等 ASCII 连续片段中的字符"""
+    return ch.isascii() and not ch.isspace()
+
+
+class TextChunker(ABC):
+    """分段策略抽象基类"""
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+
+    def _append(self, text: str) -> None:
+        self._parts.append(text)
+        self._length += len(text)
+
+    def _text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def _take(self, end: int) -> str:
+        text = self._text()
+        chunk, rest = text[:end], text[end:]
+        self._parts = [rest] if rest else []
+        self._length = len(rest)
+        return chunk
+
+    @abstractmethod
+    def feed(self, text: str) -> List[str]:
+        """
+        送入一段 LLM 输出
+
+        Args:
+            text: 新到达的文本
+
+        Returns:
+            可以立即送往 TTS 的片段（可能为空）
+        """
+        pass
+
+    def flush(self) -> Optional[str]:
+        """
+        当前回复结束：返回剩余文本并重置状态（下一条回复重新从短首段开始）
+
+        Returns:
+            剩余文本，空白时返回 None
+        """
+        text = self._text()
+        self._parts = []
+        self._length = 0
+        self.reset()
+        return text if text.strip() else None
+
+    def reset(self) -> None:
+        """重置分段进度（不清空缓冲区）"""
+        pass
+
+
+class FixedChunker(TextChunker):
+    """固定策略：末尾为句读符号或累积到 max_chars 即分段"""
+
+    def __init__(self, max_chars: int = 60, breaks=None):
+        super().__init__()
+        self.max_chars = max_chars
+        self.breaks = set(breaks) if breaks else SENTENCE_ENDINGS
+
+    def feed(self, text: str) -> List[str]:
+        self._append(text)
+        if self._length >= self.max_chars or (text and text[-1] in self.breaks):
+            chunk = self._take(self._length)
+            if chunk.strip():
+                return [chunk]
+        return []
+
+
+class AdaptiveChunker(TextChunker):
+    """自适应策略：短首段 + 逐步增长的后续分段"""
+
+    def __init__(self, first_min_chars: int = 2, first_max_chars: int = 24, target_chars: int = 16,
+                 growth: float = 2.0, max_chars: int = 160):
+        """
+        Args:
+            first_min_chars: 首段最少字符数（达到后遇到任意可用断点即分段）
+            first_max_chars: 首段最多字符数（超过后强制在安全位置切分）
+            target_chars: 第二段的目标长度
+            growth: 每段目标长度的增长倍率
+            max_chars: 任意分段的长度上限
+        """
+        super().__init__()
+        self.first_min_chars = first_min_chars
+        self.first_max_chars = first_max_chars
+        self.target_chars = target_chars
+        self.growth = growth
+        self.max_chars = max_chars
+        self._index = 0
+
+    def reset(self) -> None:
+        self._index = 0
+
+    def _target(self) -> int:
+        return int(min(self.max_chars, self.target_chars * self.growth ** (self._index - 1)))
+
+    @staticmethod
+    def _valid_break(text: str, end: int) -> bool:
+        """text[end - 1] 为标点时，判断能否在 end 处切分（需要看到下一个字符）"""
+        ch = text[end - 1]
+        if ch == "\n":
+            return True
+        if end >= len(text):
+            return False
+        nxt = text[end]
+        # 连续标点或闭合引号：等这一串结束后再切
+        if nxt in ALL_BREAKS or nxt in CLOSERS or nxt in ASCII_BREAKS:
+            return False
+        if ch in ASCII_BREAKS:
+            # 3.14 / 1,000 / example.com / e.g 之类：英文标点后必须是空白或非 ASCII 字符
+            if _is_ascii_alnum(nxt) or nxt in "/-_%":
+                return False
+            if ch == "." and end >= 2 and text[end - 2].isdigit() and nxt.isdigit():
+                return False
+        # URL 内部不切分（URL 以空白结束）
+        start = max(text.rfind(" ", 0, end), text.rfind("\n", 0, end)) + 1
+        token = text[start:end]
+        if ("://" in token or token.startswith("www.")) and not nxt.isspace():
+            return False
+        return True
+
+    def _find_break(self, text: str, lo: int, hi: int, strong_only: bool) -> int:
+        """在 [lo, hi] 范围内从后往前找可用断点，返回切分位置（0 表示没有）"""
+        breaks = STRONG_BREAKS | {"!", "?", ";", "."} if strong_only else ALL_BREAKS | ASCII_BREAKS
+        i = min(hi, len(text))
+        while i >= max(lo, 1):
+            if text[i - 1] in breaks or text[i - 1] in CLOSERS:
+                # 闭合引号前面是标点时也可切分（例如 “好。”）
+                end = i
+                j = i
+                while j > 0 and text[j - 1] in CLOSERS:
+                    j -= 1
+                if j > 0 and text[j - 1] in breaks and self._valid_break(text, end):
+                    return end
+            i -= 1
+        return 0
+
+    def _safe_cut(self, text: str, lo: int, hi: int) -> int:
+        """强制切分：优先空白，避免切在数字或 URL 等连续 ASCII 片段中间"""
+        hi = min(hi, len(text))
+        ws = max(text.rfind(" ", lo, hi), text.rfind("\n", lo, hi))
+        if ws > lo:
+            return ws + 1
+        i = hi
+        while i > lo and _is_ascii_word(text[i - 1]) and i < len(text) and _is_ascii_word(text[i]):
+            i -= 1
+        return i if i > lo else hi
+
+    def _next_chunk(self) -> Optional[str]:
+        text = self._text()
+        if self._index == 0:
+            end = self._find_break(text, self.first_min_chars, min(len(text), self.first_max_chars), False)
+            if not end and len(text) > self.first_max_chars:
+                end = self._safe_cut(text, self.first_min_chars, self.first_max_chars)
+        else:
+            target = self._target()
+            if len(text) < target:
+                return None
+            end = self._find_break(text, target // 2, self.max_chars, True) or \
+                self._find_break(text, target // 2, self.max_chars, False)
+            if not end and len(text) > self.max_chars:
+                end = self._safe_cut(text, target // 2, self.max_chars)
+        if not end:
+            return None
+        self._index += 1
+        return self._take(end)
+
+    def feed(self, text: str) -> List[str]:
+        self._append(text)
+        # 只有出现候选断点或长度达到阈值时才需要检查
+        limit = self.first_min_chars if self._index == 0 else self._target()
+        if self._length < limit and not any(ch in ALL_BREAKS or ch in ASCII_BREAKS for ch in text):
+            return []
+        chunks = []
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                break
+            if chunk.strip():
+                chunks.append(chunk)
+        return chunks
+
+
+def create_chunker(config: Dict[str, Any]) -> TextChunker:
+    """
+    根据配置创建分段策略
+
+    Args:
+        config: tts.chunker 配置段
+
+    Returns:
+        TextChunker 实例
+    """
+    strategy = config.get("strategy", "adaptive")
+    if strategy == "fixed":
+        return FixedChunker(max_chars=int(config.get("max_chars", 60)))
+    if strategy == "adaptive":
+        return AdaptiveChunker(
+            first_min_chars=int(config.get("first_min_chars", 2)),
+            first_max_chars=int(config.get("first_max_chars", 24)),
+            target_chars=int(config.get("target_chars", 16)),
+            growth=float(config.get("growth", 2.0)),
+            max_chars=int(config.get("max_chars", 160)),
+        )
+    raise ValueError(f"不支持的分段策略: {strategy}")
@@ -0,0 +1,372 @@
+"""
+TTS 音频解码后端
+
+把 TTS 服务返回的压缩音频（MP3）流式解码为单声道 int16 PCM，
+按 AudioQueueManager 的帧大小切片后回调给调用方。切片是解码输出上的 memoryview，
+不复制数据；只有跨越两次解码输出的那一帧需要拼接。
+
+- PyAVDecoder: 基于 PyAV (libavcodec) 的进程内流式解码，无子进程开销
+- FFmpegDecoder: 每段文本启动一个 ffmpeg 子进程，通过管道解码（兼容回退）
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
+
+PCMCallback = Callable[[memoryview], Awaitable[None]]
+
+BYTES_PER_SAMPLE = 2  # int16
+
+# ID3v2 标签头："ID3" + 版本(2) + 标志(1) + 同步安全整数长度(4)
+ID3_MAGIC = b"ID3"
+ID3_HEADER_SIZE = 10
+
+
+def id3v2_size(header) -> int:
+    """完整 ID3v2 标签（含标签头与可选的标签尾）的字节数"""
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = ID3_HEADER_SIZE if header[5] & 0x10 else 0
+    return ID3_HEADER_SIZE + size + footer
+
+
+class DecoderBackend(ABC):
+    """解码器后端抽象基类"""
+
+    name = "base"
+
+    def __init__(self, sample_rate: int, chunk_size: int, on_pcm: PCMCallback, input_format: str = "mp3"):
+        """
+        初始化解码器
+
+        Args:
+            sample_rate: 输出采样率
+            chunk_size: 每次回调的样本数（一帧）
+            on_pcm: 接收解码后 PCM 切片（int16 字节的 memoryview）的协程回调
+            input_format: 输入的压缩格式
+        """
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.on_pcm = on_pcm
+        self.input_format = input_format
+        self.audio_received = False
+        # 上次输出中不足一帧的尾部
+        self._pcm_buffer = bytearray()
+
+    @abstractmethod
+    async def start(self) -> None:
+        """准备解码资源"""
+        pass
+
+    @abstractmethod
+    async def feed(self, data: bytes) -> None:
+        """
+        送入一段压缩音频数据
+
+        Args:
+            data: TTS 返回的原始音频字节
+        """
+        pass
+
+    @abstractmethod
+    async def finish(self) -> None:
+        """输入结束：冲刷解码器并把剩余 PCM 全部回调出去"""
+        pass
+
+    @abstractmethod
+    async def abort(self) -> None:
+        """立即释放解码资源（取消或失败时调用），不抛出异常"""
+        pass
+
+    async def _push_pcm(self, data) -> None:
+        """按帧大小切片回调；data 可以是 bytes 或 memoryview，切片直接引用其内存"""
+        if not data:
+            return
+        view = memoryview(data).cast("B")
+        self.audio_received = True
+        bytes_per_chunk = self.chunk_size * BYTES_PER_SAMPLE
+        offset = 0
+        if self._pcm_buffer:
+            # 先补齐上次留下的半帧
+            offset = min(len(view), bytes_per_chunk - len(self._pcm_buffer))
+            self._pcm_buffer.extend(view[:offset])
+            if len(self._pcm_buffer) < bytes_per_chunk:
+                return
+            raw = bytes(self._pcm_buffer)
+            self._pcm_buffer.clear()
+            await self.on_pcm(memoryview(raw))
+        end = offset + (len(view) - offset) // bytes_per_chunk * bytes_per_chunk
+        for start in range(offset, end, bytes_per_chunk):
+            await self.on_pcm(view[start:start + bytes_per_chunk])
+        if end < len(view):
+            self._pcm_buffer.extend(view[end:])
+
+    async def _flush_pcm(self) -> None:
+        """回调不足一帧的尾部数据（由 AudioQueueManager 负责补零）"""
+        usable = len(self._pcm_buffer) - len(self._pcm_buffer) % BYTES_PER_SAMPLE
+        if usable > 0:
+            raw = bytes(self._pcm_buffer[:usable])
+            await self.on_pcm(memoryview(raw))
+        self._pcm_buffer.clear()
+
+
+class PyAVDecoder(DecoderBackend):
+    """基于 PyAV 的进程内流式解码器"""
+
+    name = "pyav"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._codec = None
+        self._resampler = None
+        self._invalid_data = ()
+        # 流开头尚未确定是否为 ID3v2 标签的字节，以及标签中尚未跳过的字节数
+        self._probing = True
+        self._header = bytearray()
+        self._skip = 0
+        self.invalid_packets = 0
+
+    async def start(self) -> None:
+        import av
+
+        self._codec = av.CodecContext.create(self.input_format, "r")
+        self._resampler = av.AudioResampler(format="s16", layout="mono", rate=self.sample_rate)
+        self._invalid_data = av.InvalidDataError
+
+    def _strip_id3(self, data: bytes) -> bytes:
+        """
+        跳过流开头的 ID3v2 标签：libavcodec 的 parser 不识别标签，会把它当作损坏的帧
+
+        标签头可能被拆在多次 feed 中，不足 10 字节时先缓存
+        """
+        if self._skip:
+            count = min(self._skip, len(data))
+            self._skip -= count
+            data = data[count:]
+            if self._skip:
+                return b""
+        if not self._probing:
+            return data
+        self._header.extend(data)
+        header = self._header
+        if len(header) < ID3_HEADER_SIZE and ID3_MAGIC.startswith(bytes(header[:3])):
+            return b""
+        self._header = bytearray()
+        if header[:3] != ID3_MAGIC:
+            self._probing = False
+            return bytes(header)
+        size = id3v2_size(header)
+        logging.debug(f"跳过 {size} 字节的 ID3v2 标签")
+        if size > len(header):
+            self._skip = size - len(header)
+            return b""
+        # 标签之后可能紧跟另一个标签
+        return self._strip_id3(bytes(header[size:]))
+
+    async def _decode(self, data) -> None:
+        """解析并解码一段数据；无法解码的数据包记录后跳过（与 ffmpeg 命令行的行为一致），不中断整段"""
+        try:
+            packets = self._codec.parse(data)
+        except self._invalid_data as e:
+            self.invalid_packets += 1
+            logging.warning(f"PyAV 无法解析输入数据，已跳过: {e}")
+            return
+        for packet in packets:
+            try:
+                frames = self._codec.decode(packet)
+            except self._invalid_data as e:
+                self.invalid_packets += 1
+                logging.warning(f"PyAV 跳过无法解码的数据包 (累计 {self.invalid_packets}): {e}")
+                continue
+            for frame in frames:
+                await self._push_frames(self._resample(frame))
+
+    def _resample(self, frame) -> list:
+        resampled = self._resampler.resample(frame)
+        if not isinstance(resampled, list):
+            # PyAV < 9 返回单个帧
+            resampled = [resampled] if resampled is not None else []
+        return resampled
+
+    async def _push_frames(self, frames) -> None:
+        for frame in frames:
+            # 单声道 s16 只有一个平面；平面可能带有对齐填充，只取有效样本
+            await self._push_pcm(memoryview(frame.planes[0])[:frame.samples * BYTES_PER_SAMPLE])
+
+    async def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        data = self._strip_id3(data)
+        if data:
+            await self._decode(data)
+
+    async def finish(self) -> None:
+        if self._header and self._header[:3] != ID3_MAGIC:
+            # 整个流不足一个标签头的长度
+            await self._decode(bytes(self._header))
+        self._header = bytearray()
+        frames = []
+        try:
+            # 冲刷 parser 与解码器内部缓存的最后几帧
+            for packet in self._codec.parse(None):
+                for frame in self._codec.decode(packet):
+                    frames.extend(self._resample(frame))
+            for frame in self._codec.decode(None):
+                frames.extend(self._resample(frame))
+            frames.extend(self._resample(None))
+        except Exception as e:
+            logging.debug(f"PyAV 冲刷解码器时出现异常（已忽略）: {e}")
+        await self._push_frames(frames)
+        await self._flush_pcm()
+        self._codec = None
+        self._resampler = None
+
+    async def abort(self) -> None:
+        self._codec = None
+        self._resampler = None
+        self._header = bytearray()
+        self._pcm_buffer.clear()
+
+
+class FFmpegDecoder(DecoderBackend):
+    """基于 ffmpeg 子进程的解码器（回退方案）"""
+
+    name = "ffmpeg"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._process = None
+        self._read_task = None
+
+    async def start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-loglevel", "quiet",
+            "-f", self.input_format,
+            "-i", "pipe:0",
+            "-f", "s16le",
+            "-ac", "1",
+            "-ar", str(self.sample_rate),
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._read_task = asyncio.create_task(self._read_pcm())
+
+    async def _read_pcm(self) -> None:
+        try:
+            while True:
+                data = await self._process.stdout.read(4096)
+                if not data:
+                    break
+                await self._push_pcm(data)
+        except asyncio.CancelledError:
+            logging.info("read_pcm 被取消")
+            raise
+        except Exception as e:
+            logging.exception(f"read_pcm 异常: {e}")
+            raise
+
+    async def feed(self, data: bytes) -> None:
+        if self._process.stdin is None:
+            return
+        try:
+            self._process.stdin.write(data)
+            await self._process.stdin.drain()
+        except Exception as e:
+            logging.warning(f"写入 ffmpeg.stdin 失败: {e}")
+
+    async def _log_stderr(self) -> None:
+        try:
+            if self._process and self._process.stderr:
+                stderr_data = await self._process.stderr.read()
+                if stderr_data:
+                    logging.error(f"ffmpeg stderr: {stderr_data.decode('utf-8', errors='ignore')}")
+        except Exception:
+            pass
+
+    async def finish(self) -> None:
+        if self._process.stdin is not None:
+            try:
+                self._process.stdin.close()
+                await self._process.stdin.wait_closed()
+            except Exception:
+                pass
+
+        # 等待读取任务完成或取消
+        try:
+            await self._read_task
+        except asyncio.CancelledError:
+            logging.info("read_task 被取消，继续清理")
+            raise
+
+        return_code = await self._process.wait()
+        if return_code != 0:
+            logging.warning(f"ffmpeg 非零退出: {return_code}")
+            await self._log_stderr()
+        await self._flush_pcm()
+
+    async def abort(self) -> None:
+        # 取消 read_task
+        if self._read_task and not self._read_task.done():
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except BaseException:
+                pass
+        # 关闭 stdin
+        try:
+            if self._process and self._process.stdin:
+                self._process.stdin.close()
+                await self._process.stdin.wait_closed()
+        except Exception:
+            pass
+        # kill ffmpeg
+        try:
+            if self._process and self._process.returncode is None:
+                self._process.kill()
+                await self._process.wait()
+        except Exception:
+            pass
+        self._pcm_buffer.clear()
+
+
+DECODER_BACKENDS = {
+    PyAVDecoder.name: PyAVDecoder,
+    FFmpegDecoder.name: FFmpegDecoder,
+}
+
+
+async def create_decoder(backend: str, sample_rate: int, chunk_size: int, on_pcm: PCMCallback,
+                         input_format: str = "mp3", fallback: Optional[str] = "ffmpeg") -> DecoderBackend:
+    """
+    创建并启动解码器，首选后端不可用时自动回退
+
+    Args:
+        backend: 首选后端名称（"pyav" 或 "ffmpeg"）
+        sample_rate: 输出采样率
+        chunk_size: 每次回调的样本数
+        on_pcm: PCM 回调
+        input_format: 输入压缩格式
+        fallback: 首选后端启动失败时使用的后端，None 表示不回退
+
+    Returns:
+        已启动的 DecoderBackend 实例
+    """
+    if backend not in DECODER_BACKENDS:
+        raise ValueError(f"不支持的解码后端: {backend}")
+
+    decoder = DECODER_BACKENDS[backend](sample_rate, chunk_size, on_pcm, input_format)
+    try:
+        await decoder.start()
+        return decoder
+    except Exception as e:
+        if not fallback or fallback == backend:
+            raise
+        logging.warning(f"解码后端 {backend} 启动失败，回退到 {fallback}: {e}")
+
+    decoder = DECODER_BACKENDS[fallback](sample_rate, chunk_size, on_pcm, input_format)
+    await decoder.start()
+    return decoder
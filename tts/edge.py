@@ -0,0 +1,475 @@
+"""
+EdgeTTS websocket 客户端
+
+edge_tts.Communicate 固定使用 MP3 输出格式且每次合成都新建连接，这里直接实现 readaloud 协议：
+- EdgeTTSClient: 按需请求其它输出格式（例如 Ogg/Opus 直通）
+- EdgeTTSConnectionPool: 按发音人保持预热的长连接，跨文本段、跨会话复用，失效时自动替换；
+  可选对冲请求：首字节超过阈值时再发一个请求，先出音频的一方胜出
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import aiohttp
+from edge_tts import constants as edge_constants
+
+try:
+    from edge_tts.drm import DRM
+except ImportError:  # edge-tts < 7.0 没有 Sec-MS-GEC 校验
+    DRM = None
+
+MP3_OUTPUT_FORMAT = "audio-24khz-48kbitrate-mono-mp3"
+OPUS_OUTPUT_FORMAT = "ogg-48khz-16bit-mono-opus"
+# 对冲请求每一路缓存的消息数上限
+HEDGE_QUEUE_SIZE = 2
+
+WSS_URL = edge_constants.WSS_URL
+WSS_HEADERS = getattr(edge_constants, "WSS_HEADERS", {
+    "Pragma": "no-cache",
+    "Cache-Control": "no-cache",
+    "Origin": "chrome-extension://jdiccldimpdaibmpdkjnbmckianbfold",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Language": "en-US,en;q=0.9",
+})
+
+
+class EdgeTTSError(Exception):
+    """EdgeTTS 协议或连接错误"""
+    pass
+
+
+def _timestamp() -> str:
+    return time.strftime("%a %b %d %Y %H:%M:%S GMT+0000 (Coordinated Universal Time)", time.gmtime())
+
+
+def _full_voice_name(voice: str) -> str:
+    """把 zh-CN-XiaoyiNeural 形式的短名转换为服务端使用的完整名称"""
+    if voice.startswith("Microsoft Server Speech"):
+        return voice
+    lang, _, name = voice.rpartition("-")
+    if not lang:
+        return voice
+    return f"Microsoft Server Speech Text to Speech Voice ({lang}, {name})"
+
+
+def _parse_headers(raw: bytes) -> Dict[bytes, bytes]:
+    headers = {}
+    for line in raw.split(b"\r\n"):
+        key, sep, value = line.partition(b":")
+        if sep:
+            headers[key] = value
+    return headers
+
+
+class EdgeTTSClient:
+    """EdgeTTS 合成客户端（每次合成使用一条新连接）"""
+
+    def __init__(self, voice: str, output_format: str = MP3_OUTPUT_FORMAT, url: Optional[str] = None,
+                 rate: str = "+0%", volume: str = "+0%", pitch: str = "+0Hz", proxy: Optional[str] = None):
+        """
+        初始化客户端
+
+        Args:
+            voice: 发音人（短名或完整名称）
+            output_format: 服务端输出格式
+            url: websocket 地址，默认为 EdgeTTS 官方地址（本地替身服务可覆盖）
+            rate: 语速
+            volume: 音量
+            pitch: 音调
+            proxy: 代理地址
+        """
+        self.voice = voice
+        self.output_format = output_format
+        self.url = url or WSS_URL
+        self.rate = rate
+        self.volume = volume
+        self.pitch = pitch
+        self.proxy = proxy
+
+    def _connect_url(self) -> str:
+        sep = "&" if "?" in self.url else "?"
+        url = f"{self.url}{sep}ConnectionId={uuid.uuid4().hex}"
+        if self.url == WSS_URL and DRM is not None:
+            url += (f"&Sec-MS-GEC={DRM.generate_sec_ms_gec()}"
+                    f"&Sec-MS-GEC-Version={edge_constants.SEC_MS_GEC_VERSION}")
+        return url
+
+    def _connect_headers(self) -> Dict[str, str]:
+        if self.url == WSS_URL and DRM is not None and hasattr(DRM, "headers_with_muid"):
+            return DRM.headers_with_muid(WSS_HEADERS)
+        return dict(WSS_HEADERS)
+
+    async def open(self, session: aiohttp.ClientSession) -> aiohttp.ClientWebSocketResponse:
+        """建立一条新的 websocket 连接"""
+        return await session.ws_connect(
+            self._connect_url(),
+            compress=15,
+            autoclose=True,
+            autoping=True,
+            proxy=self.proxy,
+            headers=self._connect_headers(),
+        )
+
+    def _config_message(self) -> str:
+        config = {
+            "context": {
+                "synthesis": {
+                    "audio": {
+                        "metadataoptions": {
+                            "sentenceBoundaryEnabled": "false",
+                            "wordBoundaryEnabled": "true",
+                        },
+                        "outputFormat": self.output_format,
+                    }
+                }
+            }
+        }
+        return (
+            f"X-Timestamp:{_timestamp()}\r\n"
+            "Content-Type:application/json; charset=utf-8\r\n"
+            "Path:speech.config\r\n\r\n"
+            f"{json.dumps(config)}\r\n"
+        )
+
+    def _ssml_message(self, request_id: str, text: str) -> str:
+        ssml = (
+            "<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='en-US'>"
+            f"<voice name='{_full_voice_name(self.voice)}'>"
+            f"<prosody pitch='{self.pitch}' rate='{self.rate}' volume='{self.volume}'>"
+            f"{escape(text)}"
+            "</prosody></voice></speak>"
+        )
+        return (
+            f"X-RequestId:{request_id}\r\n"
+            "Content-Type:application/ssml+xml\r\n"
+            f"X-Timestamp:{_timestamp()}Z\r\n"
+            "Path:ssml\r\n\r\n"
+            f"{ssml}"
+        )
+
+    async def synthesize_on(self, websocket: aiohttp.ClientWebSocketResponse,
+                            text: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """在已建立的连接上完成一次合成，直到 turn.end"""
+        request_id = uuid.uuid4().hex
+        await websocket.send_str(self._config_message())
+        await websocket.send_str(self._ssml_message(request_id, text))
+
+        async for received in websocket:
+            if received.type == aiohttp.WSMsgType.TEXT:
+                raw = received.data.encode("utf-8")
+                header_raw, _, data = raw.partition(b"\r\n\r\n")
+                path = _parse_headers(header_raw).get(b"Path")
+                if path == b"turn.end":
+                    return
+                if path == b"audio.metadata":
+                    for meta in json.loads(data).get("Metadata", []):
+                        if meta.get("Type") == "WordBoundary":
+                            yield {
+                                "type": "WordBoundary",
+                                "offset": meta["Data"]["Offset"],
+                                "duration": meta["Data"]["Duration"],
+                                "text": meta["Data"]["text"]["Text"],
+                            }
+            elif received.type == aiohttp.WSMsgType.BINARY:
+                if len(received.data) < 2:
+                    raise EdgeTTSError("收到的二进制消息缺少头部长度")
+                header_length = int.from_bytes(received.data[:2], "big")
+                headers = _parse_headers(received.data[2:2 + header_length])
+                if headers.get(b"Path") != b"audio":
+                    continue
+                audio = received.data[2 + header_length:]
+                if audio:
+                    yield {"type": "audio", "data": audio}
+            elif received.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                break
+
+        raise EdgeTTSError("连接在 turn.end 之前被关闭")
+
+    async def stream(self, text: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        流式合成文本
+
+        Args:
+            text: 待合成文本
+
+        Yields:
+            {"type": "audio", "data": bytes} 或 {"type": "WordBoundary", ...}
+        """
+        async with aiohttp.ClientSession(trust_env=True) as session:
+            websocket = await self.open(session)
+            try:
+                async for message in self.synthesize_on(websocket, text):
+                    yield message
+            finally:
+                await websocket.close()
+                logging.debug("EdgeTTS 连接已关闭")
+
+
+class _PooledConnection:
+    """连接池中的一条连接"""
+
+    def __init__(self, websocket: aiohttp.ClientWebSocketResponse):
+        self.websocket = websocket
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+    async def close(self) -> None:
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+
+class _HedgeAttempt:
+    """对冲合成中的一路请求：消息队列与"首个音频"结果（True 收到音频，False 未收到音频就结束）"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # 有界队列：胜出的一路与单路请求一样，调用方读得慢时停止从连接读取
+        self.queue: "asyncio.Queue" = asyncio.Queue(maxsize=HEDGE_QUEUE_SIZE)
+        self.first_audio: "asyncio.Future" = asyncio.get_running_loop().create_future()
+
+
+class EdgeTTSConnectionPool:
+    """按 (发音人, 输出格式) 维护的 EdgeTTS 长连接池"""
+
+    def __init__(self, url: Optional[str] = None, max_idle_per_voice: int = 4, max_idle_seconds: float = 60.0,
+                 max_age_seconds: float = 240.0, reuse: bool = True, proxy: Optional[str] = None):
+        """
+        初始化连接池
+
+        Args:
+            url: websocket 地址，默认为 EdgeTTS 官方地址（本地替身服务可覆盖）
+            max_idle_per_voice: 每个发音人最多保留的空闲连接数
+            max_idle_seconds: 空闲超过该时长的连接不再复用（服务端会主动断开空闲连接）
+            max_age_seconds: 连接最长使用时长（连接令牌有时效）
+            reuse: False 时每次合成后关闭连接（等同于不使用连接池）
+            proxy: 代理地址
+        """
+        self.url = url
+        self.max_idle_per_voice = max_idle_per_voice
+        self.max_idle_seconds = max_idle_seconds
+        self.max_age_seconds = max_age_seconds
+        self.reuse = reuse
+        self.proxy = proxy
+        self.stats = {"opened": 0, "reused": 0, "replaced": 0, "closed": 0, "hedged": 0, "hedge_wins": 0}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._idle: Dict[Tuple[str, str], List[_PooledConnection]] = {}
+
+    def _client(self, voice: str, output_format: str, **prosody) -> EdgeTTSClient:
+        return EdgeTTSClient(voice, output_format=output_format, url=self.url, proxy=self.proxy, **prosody)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(trust_env=True)
+        return self._session
+
+    def _is_usable(self, conn: _PooledConnection) -> bool:
+        now = time.monotonic()
+        return (not conn.websocket.closed
+                and now - conn.last_used < self.max_idle_seconds
+                and now - conn.created_at < self.max_age_seconds)
+
+    async def _open(self, client: EdgeTTSClient) -> _PooledConnection:
+        websocket = await client.open(self._get_session())
+        self.stats["opened"] += 1
+        return _PooledConnection(websocket)
+
+    async def _acquire(self, key: Tuple[str, str], client: EdgeTTSClient) -> Tuple[_PooledConnection, bool]:
+        idle = self._idle.get(key, [])
+        while idle:
+            conn = idle.pop()
+            if self._is_usable(conn):
+                self.stats["reused"] += 1
+                return conn, True
+            await self._discard(conn)
+        return await self._open(client), False
+
+    async def _discard(self, conn: _PooledConnection) -> None:
+        self.stats["closed"] += 1
+        await conn.close()
+
+    async def _release(self, key: Tuple[str, str], conn: _PooledConnection) -> None:
+        conn.uses += 1
+        conn.last_used = time.monotonic()
+        idle = self._idle.setdefault(key, [])
+        if self.reuse and self._is_usable(conn) and len(idle) < self.max_idle_per_voice:
+            idle.append(conn)
+        else:
+            await self._discard(conn)
+
+    async def stream(self, text: str, voice: str, output_format: str = MP3_OUTPUT_FORMAT,
+                     **prosody) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        使用池中的连接流式合成文本
+
+        复用的连接若在产生任何数据前失败（例如已被服务端关闭），会换一条新连接重试一次。
+
+        Args:
+            text: 待合成文本
+            voice: 发音人
+            output_format: 服务端输出格式
+            **prosody: rate / volume / pitch
+
+        Yields:
+            与 EdgeTTSClient.stream 相同的消息
+        """
+        key = (voice, output_format)
+        client = self._client(voice, output_format, **prosody)
+        while True:
+            conn, reused = await self._acquire(key, client)
+            yielded = False
+            completed = False
+            try:
+                async for message in client.synthesize_on(conn.websocket, text):
+                    yielded = True
+                    yield message
+                completed = True
+            except (EdgeTTSError, aiohttp.ClientError, ConnectionError) as e:
+                if reused and not yielded:
+                    self.stats["replaced"] += 1
+                    logging.info(f"复用的 EdgeTTS 连接已失效，替换为新连接: {e}")
+                    continue
+                raise
+            finally:
+                # 中途被取消或失败的连接处于未知状态，不能放回池中
+                if completed:
+                    await self._release(key, conn)
+                else:
+                    await self._discard(conn)
+            return
+
+    def _launch_attempt(self, text: str, voice: str, output_format: str, prosody: Dict[str, Any]) -> "_HedgeAttempt":
+        attempt = _HedgeAttempt()
+        attempt.task = asyncio.create_task(self._pump(text, voice, output_format, prosody, attempt))
+        return attempt
+
+    async def _pump(self, text: str, voice: str, output_format: str, prosody: Dict[str, Any],
+                    attempt: "_HedgeAttempt") -> None:
+        """
+        把一次合成的消息读入队列；结束时放入 None，失败时放入异常
+
+        调用方选出胜者后才开始读取，首个音频之前的消息（元数据）先暂存，避免在此之前写满队列而阻塞
+        """
+        pending = []
+        try:
+            try:
+                async for message in self.stream(text, voice, output_format, **prosody):
+                    if not attempt.first_audio.done():
+                        if message["type"] != "audio":
+                            pending.append(message)
+                            continue
+                        attempt.first_audio.set_result(True)
+                        for held in pending:
+                            await attempt.queue.put(held)
+                        pending.clear()
+                    await attempt.queue.put(message)
+                end = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                end = e
+            if not attempt.first_audio.done():
+                attempt.first_audio.set_result(False)
+            for held in pending:
+                await attempt.queue.put(held)
+            await attempt.queue.put(end)
+        finally:
+            if not attempt.first_audio.done():
+                attempt.first_audio.set_result(False)
+
+    async def stream_hedged(self, text: str, voice: str, output_format: str = MP3_OUTPUT_FORMAT,
+                            hedge_after: Optional[float] = None, **prosody) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        带对冲的流式合成：hedge_after 秒内没有收到音频时，用另一条连接再发一次同样的请求，
+        先收到音频的一方胜出，另一方立即取消
+
+        Args:
+            text: 待合成文本
+            voice: 发音人
+            output_format: 服务端输出格式
+            hedge_after: 首字节等待阈值（秒），None 或 0 表示不对冲
+            **prosody: rate / volume / pitch
+
+        Yields:
+            与 stream 相同的消息
+        """
+        if not hedge_after:
+            async for message in self.stream(text, voice, output_format, **prosody):
+                yield message
+            return
+
+        attempts = [self._launch_attempt(text, voice, output_format, prosody)]
+        try:
+            await asyncio.wait([attempts[0].first_audio], timeout=hedge_after)
+            if not attempts[0].first_audio.done():
+                self.stats["hedged"] += 1
+                logging.info(f"EdgeTTS 首字节超过 {hedge_after * 1000:.0f}ms，发起对冲请求")
+                attempts.append(self._launch_attempt(text, voice, output_format, prosody))
+
+            # 先收到音频的一方胜出；都没有音频就结束时，使用最后结束的一方（其中的异常会抛给调用方）
+            winner = None
+            live = list(attempts)
+            while winner is None:
+                await asyncio.wait([a.first_audio for a in live], return_when=asyncio.FIRST_COMPLETED)
+                winner = next((a for a in live if a.first_audio.done() and a.first_audio.result()), None)
+                if winner is None:
+                    ended = [a for a in live if a.first_audio.done()]
+                    live = [a for a in live if not a.first_audio.done()]
+                    if not live:
+                        winner = ended[-1]
+            if winner is not attempts[0]:
+                self.stats["hedge_wins"] += 1
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.task.cancel()
+
+            while True:
+                message = await winner.queue.get()
+                if message is None:
+                    return
+                if isinstance(message, Exception):
+                    raise message
+                yield message
+        finally:
+            for attempt in attempts:
+                attempt.task.cancel()
+            await asyncio.gather(*(attempt.task for attempt in attempts), return_exceptions=True)
+
+    async def warm(self, voice: str, output_format: str = MP3_OUTPUT_FORMAT, count: int = 1) -> None:
+        """
+        预先建立空闲连接
+
+        Args:
+            voice: 发音人
+            output_format: 服务端输出格式
+            count: 需要保持的空闲连接数
+        """
+        key = (voice, output_format)
+        client = self._client(voice, output_format)
+        idle = self._idle.setdefault(key, [])
+        missing = min(count, self.max_idle_per_voice) - len(idle)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(*(self._open(client) for _ in range(missing)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logging.warning(f"预热 EdgeTTS 连接失败 ({voice}): {result}")
+            else:
+                idle.append(result)
+        logging.info(f"EdgeTTS 连接预热完成 ({voice}, {output_format}): {len(idle)} 条空闲连接")
+
+    async def close(self) -> None:
+        """关闭所有空闲连接与底层会话"""
+        for idle in self._idle.values():
+            for conn in idle:
+                await self._discard(conn)
+        self._idle.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,187 @@
+"""
+音频编码线程池
+
+默认情况下 aiortc 在发送端逐帧编码 Opus。会话多时，编码与 LLM 流、DataChannel 抢占同一个事件循环。
+启用编码池后，轨道自己在专用线程池中把 PCM 帧编码为 Opus 包；aiortc 只需对包做 RTP 打包。
+
+- EncoderPool: 按 CPU 核数创建的线程池，记录排队延迟（提交到开始执行）与编码耗时。
+  PyAV 编码时释放 GIL，因此线程可以并行。
+- PooledOpusEncoder: 每条轨道一个有状态的 libopus 编码器。同一轨道同一时刻只有一帧在编码，帧顺序不变。
+  Opus 编码器状态不能跨进程迁移，所以不使用进程池。未配置线程池时在事件循环的默认线程池中编码
+  （与 aiortc 内置编码器相同），不占用事件循环。
+- ENCODER_PROFILES: 命名的编码配置（采样率、ptime、码率、复杂度），在 config.json 中按名称选择
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import Any, Callable, Deque, Dict, Optional
+
+# bitrate / complexity 为 None 表示使用编码器默认值
+ENCODER_PROFILES: Dict[str, Dict[str, Any]] = {
+    # 20ms 帧：延迟最低，与 aiortc 默认行为一致
+    "low-latency": {"sample_rate": 48000, "ptime": 20, "bitrate": None, "complexity": None},
+    # 60ms 帧 + 低复杂度：每个包的 RTP/SRTP 开销与编码调用次数约为 1/3，适合大量纯语音会话
+    "high-density": {"sample_rate": 48000, "ptime": 60, "bitrate": 24000, "complexity": 3},
+}
+
+# libopus 支持的采样率与帧时长
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_PTIMES = (10, 20, 40, 60)
+
+
+def resolve_encoder_profile(name: str, custom: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    按名称查找编码配置（config.json 中的同名配置覆盖内置值）
+
+    Args:
+        name: 配置名称
+        custom: tts.encoder_profiles 配置段
+
+    Returns:
+        包含 name、sample_rate、ptime、bitrate、complexity 的字典
+    """
+    profiles = {key: dict(value) for key, value in ENCODER_PROFILES.items()}
+    for key, value in (custom or {}).items():
+        profiles.setdefault(key, dict(ENCODER_PROFILES["low-latency"])).update(value)
+    if name not in profiles:
+        raise ValueError(f"未知的编码配置: {name}（可选: {', '.join(profiles)}）")
+    profile = profiles[name]
+    profile["name"] = name
+    if profile["sample_rate"] not in OPUS_SAMPLE_RATES:
+        raise ValueError(f"编码配置 {name} 的采样率不受支持: {profile['sample_rate']}")
+    if profile["ptime"] not in OPUS_PTIMES:
+        raise ValueError(f"编码配置 {name} 的 ptime 不受支持: {profile['ptime']}")
+    return profile
+
+
+def profile_needs_encoder(profile: Dict[str, Any]) -> bool:
+    """aiortc 内置编码器固定 20ms 帧与默认码率；其它设置需要轨道自行编码"""
+    return profile["ptime"] != 20 or bool(profile.get("bitrate")) or profile.get("complexity") is not None
+
+
+class EncoderPool:
+    """带排队延迟统计的编码线程池"""
+
+    def __init__(self, workers: int = 0, window: int = 1000):
+        """
+        初始化线程池
+
+        Args:
+            workers: 线程数，0 表示使用 CPU 核数
+            window: 计算延迟分位数时保留的最近样本数
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="encoder")
+        self._queue_delays: Deque[float] = deque(maxlen=window)
+        self.stats: Dict[str, float] = {
+            "jobs": 0,
+            "in_flight": 0,
+            "queue_delay_max": 0.0,
+            "encode_time_total": 0.0,
+        }
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """在线程池中执行 fn(*args)，记录排队延迟与执行耗时"""
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            result = fn(*args)
+            return started, time.perf_counter(), result
+
+        self.stats["in_flight"] += 1
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self.stats["in_flight"] -= 1
+        delay = started - submitted
+        self._queue_delays.append(delay)
+        self.stats["jobs"] += 1
+        self.stats["queue_delay_max"] = max(self.stats["queue_delay_max"], delay)
+        self.stats["encode_time_total"] += finished - started
+        return result
+
+    def queue_delay(self, quantile: float) -> float:
+        """最近样本中排队延迟的分位数（秒）"""
+        if not self._queue_delays:
+            return 0.0
+        ordered = sorted(self._queue_delays)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+    def summary(self) -> Dict[str, float]:
+        stats = dict(self.stats)
+        stats["workers"] = self.workers
+        stats["queue_delay_p50"] = self.queue_delay(0.5)
+        stats["queue_delay_p99"] = self.queue_delay(0.99)
+        return stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class PooledOpusEncoder:
+    """在 EncoderPool 中运行的单轨道 Opus 编码器"""
+
+    def __init__(self, pool: Optional[EncoderPool], sample_rate: int = 48000, bit_rate: Optional[int] = None,
+                 options: Optional[Dict[str, str]] = None):
+        """
+        初始化编码器
+
+        Args:
+            pool: 编码线程池，None 表示使用事件循环的默认线程池
+            sample_rate: 输入 PCM 采样率（s16 单声道）
+            bit_rate: 目标码率（bps），None 使用 libopus 默认值
+            options: 传给 libopus 的其它选项（例如 {"compression_level": "5", "frame_duration": "60"}）
+        """
+        import av
+
+        self.pool = pool
+        self._codec = av.CodecContext.create("libopus", "w")
+        self._codec.sample_rate = sample_rate
+        self._codec.layout = "mono"
+        self._codec.format = "s16"
+        self._codec.time_base = Fraction(1, sample_rate)
+        if bit_rate:
+            self._codec.bit_rate = bit_rate
+        if options:
+            self._codec.options = dict(options)
+        self._pts = 0
+        # 同一轨道同一时刻只有一帧在编码（编码器有状态，帧必须按顺序送入）
+        self._lock = asyncio.Lock()
+        # 编码器偶尔一次输出多个包（或首帧不输出），多出的按顺序留到下一帧
+        self._pending: Deque[bytes] = deque()
+
+    def _encode(self, frame) -> None:
+        for packet in self._codec.encode(frame):
+            self._pending.append(bytes(packet))
+
+    async def encode(self, frame) -> Optional[bytes]:
+        """
+        编码一帧；并发调用时按调用顺序逐帧编码
+
+        Args:
+            frame: s16 单声道 AudioFrame
+
+        Returns:
+            一个 Opus 包，编码器尚未输出时返回 None
+        """
+        async with self._lock:
+            # 编码器只需要连续递增的时间戳；发送时间戳由轨道的节拍器决定
+            frame.pts = self._pts
+            self._pts += frame.samples
+            if self.pool is None:
+                await asyncio.get_running_loop().run_in_executor(None, self._encode, frame)
+            else:
+                await self.pool.run(self._encode, frame)
+            return self._pending.popleft() if self._pending else None
+
+    @classmethod
+    def from_profile(cls, pool: Optional[EncoderPool], profile: Dict[str, Any]) -> "PooledOpusEncoder":
+        """按编码配置创建编码器"""
+        options = {"frame_duration": str(profile["ptime"])}
+        if profile.get("complexity") is not None:
+            options["compression_level"] = str(profile["complexity"])
+        return cls(pool, profile["sample_rate"], bit_rate=profile.get("bitrate"), options=options)
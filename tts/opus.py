@@ -0,0 +1,115 @@
+"""
+Opus 辅助工具
+
+- OggOpusDemuxer: 把 TTS 返回的 Ogg/Opus 字节流增量拆分为 Opus 包
+- opus_packet_samples: 根据 TOC 字节计算 Opus 包时长（48kHz 采样数）
+- opus_silence_packet: 指定时长的静音包
+"""
+from typing import List
+
+OPUS_CLOCK_RATE = 48000
+
+# 20ms CELT 全频带静音包（TOC=0xf8, code 0）
+OPUS_SILENCE_PACKET = b"\xf8\xff\xfe"
+
+_OGG_CAPTURE = b"OggS"
+_OGG_HEADER_SIZE = 27
+
+
+def opus_packet_samples(packet: bytes, clock_rate: int = OPUS_CLOCK_RATE) -> int:
+    """
+    计算 Opus 包包含的样本数（RFC 6716 3.1 节）
+
+    Args:
+        packet: Opus 包
+        clock_rate: 时钟频率，WebRTC 中固定为 48000
+
+    Returns:
+        样本数
+    """
+    if not packet:
+        return 0
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame_ms = (10, 20, 40, 60)[config & 3]
+    elif config < 16:
+        frame_ms = (10, 20)[config & 1]
+    else:
+        frame_ms = (2.5, 5, 10, 20)[config & 3]
+
+    code = toc & 3
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return int(clock_rate * frame_ms / 1000) * frames
+
+
+def opus_silence_packet(frame_ms: int = 20) -> bytes:
+    """
+    生成 frame_ms 时长的静音包；20ms 的整数倍时用 code 3（CBR）把多个 20ms 静音帧打包在一起
+
+    Args:
+        frame_ms: 包时长（毫秒）
+
+    Returns:
+        Opus 包，不支持的时长返回 20ms 静音包
+    """
+    if frame_ms <= 20 or frame_ms % 20 or frame_ms > 120:
+        return OPUS_SILENCE_PACKET
+    count = frame_ms // 20
+    return bytes([OPUS_SILENCE_PACKET[0] | 3, count]) + OPUS_SILENCE_PACKET[1:] * count
+
+
+class OggOpusDemuxer:
+    """增量 Ogg 解封装，只输出音频包（跳过 OpusHead/OpusTags）"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._partial = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        送入一段 Ogg 字节流
+
+        Args:
+            data: Ogg 数据（可在任意位置切分）
+
+        Returns:
+            本次解析出的完整 Opus 包列表
+        """
+        self._buffer.extend(data)
+        packets = []
+        buf = self._buffer
+        while len(buf) >= _OGG_HEADER_SIZE:
+            if buf[:4] != _OGG_CAPTURE:
+                # 重新同步到下一个页头
+                idx = buf.find(_OGG_CAPTURE, 1)
+                if idx < 0:
+                    del buf[:-3]
+                    break
+                del buf[:idx]
+                continue
+
+            segments = buf[26]
+            header_len = _OGG_HEADER_SIZE + segments
+            if len(buf) < header_len:
+                break
+            lacing = buf[_OGG_HEADER_SIZE:header_len]
+            if len(buf) < header_len + sum(lacing):
+                break
+
+            offset = header_len
+            for lace in lacing:
+                self._partial.extend(buf[offset:offset + lace])
+                offset += lace
+                # 长度小于 255 的段表示包结束；否则包跨段（或跨页）继续
+                if lace < 255:
+                    packets.append(bytes(self._partial))
+                    self._partial.clear()
+            del buf[:offset]
+
+        return [p for p in packets if p and not p.startswith((b"OpusHead", b"OpusTags"))]
@@ -0,0 +1,108 @@
+"""
+音频帧节拍器
+
+按单调时钟为每一帧计算绝对的发送时刻（起始时刻 + 已发送样本数 / 采样率），
+而不是每帧处理完再固定休眠一帧时长，处理耗时与事件循环延迟不会累积成漂移：
+- 落后不多时不再休眠，后续帧连续发出直到追上
+- 落后超过 max_lag 时跳过积压的帧，返回跳过的样本数供调用方推进时间戳
+- 调用方主动暂停发帧（空闲静音抑制）后用 resume() 把进度对齐到当前时刻，不计为落后
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+# 落后不超过该时长（秒）视为准时
+LATE_TOLERANCE = 0.001
+
+
+class FramePacer:
+    """基于单调时钟、无累积漂移的帧节拍器"""
+
+    def __init__(self, sample_rate: int, max_lag: float = 0.2,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        """
+        初始化节拍器
+
+        Args:
+            sample_rate: 时间戳的时钟频率（样本/秒）
+            max_lag: 允许追赶的最大落后时长（秒），超过后跳过积压的帧
+            clock: 单调时钟（测试时可替换为虚拟时钟）
+            sleep: 休眠协程
+        """
+        self.sample_rate = sample_rate
+        self.max_lag = max_lag
+        self._clock = clock
+        self._sleep = sleep
+        self.start_time: Optional[float] = None
+        self.position = 0
+        self.stats: Dict[str, float] = {
+            "frames": 0,
+            "late_frames": 0,
+            "skipped_samples": 0,
+            "max_lateness": 0.0,
+        }
+
+    def start(self, at: Optional[float] = None) -> None:
+        """从指定时刻（默认当前时刻）开始计时"""
+        self.start_time = self._clock() if at is None else at
+        self.position = 0
+
+    def deadline(self) -> float:
+        """下一帧的发送时刻"""
+        if self.start_time is None:
+            self.start()
+        return self.start_time + self.position / self.sample_rate
+
+    def drift(self) -> float:
+        """当前时刻与已发送音频时长之差（秒），正值表示落后"""
+        if self.start_time is None:
+            return 0.0
+        return self._clock() - self.deadline()
+
+    async def wait(self, samples: int) -> int:
+        """
+        等到下一帧的发送时刻，并把进度推进 samples 个样本
+
+        Args:
+            samples: 本帧的样本数
+
+        Returns:
+            因落后过多而跳过的样本数（调用方据此推进后续帧的时间戳）
+        """
+        skipped = 0
+        lateness = self._clock() - self.deadline()
+        if lateness > LATE_TOLERANCE:
+            self.stats["late_frames"] += 1
+            self.stats["max_lateness"] = max(self.stats["max_lateness"], lateness)
+            if lateness > self.max_lag:
+                # 丢弃积压：只追到 max_lag 以内，避免突发大量帧
+                skipped = math.ceil((lateness - self.max_lag) * self.sample_rate / samples) * samples
+                self.position += skipped
+                self.stats["skipped_samples"] += skipped
+                logging.warning(f"音频帧落后 {lateness * 1000:.0f}ms，跳过 {skipped} 个样本")
+        elif lateness < 0:
+            await self._sleep(-lateness)
+        self.position += samples
+        self.stats["frames"] += 1
+        return skipped
+
+    def resume(self, samples: int) -> int:
+        """
+        暂停发帧后恢复：按整帧推进进度并把起始时刻对齐，使下一帧立即发送
+
+        Args:
+            samples: 每帧样本数
+
+        Returns:
+            暂停期间推进的样本数
+        """
+        lateness = self._clock() - self.deadline()
+        if lateness <= 0:
+            return 0
+        skipped = int(lateness * self.sample_rate) // samples * samples
+        self.position += skipped
+        self.start_time = self._clock() - self.position / self.sample_rate
+        return skipped
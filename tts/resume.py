@@ -0,0 +1,91 @@
+"""
+合成续传
+
+合成中途失败时，原实现退避后重新合成整段文本，已经写入音频队列的部分会被再播放一遍。
+SynthesisProgress 记录已交付给音频队列的时长与 WordBoundary 元数据（单词在音频中的起始时刻与在文本中的位置），
+重试时：
+- 只合成最后一个已开始播放的单词及其之后的文本
+- 丢弃新音频开头与已播放部分重叠的时长（该单词已播放的部分），使音频既不重复也不缺失
+
+新请求中单词的起始时刻未知，用第一次请求中首个单词之前的静音时长估计；误差通常在几十毫秒以内。
+"""
+from typing import List, Optional, Tuple
+
+# WordBoundary 的 Offset / Duration 单位（100ns）
+TICKS_PER_SECOND = 10_000_000
+
+
+class SynthesisProgress:
+    """一段文本在多次合成尝试之间的播放进度"""
+
+    def __init__(self, text: str):
+        self.text = text
+        # 已交付的音频时长（秒，跨所有尝试）
+        self.delivered = 0.0
+        self.resumes = 0
+        # (交付时间轴上的起始时刻, 文本中的字符位置)，按时刻递增
+        self._boundaries: List[Tuple[float, int]] = []
+        # 首个单词之前的静音时长（秒）
+        self._lead: Optional[float] = None
+        # 当前尝试：合成的文本从 _char_base 开始，其音频的 0 时刻对应交付时间轴上的 _time_base
+        self._char_base = 0
+        self._cursor = 0
+        self._time_base = 0.0
+        self._skip = 0.0
+
+    def begin_attempt(self) -> Tuple[str, float]:
+        """
+        开始一次合成尝试
+
+        Returns:
+            (本次需要合成的文本, 开头需要丢弃的时长（秒）)
+        """
+        if self.delivered <= 0:
+            self._boundaries.clear()
+            self._char_base = self._cursor = 0
+            self._time_base = self._skip = 0.0
+            return self.text, 0.0
+
+        start, char_pos = 0.0, 0
+        lead = 0.0
+        for boundary_time, boundary_char in self._boundaries:
+            if boundary_time > self.delivered:
+                break
+            start, char_pos = boundary_time, boundary_char
+            lead = self._lead or 0.0
+        self.resumes += 1
+        # 新音频中该单词约在 lead 处开始；其中已播放 delivered - start 秒
+        self._skip = lead + (self.delivered - start)
+        self._time_base = self.delivered - self._skip
+        self._char_base = self._cursor = char_pos
+        # 之后的边界由新的尝试重新记录
+        self._boundaries = [b for b in self._boundaries if b[0] <= start]
+        return self.text[char_pos:], self._skip
+
+    def on_word_boundary(self, offset_ticks: int, word: str) -> None:
+        """记录本次尝试中一个单词的起始时刻（相对本次音频开头）"""
+        offset = offset_ticks / TICKS_PER_SECOND
+        if self._lead is None:
+            self._lead = offset
+        pos = self.text.find(word, self._cursor) if word else -1
+        if pos < 0:
+            return
+        self._cursor = pos + len(word)
+        boundary_time = self._time_base + offset
+        if not self._boundaries or boundary_time > self._boundaries[-1][0]:
+            self._boundaries.append((boundary_time, pos))
+
+    def consume(self, duration: float) -> float:
+        """
+        交付一段音频之前调用
+
+        Args:
+            duration: 这段音频的时长（秒）
+
+        Returns:
+            开头需要丢弃的时长（秒），不超过 duration
+        """
+        dropped = min(self._skip, duration)
+        self._skip -= dropped
+        self.delivered += duration - dropped
+        return dropped
@@ -0,0 +1,194 @@
+"""
+全局 TTS 调度器
+
+所有会话的合成任务在开始请求上游 TTS 前向同一个调度器申请许可：
+- 全局并发上限：同一时刻最多 max_concurrency 个上游合成（websocket 流 + 解码器）
+- 公平：普通任务按会话轮转（round-robin），单个会话排队再多也不会挤占其它会话
+- 优先级：一条回复的首段优先于所有普通任务，尽早出声
+- 背压：写入方阻塞在下游（播放缓冲区已满）时可暂时归还许可，等待期间不占用并发名额
+- 统计：排队深度、正在执行数与排队等待时间（分位数）
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Hashable
+
+
+class _Ticket:
+    """一次排队中的许可申请"""
+
+    __slots__ = ("session", "priority", "future", "enqueued")
+
+    def __init__(self, session: Hashable, priority: bool):
+        self.session = session
+        self.priority = priority
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+
+
+class SchedulerPermit:
+    """slot() 发放的许可；下游写满时通过 released() 暂时归还"""
+
+    __slots__ = ("_scheduler", "session", "held")
+
+    def __init__(self, scheduler: "TTSScheduler", session: Hashable):
+        self._scheduler = scheduler
+        self.session = session
+        self.held = True
+
+    @asynccontextmanager
+    async def released(self):
+        """
+        在 async with 块内不占用许可（用于等待下游腾出空间）
+
+        退出时以优先级重新申请：上游连接与解码器仍在等待，应先于新任务完成；
+        块内抛出异常（包括取消）时不再申请
+        """
+        if not self.held:
+            yield
+            return
+        self.held = False
+        self._scheduler.stats["yielded"] += 1
+        self._scheduler.release()
+        yield
+        await self._scheduler.acquire(self.session, priority=True)
+        self.held = True
+
+
+class TTSScheduler:
+    """带并发上限、会话间公平轮转与首段优先的调度器"""
+
+    def __init__(self, max_concurrency: int = 8, window: int = 1000):
+        """
+        初始化调度器
+
+        Args:
+            max_concurrency: 全局同时进行的上游合成数量上限，0 表示不限
+            window: 计算等待时间分位数时保留的最近样本数
+        """
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._priority: Deque[_Ticket] = deque()
+        # 会话 -> 该会话排队中的普通任务；字典顺序即轮转顺序
+        self._sessions: "OrderedDict[Hashable, Deque[_Ticket]]" = OrderedDict()
+        self._waits: Deque[float] = deque(maxlen=window)
+        self.stats: Dict[str, float] = {
+            "granted": 0,
+            "priority_granted": 0,
+            "cancelled": 0,
+            "yielded": 0,
+            "max_wait": 0.0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._priority) + sum(len(q) for q in self._sessions.values())
+
+    def _has_capacity(self) -> bool:
+        return self.max_concurrency <= 0 or self.active < self.max_concurrency
+
+    def _next_ticket(self):
+        if self._priority:
+            return self._priority.popleft()
+        if not self._sessions:
+            return None
+        session, queue = next(iter(self._sessions.items()))
+        ticket = queue.popleft()
+        # 轮转：取过任务的会话移到末尾
+        if queue:
+            self._sessions.move_to_end(session)
+        else:
+            del self._sessions[session]
+        return ticket
+
+    def _dispatch(self) -> None:
+        while self._has_capacity():
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            if ticket.future.done():
+                continue
+            self.active += 1
+            wait = time.monotonic() - ticket.enqueued
+            self._waits.append(wait)
+            self.stats["granted"] += 1
+            if ticket.priority:
+                self.stats["priority_granted"] += 1
+            self.stats["max_wait"] = max(self.stats["max_wait"], wait)
+            ticket.future.set_result(None)
+
+    def _discard(self, ticket: _Ticket) -> None:
+        if ticket.priority:
+            try:
+                self._priority.remove(ticket)
+            except ValueError:
+                pass
+            return
+        queue = self._sessions.get(ticket.session)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            pass
+        if not queue:
+            del self._sessions[ticket.session]
+
+    async def acquire(self, session: Hashable, priority: bool = False) -> None:
+        """
+        申请一个合成许可（取消时自动退出队列）
+
+        Args:
+            session: 会话标识（用于公平轮转）
+            priority: 是否为回复首段
+        """
+        ticket = _Ticket(session, priority)
+        if priority:
+            self._priority.append(ticket)
+        else:
+            self._sessions.setdefault(session, deque()).append(ticket)
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            if ticket.future.done() and not ticket.future.cancelled():
+                # 已获得许可但调用方已被取消：归还
+                self.release()
+            else:
+                self._discard(ticket)
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, session: Hashable, priority: bool = False):
+        """async with 形式的许可：进入时排队，退出时归还；as 得到的 SchedulerPermit 可在背压期间暂时归还"""
+        await self.acquire(session, priority)
+        permit = SchedulerPermit(self, session)
+        try:
+            yield permit
+        finally:
+            if permit.held:
+                permit.held = False
+                self.release()
+
+    def wait_time(self, quantile: float) -> float:
+        """最近样本中排队等待时间的分位数（秒）"""
+        if not self._waits:
+            return 0.0
+        ordered = sorted(self._waits)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+    def summary(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["max_concurrency"] = self.max_concurrency
+        stats["active"] = self.active
+        stats["queue_depth"] = self.queue_depth
+        stats["sessions_waiting"] = len(self._sessions)
+        stats["wait_p50"] = self.wait_time(0.5)
+        stats["wait_p99"] = self.wait_time(0.99)
+        return stats
@@ -0,0 +1,254 @@
+"""
+文本段边界处理（int16 PCM，numpy 向量化）
+
+Edge TTS 的每段音频前后都带有编码器填充与静音，直接拼接时句子之间有数百毫秒的空白，接缝处还有爆音。
+AudioQueueManager 在写入环形缓冲区时调用这里的函数：
+- 去除段首静音（写入前跳过）与段尾静音（段结束时回退写指针，不移动数据）
+- 同一标签的相邻两段做短交叉淡化：新段开头与缓冲区中尚未播放的上一段结尾原地叠加
+- 可选响度归一化：按段内已写入音频的 RMS 计算增益，在拷入缓冲区时一并完成
+
+所有处理都在原有的一次拷贝（解码输出 → 环形缓冲区）中完成。静音检测的比较结果写入 SegmentShaper 复用的
+bool 数组，段尾只从块尾向前按小窗口扫描；每块只为交叉淡化窗口（默认 10ms）与响度统计分配临时数组。
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+INT16_MAX = 32767
+# 查找最后一个非静音样本时先扫描的块尾窗口长度（有声的块通常在这里就能找到）
+TAIL_WINDOW = 256
+
+
+def db_to_amplitude(db: float) -> float:
+    """dBFS 转换为 int16 幅度"""
+    return INT16_MAX * 10 ** (db / 20)
+
+
+def first_loud(samples: np.ndarray, threshold: float) -> int:
+    """第一个幅度超过阈值的样本下标，没有时返回 -1"""
+    return LoudDetector(threshold).first(samples)
+
+
+def last_loud(samples: np.ndarray, threshold: float) -> int:
+    """最后一个幅度超过阈值的样本下标，没有时返回 -1"""
+    return LoudDetector(threshold).last(samples)
+
+
+class LoudDetector:
+    """查找幅度超过阈值的样本；比较结果写入复用的 bool 数组，用 argmax 定位，不生成下标数组"""
+
+    def __init__(self, threshold: float, tail_window: int = TAIL_WINDOW):
+        self.threshold = threshold
+        # int16 与整数比较不做类型提升；对整数样本 s > t 等价于 s > floor(t)
+        self._bound = np.int16(min(INT16_MAX, max(0, math.floor(threshold))))
+        self.tail_window = tail_window
+        self._mask = np.zeros(0, dtype=bool)
+        self._scratch = np.zeros(0, dtype=bool)
+
+    def _loud(self, samples: np.ndarray) -> np.ndarray:
+        count = len(samples)
+        if len(self._mask) < count:
+            self._mask = np.zeros(count, dtype=bool)
+            self._scratch = np.zeros(count, dtype=bool)
+        mask = self._mask[:count]
+        scratch = self._scratch[:count]
+        # 用比较代替 np.abs：避免 -32768 溢出，也不产生 int16 临时数组
+        np.greater(samples, self._bound, out=mask)
+        np.less(samples, -self._bound, out=scratch)
+        np.logical_or(mask, scratch, out=mask)
+        return mask
+
+    def first(self, samples: np.ndarray) -> int:
+        """第一个非静音样本的下标，没有时返回 -1"""
+        if not len(samples):
+            return -1
+        mask = self._loud(samples)
+        index = int(mask.argmax())
+        return index if mask[index] else -1
+
+    def last(self, samples: np.ndarray) -> int:
+        """最后一个非静音样本的下标，没有时返回 -1；先扫描块尾窗口，找不到再扫描其余部分"""
+        end = len(samples)
+        for start in (max(0, end - self.tail_window), 0):
+            if start >= end:
+                break
+            mask = self._loud(samples[start:end])[::-1]
+            index = int(mask.argmax())
+            if mask[index]:
+                return end - 1 - index
+            end = start
+        return -1
+
+
+def fade_window(length: int) -> np.ndarray:
+    """升余弦淡入曲线（0 → 1），淡出使用 1 - window"""
+    if length <= 0:
+        return np.zeros(0, dtype=np.float32)
+    return (0.5 - 0.5 * np.cos(np.linspace(0, math.pi, length, dtype=np.float32))).astype(np.float32)
+
+
+def crossfade_into(tail: np.ndarray, incoming: np.ndarray, window: np.ndarray, gain: float = 1.0) -> None:
+    """
+    原地把 incoming 叠加到 tail 上：tail 淡出、incoming 淡入
+
+    Args:
+        tail: 缓冲区中上一段结尾（int16，原地修改）
+        incoming: 新段开头，长度与 tail 相同
+        window: 与 tail 等长的淡入曲线
+        gain: incoming 的增益
+    """
+    mixed = tail * (1 - window) + incoming * (window * gain)
+    np.clip(mixed, -INT16_MAX - 1, INT16_MAX, out=mixed)
+    tail[:] = mixed
+
+
+class LoudnessNormalizer:
+    """按段内已写入音频的 RMS 估计增益，使各段响度接近目标值"""
+
+    def __init__(self, target_db: float = -20.0, max_gain_db: float = 12.0, threshold: float = 0.0,
+                 smoothing: float = 0.2):
+        """
+        Args:
+            target_db: 目标 RMS（dBFS）
+            max_gain_db: 增益上下限（±dB）
+            threshold: 只统计幅度超过该值的样本（排除静音）
+            smoothing: 每次更新时新估计值的权重，避免增益跳变
+        """
+        self.target = db_to_amplitude(target_db)
+        self.max_gain = 10 ** (max_gain_db / 20)
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.gain = 1.0
+        self._primed = False
+        self._energy = 0.0
+        self._count = 0
+
+    def reset(self) -> None:
+        """新段开始：保留上一段的增益作为起点，重新统计 RMS"""
+        self._energy = 0.0
+        self._count = 0
+
+    def update(self, samples: np.ndarray) -> float:
+        """
+        统计一块音频并返回它应使用的增益（保证这一块不削波）
+
+        Args:
+            samples: int16 音频
+
+        Returns:
+            增益
+        """
+        loud = samples[(samples > self.threshold) | (samples < -self.threshold)]
+        if len(loud):
+            values = loud.astype(np.float32)
+            self._energy += float(np.dot(values, values))
+            self._count += len(loud)
+            rms = math.sqrt(self._energy / self._count)
+            wanted = min(self.max_gain, max(1 / self.max_gain, self.target / max(rms, 1.0)))
+            # 第一次估计直接采用，之后平滑过渡
+            self.gain += (wanted - self.gain) * (self.smoothing if self._primed else 1.0)
+            self._primed = True
+            peak = max(int(loud.max()), -int(loud.min()))
+            if peak and self.gain * peak > INT16_MAX:
+                return INT16_MAX / peak
+        return self.gain
+
+
+class SegmentShaper:
+    """
+    单个音频队列的段边界状态
+
+    调用顺序：begin() → 每次写入前 leading() / observe() → end() 时由 trailing_excess() 得到可回退的段尾样本数
+    """
+
+    def __init__(self, sample_rate: int, trim_silence: bool = True, silence_threshold_db: float = -45.0,
+                 keep_silence_ms: float = 40.0, crossfade_ms: float = 10.0,
+                 normalizer: Optional[LoudnessNormalizer] = None):
+        self.trim_silence = trim_silence
+        self.threshold = db_to_amplitude(silence_threshold_db)
+        self.keep = int(sample_rate * keep_silence_ms / 1000)
+        self.crossfade_samples = int(sample_rate * crossfade_ms / 1000)
+        self.normalizer = normalizer
+        self._window = fade_window(self.crossfade_samples)
+        self._detector = LoudDetector(self.threshold)
+        self._leading = False
+        # 本段已写入的样本数，以及最后一个非静音样本之后的位置
+        self._written = 0
+        self._loud_end = 0
+
+    def begin(self) -> None:
+        self._leading = self.trim_silence
+        self._written = 0
+        self._loud_end = 0
+        if self.normalizer is not None:
+            self.normalizer.reset()
+
+    def leading(self, samples: np.ndarray) -> np.ndarray:
+        """去掉段首静音（保留 keep 个样本），返回原数组的视图；整块静音时返回空视图"""
+        if not self._leading:
+            return samples
+        onset = self._detector.first(samples)
+        if onset < 0:
+            return samples[:0]
+        self._leading = False
+        return samples[max(0, onset - self.keep):]
+
+    def observe(self, samples: np.ndarray, trimmable: bool = True) -> float:
+        """
+        记录即将写入的一块音频，返回写入时应使用的增益
+
+        Args:
+            samples: 即将写入的 int16 音频
+            trimmable: 这一块之后是否可能回退段尾静音（不在 begin/end 之间的写入不会回退，跳过段尾检测）
+        """
+        if self.trim_silence and trimmable:
+            end = self._detector.last(samples)
+            if end >= 0:
+                self._loud_end = self._written + end + 1
+        self._written += len(samples)
+        if self.normalizer is None:
+            return 1.0
+        return self.normalizer.update(samples)
+
+    def trailing_excess(self) -> int:
+        """段尾超出 keep 的静音样本数"""
+        if not self.trim_silence:
+            return 0
+        return max(0, self._written - (self._loud_end + self.keep))
+
+    def window(self, length: int) -> np.ndarray:
+        if length == len(self._window):
+            return self._window
+        return fade_window(length)
+
+
+def create_shaper(config: Optional[dict], sample_rate: int) -> Optional[SegmentShaper]:
+    """
+    根据 tts.shaping 配置创建段边界处理器；全部关闭时返回 None
+
+    Args:
+        config: {"trim_silence", "silence_threshold_db", "keep_silence_ms", "crossfade_ms",
+                 "normalize", "target_loudness_db", "max_gain_db"}
+        sample_rate: 音频队列的采样率
+    """
+    config = config or {}
+    trim_silence = bool(config.get("trim_silence", True))
+    crossfade_ms = float(config.get("crossfade_ms", 10))
+    normalize = bool(config.get("normalize", False))
+    if not (trim_silence or crossfade_ms > 0 or normalize):
+        return None
+    threshold_db = float(config.get("silence_threshold_db", -45))
+    normalizer = LoudnessNormalizer(
+        target_db=float(config.get("target_loudness_db", -20)),
+        max_gain_db=float(config.get("max_gain_db", 12)),
+        threshold=db_to_amplitude(threshold_db),
+    ) if normalize else None
+    return SegmentShaper(
+        sample_rate,
+        trim_silence=trim_silence,
+        silence_threshold_db=threshold_db,
+        keep_silence_ms=float(config.get("keep_silence_ms", 40)),
+        crossfade_ms=crossfade_ms,
+        normalizer=normalizer,
+    )